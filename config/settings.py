@@ -111,10 +111,81 @@ else:
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # Espera al bloqueo de escritura en vez de fallar con "database is locked"
+            "OPTIONS": {"timeout": 20},
+            # BD de test en fichero: la de memoria compartida no admite escrituras desde varios hilos
+            "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
         }
     }
 
 
+# =========================
+# CACHÉ
+# =========================
+# Local (por proceso) por defecto; con REDIS_URL se comparte entre workers/instancias.
+
+REDIS_URL = os.environ.get("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "inversure",
+        }
+    }
+
+# Segundos que se conserva el snapshot fusionado de un proyecto (vista `proyecto`)
+PROYECTO_SNAPSHOT_CACHE_TIMEOUT = int(os.environ.get("PROYECTO_SNAPSHOT_CACHE_TIMEOUT", 60 * 60))
+# Segundos que se conservan flujos + TIR (XIRR) de un proyecto; se invalida al cambiar un movimiento
+PROYECTO_XIRR_CACHE_TIMEOUT = int(os.environ.get("PROYECTO_XIRR_CACHE_TIMEOUT", 24 * 60 * 60))
+# Con la caché local (sin REDIS_URL) la invalidación no llega a los demás workers: vida corta
+PROYECTO_XIRR_CACHE_TIMEOUT_LOCAL = int(os.environ.get("PROYECTO_XIRR_CACHE_TIMEOUT_LOCAL", 60))
+
+
+# =========================
+# SNAPSHOTS DE PROYECTO
+# =========================
+# Cada N versiones se guarda un keyframe completo; entre medias, solo el diff JSON.
+PROYECTO_SNAPSHOT_KEYFRAME_INTERVAL = int(os.environ.get("PROYECTO_SNAPSHOT_KEYFRAME_INTERVAL", 20))
+
+# Segundos durante los que los autosaves de un proyecto actualizan la misma versión
+# (abierta) en lugar de crear una nueva. 0 = una versión por autosave.
+PROYECTO_AUTOSAVE_VENTANA = int(os.environ.get("PROYECTO_AUTOSAVE_VENTANA", 120))
+
+# Retención (comando `compactar_snapshots`): todo en las últimas N horas,
+# uno por hora hasta N días, uno por día a partir de ahí.
+SNAPSHOT_RETENCION = {
+    "completo_horas": int(os.environ.get("SNAPSHOT_RETENCION_COMPLETO_HORAS", 24)),
+    "horario_dias": int(os.environ.get("SNAPSHOT_RETENCION_HORARIO_DIAS", 30)),
+}
+
+
+# =========================
+# PDF
+# =========================
+# PDFs de estudio generados con WeasyPrint (`?formato=pdf`), por hash de snapshot + plantilla.
+PDF_CACHE_DIR = Path(os.environ.get("PDF_CACHE_DIR", BASE_DIR / "pdf_cache"))
+# Base para URLs relativas en renders sin request (worker `procesar_pdfs`); /static/ se lee de disco.
+PDF_BASE_URL = os.environ.get("PDF_BASE_URL", "http://localhost/")
+# Procesos renderizadores de larga vida por worker web (fuentes y CSS ya cargados):
+# la vista previa en PDF usa PDF_RENDERER_PROCESOS; la exportación ZIP, su propio pool
+# de PDF_EXPORTACION_PROCESOS (por defecto uno por núcleo) para renderizar en paralelo
+PDF_RENDERER_PROCESOS = int(os.environ.get("PDF_RENDERER_PROCESOS", 1))
+PDF_EXPORTACION_PROCESOS = int(os.environ.get("PDF_EXPORTACION_PROCESOS", os.cpu_count() or 1))
+# Estáticos que el renderizador mantiene en memoria desde el arranque
+PDF_ESTATICOS_PRECARGA = [
+    "core/logo_inversure_blanco.png",
+    "core/logo_inversure.png",
+]
+
+
 # =========================
 # PASSWORDS
 # =========================
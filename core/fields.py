@@ -0,0 +1,88 @@
+import json
+import zlib
+
+from django.db import models
+
+# Formato en BD: 2 bytes de marca + contenido
+#   b"J1" + JSON UTF-8 (documentos pequeños, no compensa comprimir)
+#   b"Z1" + zlib(JSON UTF-8)
+MARCA_PLANO = b"J1"
+MARCA_ZLIB = b"Z1"
+
+
+def codificar_json(valor, nivel: int = 6, umbral: int = 256, encoder=None) -> bytes:
+    raw = json.dumps(valor, cls=encoder, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(raw) < umbral:
+        return MARCA_PLANO + raw
+    return MARCA_ZLIB + zlib.compress(raw, nivel)
+
+
+def decodificar_json(valor, decoder=None):
+    if valor is None:
+        return None
+    if isinstance(valor, memoryview):
+        valor = valor.tobytes()
+    if isinstance(valor, str):
+        # Texto JSON sin marca (datos anteriores a la migración / serializadores)
+        return json.loads(valor, cls=decoder)
+    marca, cuerpo = bytes(valor[:2]), bytes(valor[2:])
+    if marca == MARCA_ZLIB:
+        cuerpo = zlib.decompress(cuerpo)
+    elif marca != MARCA_PLANO:
+        cuerpo = bytes(valor)
+    return json.loads(cuerpo.decode("utf-8"), cls=decoder)
+
+
+class JSONComprimidoField(models.BinaryField):
+    """JSON guardado comprimido (zlib) en una columna binaria (bytea / BLOB).
+
+    En Python se comporta como un JSONField (dict/list); la compresión es transparente.
+    No admite consultas por claves JSON (`campo__clave`): estos documentos solo se leen enteros.
+    """
+
+    description = "JSON comprimido (zlib)"
+    empty_strings_allowed = False
+
+    def __init__(self, *args, nivel: int = 6, umbral: int = 256, encoder=None, decoder=None, **kwargs):
+        self.nivel = nivel
+        self.umbral = umbral
+        self.encoder = encoder
+        self.decoder = decoder
+        kwargs.setdefault("editable", True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.nivel != 6:
+            kwargs["nivel"] = self.nivel
+        if self.umbral != 256:
+            kwargs["umbral"] = self.umbral
+        if self.encoder is not None:
+            kwargs["encoder"] = self.encoder
+        if self.decoder is not None:
+            kwargs["decoder"] = self.decoder
+        if kwargs.get("editable") is True:
+            del kwargs["editable"]
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        return decodificar_json(value, self.decoder)
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return decodificar_json(value, self.decoder)
+        if isinstance(value, str):
+            try:
+                return json.loads(value, cls=self.decoder)
+            except ValueError:
+                return value
+        return value
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        return codificar_json(value, self.nivel, self.umbral, self.encoder)
+
+    def value_to_string(self, obj):
+        # dumpdata/loaddata: JSON legible, no base64
+        return json.dumps(self.value_from_object(obj), cls=self.encoder)
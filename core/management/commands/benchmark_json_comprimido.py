@@ -0,0 +1,94 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+
+from core.fields import JSONComprimidoField
+from core.models import EstudioSnapshot, ProyectoSnapshot
+
+
+def _modelo_temporal(nombre, campo):
+    meta = type("Meta", (), {"app_label": "core", "db_table": f"core_bench_{nombre}", "managed": False})
+    return type(f"Bench{nombre.title()}", (models.Model,), {"__module__": __name__, "datos": campo, "Meta": meta})
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara JSONField y JSONComprimidoField (tamaño en BD, latencia de inserción y de lectura) "
+        "con documentos reales de EstudioSnapshot/ProyectoSnapshot. Usa tablas temporales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--filas", type=int, default=500, help="Filas a insertar por variante")
+
+    def _documentos(self, n):
+        docs = [d for d in EstudioSnapshot.objects.order_by("-id").values_list("datos", flat=True)[:n] if d]
+        docs += [
+            d for d in ProyectoSnapshot.objects.filter(delta__isnull=True).order_by("-id").values_list("datos", flat=True)[:n]
+            if d
+        ]
+        if not docs:
+            # BD vacía: documento sintético con la forma habitual de un estudio
+            rnd = random.Random(1)
+            docs = [
+                {
+                    "economico": {f"campo_{i}": round(rnd.uniform(0, 1e6), 2) for i in range(80)},
+                    "inversor": {"roi_neto": 12.5, "beneficio_neto": 42000, "comentario": "Sin incidencias " * 20},
+                    "kpis": {"metricas": {f"m_{i}": i * 1.5 for i in range(60)}},
+                }
+            ]
+        return docs
+
+    def _tam_columna(self, tabla):
+        if connection.vendor == "postgresql":
+            sql = f"SELECT COALESCE(SUM(pg_column_size(datos)), 0) FROM {tabla}"
+        else:
+            sql = f"SELECT COALESCE(SUM(LENGTH(CAST(datos AS BLOB))), 0) FROM {tabla}"
+        with connection.cursor() as cur:
+            cur.execute(sql)
+            return cur.fetchone()[0]
+
+    def _medir(self, Modelo, docs, filas):
+        with connection.schema_editor() as editor:
+            editor.create_model(Modelo)
+        try:
+            t0 = time.perf_counter()
+            for i in range(filas):
+                Modelo.objects.create(datos=docs[i % len(docs)])
+            t_insert = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            leidos = 0
+            for d in Modelo.objects.values_list("datos", flat=True).iterator(chunk_size=100):
+                leidos += 1 if d else 0
+            t_lectura = time.perf_counter() - t0
+
+            return {
+                "bytes": self._tam_columna(Modelo._meta.db_table),
+                "insert_ms": t_insert * 1000 / filas,
+                "lectura_ms": t_lectura * 1000 / max(1, leidos),
+            }
+        finally:
+            with connection.schema_editor() as editor:
+                editor.delete_model(Modelo)
+
+    def handle(self, *args, **options):
+        filas = max(1, options["filas"])
+        docs = self._documentos(50)
+        self.stdout.write(f"Documentos de muestra: {len(docs)} · filas por variante: {filas} · BD: {connection.vendor}")
+
+        plano = self._medir(_modelo_temporal("plano", models.JSONField()), docs, filas)
+        comprimido = self._medir(_modelo_temporal("zlib", JSONComprimidoField()), docs, filas)
+
+        for nombre, r in (("JSONField", plano), ("JSONComprimidoField", comprimido)):
+            self.stdout.write(
+                f"{nombre:<20} {r['bytes'] / filas:>10.0f} B/fila  "
+                f"insert {r['insert_ms']:.3f} ms/fila  lectura {r['lectura_ms']:.3f} ms/fila"
+            )
+        if plano["bytes"]:
+            self.stdout.write(
+                self.style.SUCCESS(f"Tamaño comprimido: {100 * comprimido['bytes'] / plano['bytes']:.1f}% del original")
+            )
+        if connection.vendor == "postgresql":
+            self.stdout.write("Nota: PostgreSQL ya comprime (TOAST/pglz) los jsonb de más de ~2 KB.")
@@ -0,0 +1,77 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import Estudio
+from core.services.motor_lotes import columnas, filas_lote, kpis_fila, kpis_lote
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el recálculo de KPIs fila a fila (motor_financiero) con el vectorizado (NumPy) "
+        "en estudios/segundo, y comprueba que ambos dan el mismo resultado. No escribe en la BD."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--estudios", type=int, default=50000, help="Tamaño del lote a medir")
+        parser.add_argument("--repeticiones", type=int, default=3)
+
+    def _muestra(self, n):
+        datos = [d for d in Estudio.objects.order_by("-id").values_list("datos", flat=True)[:1000] if isinstance(d, dict)]
+        if not datos:
+            # BD vacía: estudios sintéticos con la forma que guarda el simulador
+            rnd = random.Random(1)
+            for _ in range(500):
+                precio = round(rnd.uniform(50000, 600000), 2)
+                datos.append(
+                    {
+                        "inversure_comision_pct": rnd.choice((30, 35, 40)),
+                        "snapshot": {
+                            "precio_escritura": precio,
+                            "gastos_extras": round(rnd.uniform(0, 20000), 2),
+                            "valoraciones": {
+                                f"valoracion_{j}": rnd.choice((0, round(precio * rnd.uniform(1.0, 1.4), 2)))
+                                for j in range(5)
+                            },
+                        },
+                    }
+                )
+        return [datos[i % len(datos)] for i in range(n)]
+
+    def _mejor(self, fn, repeticiones):
+        tiempos = []
+        resultado = None
+        for _ in range(repeticiones):
+            t0 = time.perf_counter()
+            resultado = fn()
+            tiempos.append(time.perf_counter() - t0)
+        return min(tiempos), resultado
+
+    def handle(self, *args, **options):
+        n = max(1, options["estudios"])
+        rep = max(1, options["repeticiones"])
+        lote = self._muestra(n)
+        self.stdout.write(f"Estudios: {n} · repeticiones: {rep} (se toma la mejor)")
+
+        t_fila, por_fila = self._mejor(lambda: [kpis_fila(d) for d in lote], rep)
+        t_col, col = self._mejor(lambda: columnas(lote), rep)
+        t_np, kpis = self._mejor(lambda: kpis_lote(col), rep)
+
+        vectorizado = dict(filas_lote(kpis))
+        distintos = sum(
+            1 for i, k in enumerate(por_fila) if (k is None) != (i not in vectorizado) or (k is not None and k != vectorizado[i])
+        )
+
+        for nombre, t in (
+            ("Fila a fila (Python)", t_fila),
+            ("NumPy: datos -> columnas", t_col),
+            ("NumPy: cálculo", t_np),
+            ("NumPy: total", t_col + t_np),
+        ):
+            self.stdout.write(f"{nombre:<26} {t * 1000:>9.1f} ms  {n / t if t else float('inf'):>14,.0f} estudios/s")
+        self.stdout.write(f"Aceleración total: x{t_fila / (t_col + t_np):.1f} · solo cálculo: x{t_fila / t_np:.0f}")
+        if distintos:
+            self.stdout.write(self.style.ERROR(f"{distintos} estudios con resultados distintos entre ambos caminos"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Resultados idénticos en ambos caminos"))
@@ -0,0 +1,62 @@
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Estudio
+from core.services.pdf_render import html_a_pdf, base_url_pdf, inicializar_proceso, weasyprint_disponible
+
+
+def _resumen(tiempos):
+    ordenados = sorted(tiempos)
+    p95 = ordenados[min(len(ordenados) - 1, int(round(0.95 * (len(ordenados) - 1))))]
+    return statistics.median(ordenados), p95
+
+
+class Command(BaseCommand):
+    help = (
+        "Latencia de render de PDF en frío (proceso nuevo por PDF: import, fuentes, CSS, logos) "
+        "frente al renderizador caliente de larga vida."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--renders", type=int, default=10)
+        parser.add_argument("--estudio", type=int, help="Id del estudio (por defecto, el último)")
+
+    def handle(self, *args, **options):
+        if not weasyprint_disponible():
+            raise CommandError("WeasyPrint no está disponible en este entorno")
+
+        from core import views
+
+        qs = Estudio.objects.order_by("-id")
+        estudio = qs.filter(id=options["estudio"]).first() if options["estudio"] else qs.first()
+        if estudio is None:
+            raise CommandError("No hay estudios con los que medir")
+        _, html = views._html_pdf_estudio(estudio)
+        n = max(1, options["renders"])
+        base_url = base_url_pdf()
+
+        frio = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=1, initializer=inicializar_proceso, initargs=(False,)) as pool:
+                pool.submit(html_a_pdf, html, base_url).result()
+            frio.append((time.perf_counter() - t0) * 1000)
+
+        caliente = []
+        with ProcessPoolExecutor(max_workers=1, initializer=inicializar_proceso) as pool:
+            pool.submit(len, "").result()  # esperar a que termine el calentamiento
+            for _ in range(n):
+                t0 = time.perf_counter()
+                pool.submit(html_a_pdf, html, base_url).result()
+                caliente.append((time.perf_counter() - t0) * 1000)
+
+        self.stdout.write(f"Estudio #{estudio.id} · {n} renders por modo · HTML {len(html) / 1024:.0f} KB")
+        for nombre, tiempos in (("Frío", frio), ("Caliente", caliente)):
+            mediana, p95 = _resumen(tiempos)
+            self.stdout.write(f"{nombre:<9} mediana {mediana:8.1f} ms   p95 {p95:8.1f} ms")
+        self.stdout.write(
+            self.style.SUCCESS(f"Aceleración (mediana): x{statistics.median(frio) / statistics.median(caliente):.1f}")
+        )
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Estudio, Proyecto
+from core.services.retencion_snapshots import compactar_estudio, compactar_proyecto, politica
+
+
+class Command(BaseCommand):
+    help = (
+        "Poda ProyectoSnapshot y EstudioSnapshot según la política de retención "
+        "(todo reciente, uno por hora, uno por día; conversión/cierre siempre). "
+        "Procesa un proyecto/estudio por transacción; se puede reanudar con --desde-proyecto/--desde-estudio."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Calcula lo que se borraría sin tocar la BD")
+        parser.add_argument("--solo", choices=["proyectos", "estudios"], default="", help="Limitar a un tipo")
+        parser.add_argument("--desde-proyecto", type=int, default=0, help="Reanudar a partir de este id de proyecto")
+        parser.add_argument("--desde-estudio", type=int, default=0, help="Reanudar a partir de este id de estudio")
+        parser.add_argument("--chunk", type=int, default=200, help="Ids leídos por lote")
+
+    def _recorrer(self, qs, desde, chunk):
+        # Lotes por id ascendente: cada lote es una consulta corta, sin cursor abierto
+        ultimo = desde
+        while True:
+            ids = list(qs.filter(id__gt=ultimo).order_by("id").values_list("id", flat=True)[:chunk])
+            if not ids:
+                return
+            yield from ids
+            ultimo = ids[-1]
+
+    def _procesar(self, etiqueta, ids, funcion, ahora, dry_run):
+        total = {"eliminados": 0, "reescritos": 0, "bytes": 0}
+        ultimo = None
+        for obj_id in ids:
+            res = funcion(obj_id, ahora, dry_run=dry_run)
+            for k in total:
+                total[k] += res[k]
+            ultimo = obj_id
+            if res["eliminados"]:
+                self.stdout.write(
+                    f"{etiqueta} {obj_id}: -{res['eliminados']} versiones, "
+                    f"{res['reescritos']} reescritas, {res['bytes']} bytes"
+                )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{etiqueta}s: eliminados {total['eliminados']} · reescritos {total['reescritos']} · "
+                f"liberados ~{total['bytes'] / 1024:.1f} KB en BD · último id {ultimo or '-'}"
+            )
+        )
+        return total
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        chunk = max(1, options["chunk"])
+        ahora = timezone.now()
+        pol = politica()
+        self.stdout.write(
+            f"Política: todo < {pol['completo_horas']}h · horario < {pol['horario_dias']}d · diario después"
+            + (" (dry-run)" if dry_run else "")
+        )
+
+        bytes_total = 0
+        if options["solo"] != "estudios":
+            ids = self._recorrer(Proyecto.objects.all(), options["desde_proyecto"], chunk)
+            bytes_total += self._procesar("Proyecto", ids, compactar_proyecto, ahora, dry_run)["bytes"]
+        if options["solo"] != "proyectos":
+            ids = self._recorrer(Estudio.objects.all(), options["desde_estudio"], chunk)
+            bytes_total += self._procesar("Estudio", ids, compactar_estudio, ahora, dry_run)["bytes"]
+
+        self.stdout.write(self.style.SUCCESS(f"Espacio recuperado en BD: ~{bytes_total / 1024:.1f} KB"))
@@ -0,0 +1,120 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.services.pdf_render import PDFNoDisponible, inicializar_proceso, pdf_cacheado, renderizar_a_cache
+from core.services.pdf_trabajos import (
+    completar_trabajo,
+    devolver_trabajo,
+    fallar_trabajo,
+    liberar_atascados,
+    preparar_trabajo,
+    reclamar_trabajos,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de la cola de PDFs (TrabajoPDF): prepara el HTML en este proceso y renderiza "
+        "con WeasyPrint en un ProcessPoolExecutor. Sin broker: la cola es la propia BD."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Procesos de render")
+        parser.add_argument("--intervalo", type=float, default=2.0, help="Segundos entre consultas a la cola")
+        parser.add_argument("--max-intentos", type=int, default=3)
+        parser.add_argument("--atascados-min", type=int, default=15, help="Reencolar trabajos en curso más antiguos")
+        parser.add_argument("--una-vez", action="store_true", help="Vaciar la cola y terminar (cron)")
+
+    def _nuevo_pool(self, workers):
+        return ProcessPoolExecutor(max_workers=workers, initializer=inicializar_proceso)
+
+    def _liberar_atascados(self, minutos, en_vuelo):
+        liberados = liberar_atascados(minutos, excluir=en_vuelo.values())
+        if liberados:
+            self.stdout.write(f"Reencolados {liberados} trabajos atascados")
+
+    def handle(self, *args, **options):
+        workers = max(1, options["workers"])
+        intervalo = max(0.1, options["intervalo"])
+        max_intentos = max(1, options["max_intentos"])
+        atascados_min = max(1, options["atascados_min"])
+
+        hechos = errores = 0
+        en_vuelo = {}  # future -> trabajo_id
+        self._liberar_atascados(atascados_min, en_vuelo)
+        ultima_revision = time.monotonic()
+        pool = self._nuevo_pool(workers)
+        try:
+            while True:
+                # Proceso de larga duración: sin esto las conexiones caídas o caducadas
+                # (CONN_MAX_AGE, reinicio de la BD) romperían todas las consultas siguientes
+                close_old_connections()
+                if time.monotonic() - ultima_revision >= 60:
+                    self._liberar_atascados(atascados_min, en_vuelo)
+                    ultima_revision = time.monotonic()
+
+                roto = False
+                # El HTML se prepara aquí (BD + plantilla); los hijos solo hacen el render
+                for trabajo in reclamar_trabajos(workers - len(en_vuelo)):
+                    if roto:
+                        # Ya reclamado pero sin pool donde enviarlo: vuelve a la cola
+                        devolver_trabajo(trabajo.id)
+                        continue
+                    try:
+                        clave, html = preparar_trabajo(trabajo)
+                    except Exception as e:
+                        fallar_trabajo(trabajo.id, repr(e), max_intentos)
+                        errores += 1
+                        continue
+                    if pdf_cacheado(clave) is not None:
+                        completar_trabajo(trabajo.id, clave)
+                        hechos += 1
+                        continue
+                    try:
+                        en_vuelo[pool.submit(renderizar_a_cache, clave, html)] = trabajo.id
+                    except BrokenProcessPool:
+                        devolver_trabajo(trabajo.id)
+                        roto = True
+
+                if not en_vuelo and not roto:
+                    if options["una_vez"]:
+                        break
+                    time.sleep(intervalo)
+                    continue
+
+                terminados, _ = wait(list(en_vuelo), timeout=intervalo, return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    trabajo_id = en_vuelo.pop(futuro)
+                    try:
+                        completar_trabajo(trabajo_id, futuro.result())
+                        hechos += 1
+                    except PDFNoDisponible as e:
+                        fallar_trabajo(trabajo_id, f"WeasyPrint no disponible: {e}", reintentar=False)
+                        errores += 1
+                    except BrokenProcessPool as e:
+                        # Un hijo murió (OOM, segfault en WeasyPrint...): cuenta como intento
+                        fallar_trabajo(trabajo_id, repr(e), max_intentos)
+                        errores += 1
+                        roto = True
+                    except Exception as e:
+                        fallar_trabajo(trabajo_id, repr(e), max_intentos)
+                        errores += 1
+
+                if roto:
+                    # Un pool roto no acepta más envíos: lo que quedaba en vuelo se reintenta
+                    # y se sigue con un pool nuevo
+                    for trabajo_id in en_vuelo.values():
+                        fallar_trabajo(trabajo_id, "Pool de render caído", max_intentos)
+                    en_vuelo.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    self.stderr.write("Pool de render caído; se crea uno nuevo")
+                    pool = self._nuevo_pool(workers)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+        self.stdout.write(self.style.SUCCESS(f"PDFs generados: {hechos} · errores: {errores}"))
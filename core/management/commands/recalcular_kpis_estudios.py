@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from core.services.motor_financiero import ITP_PCT
+from core.services.motor_lotes import recalcular_kpis_estudios
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula con NumPy, por lotes, los KPIs de todos los estudios (valor de adquisición, beneficio, "
+        "ROI, neto inversor, breakeven, colchón) y guarda con bulk_update los que cambian. "
+        "Usar tras cambiar la comisión de Inversure o el tipo de ITP. Los estudios bloqueados "
+        "(convertidos en proyecto) no se tocan salvo con --incluir-bloqueados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk", type=int, default=1000, help="Estudios por lote")
+        parser.add_argument("--itp-pct", type=float, default=None, help=f"Tipo de ITP en %% (por defecto {ITP_PCT * 100:g})")
+        parser.add_argument(
+            "--comision-pct", type=float, default=None, help="Comisión Inversure en %% para todos (por defecto la de cada estudio)"
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Calcular sin guardar")
+        parser.add_argument(
+            "--incluir-bloqueados",
+            action="store_true",
+            help="Recalcular también los estudios bloqueados (ya convertidos en proyecto)",
+        )
+
+    def handle(self, *args, **options):
+        itp = ITP_PCT if options["itp_pct"] is None else options["itp_pct"] / 100
+        res = recalcular_kpis_estudios(
+            chunk=max(1, options["chunk"]),
+            itp_pct=itp,
+            comision_pct=options["comision_pct"],
+            guardar=not options["dry_run"],
+            incluir_bloqueados=options["incluir_bloqueados"],
+        )
+        sufijo = " (dry-run, sin guardar)" if options["dry_run"] else ""
+        self.stdout.write(
+            self.style.SUCCESS(f"Estudios revisados: {res['revisados']} · recalculados: {res['actualizados']}{sufijo}")
+        )
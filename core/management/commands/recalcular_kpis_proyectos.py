@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Proyecto, ProyectoSnapshot
+from core.services.proyecto_kpis import aplicar_kpis_proyecto
+from core.services.snapshot_delta import datos_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Rellena/recalcula las columnas desnormalizadas de KPIs de Proyecto "
+        "(capital_objetivo, roi, beneficio_neto, ultima_version_num) desde su último snapshot."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk", type=int, default=200, help="Proyectos por lote (bulk_update)")
+
+    def _snapshot_efectivo(self, p: Proyecto):
+        # Misma prioridad que la vista `proyecto`: último ProyectoSnapshot > snapshot_datos > origen
+        last_ps = (
+            ProyectoSnapshot.objects.filter(proyecto_id=p.id)
+            .order_by("-version_num", "-id")
+            .only("id", "proyecto_id", "version_num", "keyframe_num", "datos", "delta")
+            .first()
+        )
+        if last_ps is not None:
+            datos = datos_snapshot(last_ps)
+            if datos:
+                return datos, last_ps.version_num
+        version_num = last_ps.version_num if last_ps is not None else None
+
+        if isinstance(p.snapshot_datos, dict) and p.snapshot_datos:
+            return p.snapshot_datos, version_num
+        if p.origen_snapshot is not None and isinstance(p.origen_snapshot.datos, dict) and p.origen_snapshot.datos:
+            return p.origen_snapshot.datos, version_num
+        if p.origen_estudio is not None and isinstance(p.origen_estudio.datos, dict) and p.origen_estudio.datos:
+            return p.origen_estudio.datos, version_num
+        return {}, version_num
+
+    def handle(self, *args, **options):
+        chunk = max(1, options["chunk"])
+        campos = ["capital_objetivo", "roi", "beneficio_neto", "ultima_version_num"]
+
+        qs = Proyecto.objects.select_related("origen_snapshot", "origen_estudio").order_by("id")
+        pendientes = []
+        total = 0
+        actualizados = 0
+
+        for p in qs.iterator(chunk_size=chunk):
+            total += 1
+            snap, version_num = self._snapshot_efectivo(p)
+            if aplicar_kpis_proyecto(p, snap, version_num):
+                pendientes.append(p)
+            if len(pendientes) >= chunk:
+                Proyecto.objects.bulk_update(pendientes, campos)
+                actualizados += len(pendientes)
+                pendientes = []
+
+        if pendientes:
+            Proyecto.objects.bulk_update(pendientes, campos)
+            actualizados += len(pendientes)
+
+        self.stdout.write(self.style.SUCCESS(f"Proyectos revisados: {total} · actualizados: {actualizados}"))
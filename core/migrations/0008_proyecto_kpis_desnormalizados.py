@@ -0,0 +1,30 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_alter_estudio_datos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proyecto',
+            name='ultima_version_num',
+            field=models.PositiveIntegerField(blank=True, help_text='Número de la última versión (ProyectoSnapshot) guardada', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='proyecto',
+            index=models.Index(fields=['-roi', '-id'], name='proyecto_roi_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proyecto',
+            index=models.Index(fields=['capital_objetivo'], name='proyecto_capital_obj_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proyecto',
+            index=models.Index(fields=['beneficio_neto'], name='proyecto_benef_neto_idx'),
+        ),
+    ]
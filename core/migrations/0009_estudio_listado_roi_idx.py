@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_proyecto_kpis_desnormalizados'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='estudio',
+            index=models.Index(fields=['guardado', 'bloqueado', '-roi', '-id'], name='estudio_listado_roi_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:39
+
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+
+
+def _safe_float(v, default=0.0):
+    try:
+        if v is None or v == "":
+            return default
+        if isinstance(v, str):
+            s = v.replace("€", "").replace("%", "").strip()
+            if "." in s and "," in s:
+                s = s.replace(".", "").replace(",", ".")
+            else:
+                s = s.replace(",", ".")
+            v = s
+        return float(v)
+    except (TypeError, ValueError):
+        return default
+
+
+def a_decimal_columna(val, max_digits):
+    # Copia de core.services.proyecto_kpis.a_decimal_columna: la migración no depende del código de la app
+    if val is None:
+        return None
+    try:
+        d = Decimal(str(val))
+        if not d.is_finite():
+            return None
+        d = d.quantize(Decimal("0.01"))
+    except (InvalidOperation, ValueError):
+        return None
+    tope = Decimal(10) ** (max_digits - 2) - Decimal("0.01")
+    return max(-tope, min(d, tope))
+
+
+def rellenar_kpis_estudio(apps, schema_editor):
+    """Copia valor_adquisicion / beneficio / roi de `datos` a las columnas reales (mismas reglas que guardar_estudio)."""
+    Estudio = apps.get_model("core", "Estudio")
+    campos = ["valor_adquisicion", "beneficio", "roi"]
+    pendientes = []
+    for e in Estudio.objects.only("id", "datos", *campos).iterator(chunk_size=500):
+        d = e.datos if isinstance(e.datos, dict) else {}
+        valor_adq = _safe_float(d.get("valor_adquisicion") or d.get("precio_adquisicion") or d.get("precio_compra"))
+        valor_transm = _safe_float(d.get("valor_transmision") or d.get("precio_transmision") or d.get("precio_venta_estimado"))
+        beneficio = _safe_float(
+            d.get("beneficio") or d.get("beneficio_estimado"),
+            (valor_transm - valor_adq) if (valor_transm and valor_adq) else 0.0,
+        )
+        roi = _safe_float(d.get("roi") or d.get("roi_estimado"), (beneficio / valor_adq * 100.0) if valor_adq else 0.0)
+
+        e.valor_adquisicion = a_decimal_columna(valor_adq, 12)
+        e.beneficio = a_decimal_columna(beneficio, 12)
+        e.roi = a_decimal_columna(roi, 6)
+        pendientes.append(e)
+        if len(pendientes) >= 500:
+            Estudio.objects.bulk_update(pendientes, campos)
+            pendientes = []
+    if pendientes:
+        Estudio.objects.bulk_update(pendientes, campos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_estudio_listado_roi_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_kpis_estudio, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_rellenar_kpis_estudio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proyecto',
+            name='ultimo_snapshot',
+            field=models.ForeignKey(blank=True, help_text='Último ProyectoSnapshot guardado (evita buscar la versión más alta en cada vista)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.proyectosnapshot'),
+        ),
+        migrations.AddIndex(
+            model_name='proyectosnapshot',
+            index=models.Index(fields=['proyecto', '-version_num'], name='proyectosnap_version_idx'),
+        ),
+    ]
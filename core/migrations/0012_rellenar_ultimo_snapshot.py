@@ -0,0 +1,36 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:40
+
+from django.db import migrations
+
+
+def rellenar_ultimo_snapshot(apps, schema_editor):
+    Proyecto = apps.get_model("core", "Proyecto")
+    ProyectoSnapshot = apps.get_model("core", "ProyectoSnapshot")
+    pendientes = []
+    for p in Proyecto.objects.only("id").iterator(chunk_size=500):
+        ultimo_id = (
+            ProyectoSnapshot.objects.filter(proyecto_id=p.id)
+            .order_by("-version_num", "-id")
+            .values_list("id", flat=True)
+            .first()
+        )
+        if ultimo_id is None:
+            continue
+        p.ultimo_snapshot_id = ultimo_id
+        pendientes.append(p)
+        if len(pendientes) >= 500:
+            Proyecto.objects.bulk_update(pendientes, ["ultimo_snapshot"])
+            pendientes = []
+    if pendientes:
+        Proyecto.objects.bulk_update(pendientes, ["ultimo_snapshot"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_proyecto_ultimo_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_ultimo_snapshot, migrations.RunPython.noop),
+    ]
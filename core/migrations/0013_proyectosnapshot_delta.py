@@ -0,0 +1,28 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_rellenar_ultimo_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proyectosnapshot',
+            name='delta',
+            field=models.JSONField(blank=True, help_text='Diff JSON contra la versión anterior (NULL si esta versión es un keyframe completo)', null=True),
+        ),
+        migrations.AddField(
+            model_name='proyectosnapshot',
+            name='keyframe_num',
+            field=models.PositiveIntegerField(blank=True, help_text='version_num del keyframe sobre el que se reconstruye esta versión', null=True),
+        ),
+        migrations.AlterField(
+            model_name='proyectosnapshot',
+            name='datos',
+            field=models.JSONField(blank=True, help_text='Datos completos congelados del proyecto en este momento (overlay: base_snapshot + reales + kpis). Solo en keyframes; en versiones delta es NULL', null=True),
+        ),
+    ]
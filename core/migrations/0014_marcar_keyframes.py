@@ -0,0 +1,21 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:43
+
+from django.db import migrations
+from django.db.models import F
+
+
+def marcar_keyframes(apps, schema_editor):
+    # Todas las versiones existentes tienen el documento completo: son keyframes
+    ProyectoSnapshot = apps.get_model("core", "ProyectoSnapshot")
+    ProyectoSnapshot.objects.filter(keyframe_num__isnull=True).update(keyframe_num=F("version_num"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_proyectosnapshot_delta'),
+    ]
+
+    operations = [
+        migrations.RunPython(marcar_keyframes, migrations.RunPython.noop),
+    ]
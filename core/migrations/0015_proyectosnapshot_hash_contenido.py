@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_marcar_keyframes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proyectosnapshot',
+            name='hash_contenido',
+            field=models.CharField(blank=True, default='', help_text='SHA-256 del documento completo en forma canónica (detecta autosaves sin cambios)', max_length=64),
+        ),
+    ]
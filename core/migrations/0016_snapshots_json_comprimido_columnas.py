@@ -0,0 +1,29 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:47
+
+import core.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_proyectosnapshot_hash_contenido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estudiosnapshot',
+            name='datos_z',
+            field=core.fields.JSONComprimidoField(null=True),
+        ),
+        migrations.AddField(
+            model_name='proyecto',
+            name='snapshot_datos_z',
+            field=core.fields.JSONComprimidoField(null=True),
+        ),
+        migrations.AddField(
+            model_name='proyectosnapshot',
+            name='datos_z',
+            field=core.fields.JSONComprimidoField(null=True),
+        ),
+    ]
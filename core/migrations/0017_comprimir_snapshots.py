@@ -0,0 +1,50 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:47
+
+from django.db import migrations
+
+# jsonb -> bytea no tiene CAST directo en PostgreSQL: columna nueva (0016), copia por lotes
+# (esta) y borrar la antigua y renombrar (0018). Cada paso en su migración: en PostgreSQL un
+# ALTER TABLE tras actualizar filas en la misma transacción falla con "pending trigger events".
+CAMPOS = [
+    ("EstudioSnapshot", "datos"),
+    ("Proyecto", "snapshot_datos"),
+    ("ProyectoSnapshot", "datos"),
+]
+LOTE = 200
+
+
+def _copiar(apps, origen_sufijo, destino_sufijo):
+    for modelo, campo in CAMPOS:
+        Model = apps.get_model("core", modelo)
+        origen = campo + origen_sufijo
+        destino = campo + destino_sufijo
+        ultimo = 0
+        while True:
+            filas = list(
+                Model.objects.filter(id__gt=ultimo).order_by("id").only("id", origen)[:LOTE]
+            )
+            if not filas:
+                break
+            for f in filas:
+                setattr(f, destino, getattr(f, origen))
+            Model.objects.bulk_update(filas, [destino])
+            ultimo = filas[-1].id
+
+
+def comprimir(apps, schema_editor):
+    _copiar(apps, "", "_z")
+
+
+def descomprimir(apps, schema_editor):
+    _copiar(apps, "_z", "")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_snapshots_json_comprimido_columnas'),
+    ]
+
+    operations = [
+        migrations.RunPython(comprimir, descomprimir),
+    ]
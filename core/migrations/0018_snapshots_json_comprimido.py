@@ -0,0 +1,56 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:47
+
+import core.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_comprimir_snapshots'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='estudiosnapshot',
+            name='datos',
+        ),
+        migrations.RemoveField(
+            model_name='proyecto',
+            name='snapshot_datos',
+        ),
+        migrations.RemoveField(
+            model_name='proyectosnapshot',
+            name='datos',
+        ),
+        migrations.RenameField(
+            model_name='estudiosnapshot',
+            old_name='datos_z',
+            new_name='datos',
+        ),
+        migrations.RenameField(
+            model_name='proyecto',
+            old_name='snapshot_datos_z',
+            new_name='snapshot_datos',
+        ),
+        migrations.RenameField(
+            model_name='proyectosnapshot',
+            old_name='datos_z',
+            new_name='datos',
+        ),
+        migrations.AlterField(
+            model_name='estudiosnapshot',
+            name='datos',
+            field=core.fields.JSONComprimidoField(help_text='Datos completos congelados del estudio (comité, inversor, económico)'),
+        ),
+        migrations.AlterField(
+            model_name='proyecto',
+            name='snapshot_datos',
+            field=core.fields.JSONComprimidoField(blank=True, help_text='Copia inmutable de los datos del snapshot en el momento de conversión', null=True),
+        ),
+        migrations.AlterField(
+            model_name='proyectosnapshot',
+            name='datos',
+            field=core.fields.JSONComprimidoField(blank=True, help_text='Datos completos congelados del proyecto en este momento (overlay: base_snapshot + reales + kpis). Solo en keyframes; en versiones delta es NULL', null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_snapshots_json_comprimido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estudiosnapshot',
+            name='huella',
+            field=models.CharField(blank=True, default='', help_text='Huella del estudio al generar el snapshot (actualizado + hash de datos); permite reutilizarlo en el PDF', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='estudiosnapshot',
+            index=models.Index(fields=['estudio', 'huella'], name='estudiosnap_huella_idx'),
+        ),
+    ]
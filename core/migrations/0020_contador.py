@@ -0,0 +1,21 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_estudiosnapshot_huella'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Contador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(help_text='Identificador del contador (ej: estudio.codigo, proyecto.12.version)', max_length=100, unique=True)),
+                ('valor', models.BigIntegerField(default=0, help_text='Último valor entregado')),
+            ],
+        ),
+    ]
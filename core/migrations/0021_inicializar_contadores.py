@@ -0,0 +1,30 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:50
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def inicializar_contadores(apps, schema_editor):
+    Contador = apps.get_model("core", "Contador")
+    Estudio = apps.get_model("core", "Estudio")
+    ProyectoSnapshot = apps.get_model("core", "ProyectoSnapshot")
+
+    filas = []
+    ultimo = Estudio.objects.aggregate(m=Max("codigo_estudio"))["m"]
+    if ultimo is not None:
+        filas.append(Contador(clave="estudio.codigo", valor=ultimo))
+    for r in ProyectoSnapshot.objects.order_by().values("proyecto_id").annotate(m=Max("version_num")):
+        if r["m"] is not None:
+            filas.append(Contador(clave=f"proyecto.{r['proyecto_id']}.version", valor=r["m"]))
+    Contador.objects.bulk_create(filas, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_contador'),
+    ]
+
+    operations = [
+        migrations.RunPython(inicializar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_inicializar_contadores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proyectosnapshot',
+            name='abierta',
+            field=models.BooleanField(default=False, help_text='Versión de autosave aún abierta: los autosaves dentro de la ventana la actualizan en lugar de crear otra'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.27 on 2026-10-18 03:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_proyectosnapshot_abierta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoPDF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('estudio', 'Estudio de rentabilidad'), ('proyecto', 'Memoria económica de proyecto')], max_length=20)),
+                ('objeto_id', models.PositiveIntegerField(help_text='Id del Estudio o Proyecto a renderizar')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_curso', 'En curso'), ('completado', 'Completado'), ('error', 'Error')], db_index=True, default='pendiente', max_length=20)),
+                ('clave', models.CharField(blank=True, default='', help_text='Clave del PDF en la caché de disco (core.services.pdf_render)', max_length=64)),
+                ('error', models.TextField(blank=True, default='')),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('iniciado', models.DateTimeField(blank=True, null=True)),
+                ('terminado', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['tipo', 'objeto_id', 'estado'], name='trabajopdf_objeto_idx')],
+            },
+        ),
+    ]
@@ -1,6 +1,10 @@
 from django.db import models
 from django.utils.timezone import now
 
+from core.fields import JSONComprimidoField
+from core.services.contadores import siguiente_codigo_estudio, siguiente_version_proyecto
+from core.services.snapshot_delta import hash_contenido
+
 
 class Estudio(models.Model):
     codigo_estudio = models.PositiveIntegerField(
@@ -49,13 +53,22 @@ class Estudio(models.Model):
     creado = models.DateTimeField(auto_now_add=True)
     actualizado = models.DateTimeField(auto_now=True)
 
+    # valor_adquisicion / beneficio / roi se rellenan en cada guardado desde los KPIs
+    # normalizados de `datos`, para poder ordenar y filtrar el listado sin leer el JSON.
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["guardado", "bloqueado", "-roi", "-id"],
+                name="estudio_listado_roi_idx",
+            ),
+        ]
+
     def __str__(self):
         return self.nombre
 
     def save(self, *args, **kwargs):
         if self.codigo_estudio is None:
-            ultimo = Estudio.objects.aggregate(models.Max("codigo_estudio"))["codigo_estudio__max"]
-            self.codigo_estudio = 0 if ultimo is None else ultimo + 1
+            self.codigo_estudio = siguiente_codigo_estudio()
         super().save(*args, **kwargs)
 
 
@@ -110,10 +123,22 @@ class EstudioSnapshot(models.Model):
     )
 
     # --- DATOS CONGELADOS ---
-    datos = models.JSONField(
+    datos = JSONComprimidoField(
         help_text="Datos completos congelados del estudio (comité, inversor, económico)"
     )
 
+    huella = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        help_text="Huella del estudio al generar el snapshot (actualizado + hash de datos); permite reutilizarlo en el PDF"
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["estudio", "huella"], name="estudiosnap_huella_idx"),
+        ]
+
     def __str__(self):
         return (
             f"Snapshot {self.codigo_version} · "
@@ -143,7 +168,7 @@ class Proyecto(models.Model):
         help_text="Snapshot final del estudio usado para convertir a proyecto (estado congelado)"
     )
 
-    snapshot_datos = models.JSONField(
+    snapshot_datos = JSONComprimidoField(
         null=True,
         blank=True,
         help_text="Copia inmutable de los datos del snapshot en el momento de conversión"
@@ -414,6 +439,20 @@ class Proyecto(models.Model):
         help_text="Indica si la inversión del proyecto está completamente cubierta"
     )
 
+    ultima_version_num = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Número de la última versión (ProyectoSnapshot) guardada"
+    )
+    ultimo_snapshot = models.ForeignKey(
+        "ProyectoSnapshot",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        help_text="Último ProyectoSnapshot guardado (evita buscar la versión más alta en cada vista)"
+    )
+
     # =========================
     # ESTADO DEL PROYECTO
     # =========================
@@ -482,6 +521,16 @@ class Proyecto(models.Model):
     # se resuelve exclusivamente en views.py
     # y/o en el frontend (simulador).
 
+    # Las columnas capital_objetivo / roi / beneficio_neto / ultima_version_num
+    # son una copia desnormalizada de los KPIs del último snapshot, para que
+    # el listado de proyectos no tenga que leer ni decodificar el JSON.
+    class Meta:
+        indexes = [
+            models.Index(fields=["-roi", "-id"], name="proyecto_roi_id_idx"),
+            models.Index(fields=["capital_objetivo"], name="proyecto_capital_obj_idx"),
+            models.Index(fields=["beneficio_neto"], name="proyecto_benef_neto_idx"),
+        ]
+
     def es_estudio(self):
         return self.estado == "estudio"
 
@@ -537,12 +586,42 @@ class ProyectoSnapshot(models.Model):
         help_text="Nota corta de la versión (opcional)"
     )
 
-    datos = models.JSONField(
-        help_text="Datos completos congelados del proyecto en este momento (overlay: base_snapshot + reales + kpis)"
+    datos = JSONComprimidoField(
+        null=True,
+        blank=True,
+        help_text="Datos completos congelados del proyecto en este momento (overlay: base_snapshot + reales + kpis). Solo en keyframes; en versiones delta es NULL"
+    )
+
+    # --- ALMACENAMIENTO DELTA (ver core.services.snapshot_delta) ---
+    delta = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Diff JSON contra la versión anterior (NULL si esta versión es un keyframe completo)"
+    )
+
+    keyframe_num = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="version_num del keyframe sobre el que se reconstruye esta versión"
+    )
+
+    hash_contenido = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        help_text="SHA-256 del documento completo en forma canónica (detecta autosaves sin cambios)"
+    )
+
+    abierta = models.BooleanField(
+        default=False,
+        help_text="Versión de autosave aún abierta: los autosaves dentro de la ventana la actualizan en lugar de crear otra"
     )
 
     class Meta:
         ordering = ["-creado_en", "-id"]
+        indexes = [
+            models.Index(fields=["proyecto", "-version_num"], name="proyectosnap_version_idx"),
+        ]
 
     def __str__(self):
         cod = self.codigo_version or f"Proyecto {self.proyecto_id}"
@@ -551,12 +630,14 @@ class ProyectoSnapshot(models.Model):
     def save(self, *args, **kwargs):
         # Autonumeración por proyecto
         if self.version_num is None:
-            ultimo = (
-                ProyectoSnapshot.objects.filter(proyecto=self.proyecto)
-                .aggregate(models.Max("version_num"))
-                .get("version_num__max")
-            )
-            self.version_num = 1 if ultimo is None else int(ultimo) + 1
+            self.version_num = siguiente_version_proyecto(self.proyecto_id)
+
+        # Un keyframe (documento completo) se reconstruye desde sí mismo
+        if self.delta is None and self.keyframe_num is None:
+            self.keyframe_num = self.version_num
+
+        if not self.hash_contenido and self.delta is None and isinstance(self.datos, dict):
+            self.hash_contenido = hash_contenido(self.datos)
 
         # Código legible
         if not self.codigo_version:
@@ -1376,4 +1457,68 @@ class MovimientoProyecto(models.Model):
         ordering = ["fecha", "id"]
 
     def __str__(self):
-        return f"{self.proyecto} · {self.tipo} · {self.importe} €"
\ No newline at end of file
+        return f"{self.proyecto} · {self.tipo} · {self.importe} €"
+
+# =========================
+# CONTADORES (numeración sin carreras: ver core.services.contadores)
+# =========================
+class Contador(models.Model):
+    clave = models.CharField(
+        max_length=100,
+        unique=True,
+        help_text="Identificador del contador (ej: estudio.codigo, proyecto.12.version)"
+    )
+    valor = models.BigIntegerField(
+        default=0,
+        help_text="Último valor entregado"
+    )
+
+    def __str__(self):
+        return f"{self.clave} = {self.valor}"
+
+
+class TrabajoPDF(models.Model):
+    """Render de PDF en segundo plano (cola en BD, la procesa `manage.py procesar_pdfs`)."""
+
+    TIPO_CHOICES = (
+        ("estudio", "Estudio de rentabilidad"),
+        ("proyecto", "Memoria económica de proyecto"),
+    )
+    ESTADO_CHOICES = (
+        ("pendiente", "Pendiente"),
+        ("en_curso", "En curso"),
+        ("completado", "Completado"),
+        ("error", "Error"),
+    )
+
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    objeto_id = models.PositiveIntegerField(
+        help_text="Id del Estudio o Proyecto a renderizar"
+    )
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADO_CHOICES,
+        default="pendiente",
+        db_index=True,
+    )
+    clave = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        help_text="Clave del PDF en la caché de disco (core.services.pdf_render)"
+    )
+    error = models.TextField(blank=True, default="")
+    intentos = models.PositiveIntegerField(default=0)
+
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["tipo", "objeto_id", "estado"], name="trabajopdf_objeto_idx"),
+        ]
+
+    def __str__(self):
+        return f"PDF {self.tipo} #{self.objeto_id} ({self.estado})"
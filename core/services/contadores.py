@@ -0,0 +1,82 @@
+"""Contadores en BD para numeraciones correlativas (codigo_estudio, version_num).
+
+Sustituyen al patrón `aggregate(Max(...)) + 1`, que cuesta una consulta extra y deja
+que dos escrituras concurrentes obtengan el mismo número.
+
+El incremento es un `UPDATE ... SET valor = valor + 1` (bloqueo de fila en PostgreSQL,
+bloqueo de escritura en SQLite) que se mantiene hasta el final de la transacción que lo
+envuelve: quien llega después espera y recibe el siguiente número. Con `RETURNING`
+(PostgreSQL, SQLite >= 3.35) incremento y lectura son una sola consulta; en el resto de
+motores se lee el valor con una segunda.
+"""
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Max
+
+
+def _update_returning() -> bool:
+    # MariaDB admite RETURNING en INSERT pero no en UPDATE: solo PostgreSQL y SQLite
+    return connection.vendor == "postgresql" or (
+        connection.vendor == "sqlite" and connection.features.can_return_columns_from_insert
+    )
+
+
+def _incrementar(clave: str):
+    """Nuevo valor del contador `clave` tras sumarle 1; None si no existe."""
+    from core.models import Contador
+
+    if _update_returning():
+        tabla = connection.ops.quote_name(Contador._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f"UPDATE {tabla} SET valor = valor + 1 WHERE clave = %s RETURNING valor", [clave])
+            fila = cursor.fetchone()
+        return None if fila is None else int(fila[0])
+
+    if Contador.objects.filter(clave=clave).update(valor=F("valor") + 1):
+        return Contador.objects.filter(clave=clave).values_list("valor", flat=True).get()
+    return None
+
+
+def siguiente_valor(clave: str, semilla=None) -> int:
+    """Incrementa y devuelve el contador `clave`.
+
+    Si el contador no existe se crea a partir de `semilla()` (último valor ya usado,
+    por ejemplo el MAX actual de la tabla); el primer valor entregado es semilla + 1.
+    """
+    from core.models import Contador
+
+    with transaction.atomic():
+        for _ in range(3):
+            valor = _incrementar(clave)
+            if valor is not None:
+                return valor
+
+            inicial = int(semilla() if semilla is not None else 0) + 1
+            try:
+                with transaction.atomic():
+                    Contador.objects.create(clave=clave, valor=inicial)
+                return inicial
+            except IntegrityError:
+                # Otro proceso lo ha creado a la vez: volvemos a incrementar
+                continue
+    raise RuntimeError(f"No se pudo obtener el contador {clave}")
+
+
+def siguiente_codigo_estudio() -> int:
+    from core.models import Estudio
+
+    def _semilla():
+        ultimo = Estudio.objects.aggregate(Max("codigo_estudio"))["codigo_estudio__max"]
+        return -1 if ultimo is None else ultimo
+
+    return siguiente_valor("estudio.codigo", _semilla)
+
+
+def siguiente_version_proyecto(proyecto_id: int) -> int:
+    from core.models import ProyectoSnapshot
+
+    def _semilla():
+        ultimo = ProyectoSnapshot.objects.filter(proyecto_id=proyecto_id).aggregate(Max("version_num"))["version_num__max"]
+        return 0 if ultimo is None else int(ultimo)
+
+    return siguiente_valor(f"proyecto.{proyecto_id}.version", _semilla)
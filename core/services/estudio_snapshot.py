@@ -1,5 +1,36 @@
+import hashlib
+
 from django.utils import timezone
 
+from core.services.snapshot_delta import hash_contenido
+
+# Subir si cambia el contenido que generan build_estudio_snapshot / el enriquecimiento del PDF
+VERSION_SNAPSHOT_PDF = 2
+
+
+def huella_estudio(estudio) -> str:
+    """Identifica el estado del estudio: mismo valor => el snapshot del PDF sería el mismo."""
+    partes = [
+        str(VERSION_SNAPSHOT_PDF),
+        estudio.actualizado.isoformat() if estudio.actualizado else "",
+        hash_contenido(estudio.datos or {}),
+        str(getattr(estudio, "nombre", "") or ""),
+        str(getattr(estudio, "direccion", "") or ""),
+        str(getattr(estudio, "ref_catastral", "") or ""),
+        str(getattr(estudio, "valor_referencia", "") or ""),
+    ]
+    return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()
+
+
+def _riesgo_montecarlo(datos: dict):
+    from core.services.montecarlo import riesgo_estudio
+
+    try:
+        return riesgo_estudio(datos)
+    except Exception:
+        return None
+
+
 def build_estudio_snapshot(estudio):
     """
     Snapshot FINAL, único y autocontenido del estudio.
@@ -51,7 +82,10 @@ def build_estudio_snapshot(estudio):
             "ratio_euro_beneficio": datos.get("ratio_euro_beneficio"),
             "colchon_seguridad": datos.get("colchon_seguridad"),
             "precio_breakeven": datos.get("precio_breakeven"),
-        }
+        },
+
+        # Monte Carlo (percentiles de ROI, probabilidad de pérdida); None sin precio/valoraciones
+        "riesgo": _riesgo_montecarlo(datos),
     }
 
     return snapshot
\ No newline at end of file
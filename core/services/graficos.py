@@ -0,0 +1,238 @@
+"""Gráficos del PDF del estudio con matplotlib (break-even, reparto del beneficio, ROI).
+
+- Backend Agg sin pyplot: Figure + canvas propios, sin estado global ni ventanas.
+- Memoización LRU sobre la tupla de entradas redondeadas: estudios con los mismos
+  porcentajes (y los re-renders del mismo estudio) reutilizan el SVG/PNG ya generado.
+- La primera importación de matplotlib en una máquina construye la caché de fuentes
+  (varios segundos). Eso se hace en un hilo aparte: hasta que termina, las funciones
+  devuelven None y la plantilla usa sus gráficos HTML/CSS de siempre.
+"""
+
+import base64
+import io
+import os
+import threading
+from functools import lru_cache
+
+COLOR_BASE = "#9ca3af"  # --bar-mid de pdf_estudio_rentabilidad.html
+COLOR_SUAVE = "#e5e7eb"  # --bar-soft
+COLOR_INVERSURE = "#122135"  # --inversure-blue
+COLOR_TEXTO = "#111827"
+
+# Mismos umbrales que las etiquetas de lista_estudio (Revisar / Viable / Muy viable)
+UMBRAL_ROI_VIABLE = 12.0
+UMBRAL_ROI_MUY_VIABLE = 20.0
+
+MAX_GRAFICOS_CACHEADOS = 512
+
+_listo = threading.Event()
+_arranque = threading.Lock()
+_hilo = None
+
+
+def _preparar_matplotlib() -> None:
+    import matplotlib
+
+    matplotlib.use("Agg", force=True)
+    matplotlib.rcParams.update(
+        {
+            "font.family": "DejaVu Sans",  # incluida en matplotlib: no depende de las fuentes del sistema
+            "font.size": 9,
+            "svg.fonttype": "none",  # texto como <text>: SVG más ligero, lo maqueta WeasyPrint
+            "svg.hashsalt": "inversure",  # ids estables: mismo gráfico => mismo SVG
+        }
+    )
+    from matplotlib import font_manager  # noqa: F401  (construye/lee la caché de fuentes)
+
+    _listo.set()
+
+
+def _cache_fuentes_existente() -> bool:
+    try:
+        from pathlib import Path
+
+        import matplotlib
+
+        return any(Path(matplotlib.get_cachedir()).glob("fontlist-*.json"))
+    except Exception:
+        return False
+
+
+def _reiniciar_tras_fork() -> None:
+    """En el hijo de un fork el hilo de carga no existe: sin esto `esperar=True` no volvería nunca."""
+    global _hilo, _arranque, _listo
+    _arranque = threading.Lock()  # podía estar tomado por otro hilo en el momento del fork
+    if not _listo.is_set():
+        _listo = threading.Event()
+        _hilo = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reiniciar_tras_fork)
+
+
+def graficos_listos(esperar: bool = False) -> bool:
+    """True si matplotlib está cargado. Si no, lo prepara sin bloquear (salvo `esperar`)."""
+    global _hilo
+    if _listo.is_set():
+        return True
+    with _arranque:
+        if _hilo is not None and not _hilo.is_alive() and not _listo.is_set():
+            # El hilo murió (excepción en la carga o proceso hijo de un fork): se reintenta
+            _hilo = None
+        if not _listo.is_set() and _hilo is None:
+            if esperar or _cache_fuentes_existente():
+                # Con la caché de fuentes ya en disco la carga es rápida: en línea
+                try:
+                    _preparar_matplotlib()
+                except Exception:
+                    return False
+                return True
+            _hilo = threading.Thread(target=_preparar_matplotlib, name="graficos-matplotlib", daemon=True)
+            _hilo.start()
+    if esperar:
+        _listo.wait()
+    return _listo.is_set()
+
+
+def _figura(ancho: float, alto: float):
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(ancho, alto), dpi=100)
+    fig.patch.set_alpha(0)
+    return fig
+
+
+def _exportar(fig, formato: str) -> bytes:
+    buf = io.BytesIO()
+    metadata = {"Date": None} if formato == "svg" else {"Software": None}
+    fig.savefig(buf, format=formato, metadata=metadata, transparent=True, bbox_inches="tight", pad_inches=0.02)
+    return buf.getvalue()
+
+
+def _barra_apilada(ax, partes, colores, etiquetas):
+    izquierda = 0.0
+    for valor, color, etiqueta in zip(partes, colores, etiquetas):
+        ax.barh(0, valor, left=izquierda, height=0.6, color=color)
+        if valor >= 12:
+            ax.text(izquierda + valor / 2, 0, etiqueta, ha="center", va="center", color="white", fontsize=8)
+        izquierda += valor
+    ax.set_xlim(0, 100)
+    ax.set_ylim(-0.5, 0.5)
+    ax.axis("off")
+
+
+@lru_cache(maxsize=MAX_GRAFICOS_CACHEADOS)
+def _breakeven(pct_be: float, pct_col: float, formato: str) -> bytes:
+    fig = _figura(4.2, 0.55)
+    ax = fig.add_axes([0, 0, 1, 1])
+    _barra_apilada(
+        ax,
+        (pct_be, pct_col),
+        (COLOR_BASE, COLOR_INVERSURE),
+        (f"Break-even {pct_be:.0f}%", f"Colchón {pct_col:.0f}%"),
+    )
+    return _exportar(fig, formato)
+
+
+@lru_cache(maxsize=MAX_GRAFICOS_CACHEADOS)
+def _reparto(pct_com: float, pct_net: float, formato: str) -> bytes:
+    fig = _figura(1.4, 1.4)
+    ax = fig.add_axes([0, 0, 1, 1])
+    resto = max(0.0, 100.0 - pct_com - pct_net)
+    valores = [v for v in (pct_net, pct_com, resto) if v > 0] or [100.0]
+    colores = [c for v, c in zip((pct_net, pct_com, resto), (COLOR_INVERSURE, COLOR_BASE, COLOR_SUAVE)) if v > 0]
+    ax.pie(
+        valores,
+        colors=colores or [COLOR_SUAVE],
+        startangle=90,
+        counterclock=False,
+        wedgeprops={"width": 0.28, "edgecolor": "white", "linewidth": 1},
+    )
+    ax.text(0, 0, f"{pct_net:.0f}%", ha="center", va="center", fontsize=12, fontweight="bold", color=COLOR_TEXTO)
+    ax.set_aspect("equal")
+    return _exportar(fig, formato)
+
+
+@lru_cache(maxsize=MAX_GRAFICOS_CACHEADOS)
+def _roi(roi: float, formato: str) -> bytes:
+    tope = max(30.0, roi + 5.0)
+    fig = _figura(4.2, 0.7)
+    ax = fig.add_axes([0.02, 0.3, 0.96, 0.6])
+    suelo = min(0.0, roi - 5.0)
+    for desde, hasta, alfa in (
+        (suelo, UMBRAL_ROI_VIABLE, 0.35),
+        (UMBRAL_ROI_VIABLE, UMBRAL_ROI_MUY_VIABLE, 0.6),
+        (UMBRAL_ROI_MUY_VIABLE, tope, 0.9),
+    ):
+        ax.barh(0, hasta - desde, left=desde, height=0.5, color=COLOR_SUAVE, alpha=alfa)
+    ax.barh(0, roi - suelo, left=suelo, height=0.22, color=COLOR_INVERSURE)
+    ax.axvline(roi, color=COLOR_TEXTO, linewidth=1)
+    ax.text(roi, 0.42, f"{roi:.1f}%", ha="center", va="bottom", fontsize=8, color=COLOR_TEXTO)
+    ax.set_xlim(suelo, tope)
+    ax.set_ylim(-0.4, 0.8)
+    ax.set_yticks([])
+    ax.set_xticks([UMBRAL_ROI_VIABLE, UMBRAL_ROI_MUY_VIABLE])
+    ax.set_xticklabels([f"{UMBRAL_ROI_VIABLE:.0f}%", f"{UMBRAL_ROI_MUY_VIABLE:.0f}%"], fontsize=7)
+    for lado in ("top", "right", "left"):
+        ax.spines[lado].set_visible(False)
+    return _exportar(fig, formato)
+
+
+def _pct(x) -> float:
+    try:
+        return round(min(100.0, max(0.0, float(x))), 1)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def grafico_breakeven(pct_be, pct_col, formato: str = "svg", esperar: bool = False):
+    """Barra break-even + colchón (porcentajes sobre la venta estimada). None si no está listo."""
+    if not graficos_listos(esperar):
+        return None
+    return _breakeven(_pct(pct_be), _pct(pct_col), formato)
+
+
+def grafico_reparto(pct_com, pct_net, formato: str = "svg", esperar: bool = False):
+    """Donut del neto inversor frente a la comisión (porcentajes sobre el beneficio)."""
+    if not graficos_listos(esperar):
+        return None
+    return _reparto(_pct(pct_com), _pct(pct_net), formato)
+
+
+def grafico_roi(roi, formato: str = "svg", esperar: bool = False):
+    """ROI sobre las bandas Revisar / Viable / Muy viable."""
+    if not graficos_listos(esperar):
+        return None
+    try:
+        valor = round(max(-100.0, min(200.0, float(roi))), 1)
+    except (TypeError, ValueError):
+        return None
+    return _roi(valor, formato)
+
+
+def como_html(contenido: bytes, formato: str = "svg") -> str:
+    """SVG en línea (sin la cabecera XML) o <img> con data URI para PNG."""
+    if formato == "svg":
+        texto = contenido.decode("utf-8")
+        inicio = texto.find("<svg")
+        return texto[inicio:] if inicio >= 0 else texto
+    return f'<img src="data:image/png;base64,{base64.b64encode(contenido).decode("ascii")}" alt="">'
+
+
+def graficos_pdf_estudio(visual: dict, roi) -> dict:
+    """Gráficos del PDF en HTML listo para la plantilla; {} mientras matplotlib no esté listo."""
+    if not graficos_listos():
+        return {}
+    graficos = {}
+    try:
+        if visual.get("pct_be") or visual.get("pct_col"):
+            graficos["breakeven"] = como_html(grafico_breakeven(visual.get("pct_be"), visual.get("pct_col")))
+        if visual.get("pct_com") or visual.get("pct_net"):
+            graficos["reparto"] = como_html(grafico_reparto(visual.get("pct_com"), visual.get("pct_net")))
+        svg_roi = grafico_roi(roi) if roi not in (None, "") else None
+        if svg_roi:
+            graficos["roi"] = como_html(svg_roi)
+    except Exception:
+        return {}
+    return graficos
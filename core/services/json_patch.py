@@ -0,0 +1,59 @@
+"""Subconjunto de JSON Patch (RFC 6902) para el autosave incremental de proyecto.js.
+
+Operaciones: add, replace, remove. Las rutas son JSON Pointer (RFC 6901) sobre objetos;
+las listas se tratan como valores atómicos (el cliente las reemplaza enteras).
+"""
+
+from copy import deepcopy
+
+
+class JSONPatchError(ValueError):
+    pass
+
+
+def _ruta(pointer) -> list:
+    if not isinstance(pointer, str) or (pointer and not pointer.startswith("/")):
+        raise JSONPatchError(f"Ruta no válida: {pointer!r}")
+    if pointer == "":
+        return []
+    return [p.replace("~1", "/").replace("~0", "~") for p in pointer[1:].split("/")]
+
+
+def aplicar_json_patch(doc: dict, ops: list) -> dict:
+    """Devuelve una copia de `doc` con las operaciones aplicadas (JSONPatchError si alguna no aplica)."""
+    if not isinstance(ops, list):
+        raise JSONPatchError("El patch debe ser una lista de operaciones")
+
+    res = deepcopy(doc) if isinstance(doc, dict) else {}
+    for op in ops:
+        if not isinstance(op, dict):
+            raise JSONPatchError("Operación no válida")
+        accion = op.get("op")
+        ruta = _ruta(op.get("path"))
+        if not ruta:
+            if accion in ("add", "replace") and isinstance(op.get("value"), dict):
+                res = deepcopy(op["value"])
+                continue
+            raise JSONPatchError("No se puede modificar la raíz")
+
+        nodo = res
+        for k in ruta[:-1]:
+            if not isinstance(nodo.get(k), dict):
+                if accion == "remove":
+                    raise JSONPatchError(f"Ruta inexistente: {op.get('path')}")
+                # `add` sobre un padre inexistente: lo creamos (el overlay es disperso)
+                nodo[k] = {}
+            nodo = nodo[k]
+
+        clave = ruta[-1]
+        if accion in ("add", "replace"):
+            if "value" not in op:
+                raise JSONPatchError("Falta `value`")
+            nodo[clave] = deepcopy(op["value"])
+        elif accion == "remove":
+            if clave not in nodo:
+                raise JSONPatchError(f"Ruta inexistente: {op.get('path')}")
+            del nodo[clave]
+        else:
+            raise JSONPatchError(f"Operación no soportada: {accion!r}")
+    return res
@@ -0,0 +1,148 @@
+"""Simulación Monte Carlo del riesgo de un estudio (NumPy, semilla fija).
+
+`nivel_riesgo` y `colchon_seguridad` del comité son estimaciones puntuales. Aquí se
+simulan N escenarios con:
+
+- Precio de venta: normal centrada en la media de las valoraciones (tasación, Idealista,
+  Fotocasa, Registradores, Casafari) con su dispersión; nunca por debajo de
+  SIGMA_MINIMA_PCT, ni de SIGMA_UNA_VALORACION_PCT si solo hay una fuente.
+- Retraso sobre el plazo previsto: gamma (media RETRASO_MEDIO_MESES); cada mes de más
+  cuesta `coste_mensual` (por defecto COSTE_MENSUAL_PCT del precio de escritura).
+- Sobrecoste de obra/gastos extra: triangular (SOBRECOSTE_MIN/MODA/MAX).
+
+Cada escenario aplica las fórmulas de core.services.motor_financiero. La semilla por
+defecto sale de las entradas: el mismo estudio da siempre el mismo resultado.
+"""
+
+from core.services.motor_financiero import (
+    BENEFICIO_MINIMO,
+    ITP_PCT,
+    NOTARIA_MIN,
+    NOTARIA_PCT,
+    REGISTRO_MIN,
+    REGISTRO_PCT,
+    a_numero,
+    entradas_desde_datos,
+)
+from core.services.snapshot_delta import hash_contenido
+
+SIMULACIONES = 100_000
+MAX_SIMULACIONES = 1_000_000
+
+SIGMA_MINIMA_PCT = 3.0
+SIGMA_UNA_VALORACION_PCT = 7.5
+
+MESES_PREVISTOS = 9
+RETRASO_MEDIO_MESES = 2.0
+COSTE_MENSUAL_PCT = 0.1
+
+SOBRECOSTE_MIN = 0.0
+SOBRECOSTE_MODA = 0.05
+SOBRECOSTE_MAX = 0.30
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Probabilidad de pérdida (%) a partir de la cual sube el nivel de riesgo
+RIESGO_MEDIO_PCT = 5.0
+RIESGO_ALTO_PCT = 20.0
+
+
+def supuestos_desde_datos(datos: dict) -> dict | None:
+    """Entradas de la simulación; None si faltan precio de escritura o valoraciones."""
+    e = entradas_desde_datos(datos)
+    precio = a_numero(e["precio_escritura"])
+    valoraciones = [v for v in (a_numero(x) for x in e["valoraciones"]) if v > 0]
+    if precio <= 0 or not valoraciones:
+        return None
+    datos = datos if isinstance(datos, dict) else {}
+    meses = a_numero(datos.get("meses")) or MESES_PREVISTOS
+    coste_mensual = a_numero(datos.get("coste_mensual")) or precio * COSTE_MENSUAL_PCT / 100
+    return {
+        "precio_escritura": precio,
+        "gastos_extras": a_numero(e["gastos_extras"]),
+        "valoraciones": valoraciones,
+        "comision_pct": a_numero(e["comision_pct"]),
+        "meses_previstos": meses,
+        "coste_mensual": coste_mensual,
+    }
+
+
+def semilla_por_defecto(supuestos: dict) -> int:
+    return int(hash_contenido(supuestos)[:8], 16)
+
+
+def simular(supuestos: dict, simulaciones: int = SIMULACIONES, semilla: int | None = None) -> dict:
+    """Resumen de la simulación (percentiles de ROI, probabilidad de pérdida...), listo para JSON."""
+    import numpy as np
+
+    n = max(1, min(int(simulaciones), MAX_SIMULACIONES))
+    if semilla is None:
+        semilla = semilla_por_defecto(supuestos)
+    rng = np.random.default_rng(semilla)
+
+    precio = supuestos["precio_escritura"]
+    valoraciones = np.asarray(supuestos["valoraciones"], dtype=np.float64)
+    media = float(valoraciones.mean())
+    minima = SIGMA_MINIMA_PCT if len(valoraciones) > 1 else SIGMA_UNA_VALORACION_PCT
+    dispersion = float(valoraciones.std(ddof=1)) if len(valoraciones) > 1 else 0.0
+    sigma = max(dispersion, media * minima / 100)
+
+    venta = np.maximum(media + sigma * rng.standard_normal(n), 0.0)
+    retraso = rng.gamma(2.0, RETRASO_MEDIO_MESES / 2.0, n)
+    sobrecoste = rng.triangular(SOBRECOSTE_MIN, SOBRECOSTE_MODA, SOBRECOSTE_MAX, n)
+
+    # Misma adquisición que el motor + sobrecostes del escenario
+    itp = precio * ITP_PCT
+    notaria = max(precio * NOTARIA_PCT, NOTARIA_MIN)
+    registro = max(precio * REGISTRO_PCT, REGISTRO_MIN)
+    va = precio + itp + notaria + registro + supuestos["gastos_extras"] * (1 + sobrecoste) + supuestos["coste_mensual"] * retraso
+
+    beneficio = venta - va
+    roi = beneficio / va * 100
+    comision = np.where(beneficio > 0, beneficio * supuestos["comision_pct"] / 100, 0.0)
+    neto = beneficio - comision
+    roi_neto = neto / va * 100
+    meses = supuestos["meses_previstos"] + retraso
+    roi_anual = (np.power(np.maximum(1 + roi_neto / 100, 1e-12), 12 / meses) - 1) * 100
+
+    def _pcts(arr, prefijo):
+        return {f"{prefijo}_p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(arr, PERCENTILES))}
+
+    prob_perdida = float(np.mean(beneficio < 0) * 100)
+    if prob_perdida >= RIESGO_ALTO_PCT:
+        nivel = "Alto"
+    elif prob_perdida >= RIESGO_MEDIO_PCT:
+        nivel = "Medio"
+    else:
+        nivel = "Bajo"
+
+    return {
+        "simulaciones": n,
+        "semilla": int(semilla),
+        "supuestos": {
+            "venta_media": round(media, 2),
+            "venta_sigma": round(sigma, 2),
+            "meses_previstos": supuestos["meses_previstos"],
+            "retraso_medio_meses": RETRASO_MEDIO_MESES,
+            "coste_mensual": round(supuestos["coste_mensual"], 2),
+            "sobrecoste_obra_pct": [SOBRECOSTE_MIN * 100, SOBRECOSTE_MODA * 100, SOBRECOSTE_MAX * 100],
+        },
+        **_pcts(roi, "roi"),
+        **_pcts(roi_neto, "roi_neto"),
+        **_pcts(roi_anual, "roi_anual"),
+        **_pcts(neto, "beneficio_neto"),
+        "prob_perdida": round(prob_perdida, 2),
+        "prob_colchon": round(float(np.mean(beneficio >= BENEFICIO_MINIMO) * 100), 2),
+        "nivel_riesgo": nivel,
+    }
+
+
+def riesgo_estudio(datos: dict, simulaciones: int = SIMULACIONES, semilla: int | None = None) -> dict | None:
+    """Simulación para un `Estudio.datos`; None si no hay datos suficientes o falta NumPy."""
+    supuestos = supuestos_desde_datos(datos)
+    if supuestos is None:
+        return None
+    try:
+        return simular(supuestos, simulaciones=simulaciones, semilla=semilla)
+    except ImportError:
+        return None
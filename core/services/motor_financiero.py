@@ -0,0 +1,195 @@
+"""Motor económico del estudio en Python: réplica de `recalcularTodo` (core/static/core/simulador.js).
+
+Mismas fórmulas y mismo orden de operaciones que el JS (ambos trabajan en coma flotante
+IEEE-754 de doble precisión), de modo que para las mismas entradas los resultados son
+idénticos bit a bit. Los tests de core/tests.py comparan contra salidas reales del JS.
+
+Si cambia una fórmula en simulador.js hay que cambiarla aquí y regenerar los valores
+de referencia de los tests.
+
+Excepción: `calcular_inversor` (comisión de Inversure y neto del inversor) solo existe en
+el servidor; el simulador envía el % de comisión pero no calcula el importe.
+"""
+
+ITP_PCT = 0.02
+NOTARIA_PCT = 0.002
+NOTARIA_MIN = 500
+REGISTRO_PCT = 0.002
+REGISTRO_MIN = 500
+
+# Beneficio mínimo exigido (colchón) y objetivo (breakeven), en €
+BENEFICIO_MINIMO = 30000
+BENEFICIO_OBJETIVO = 30000
+
+# Semáforo por ROI (%)
+ROI_VERDE = 20
+ROI_AMARILLO = 10
+
+# Orden de los inputs `.valoracion` en simulador.html; el JS les asigna data-id="valoracion_<i>"
+VALORACIONES = ("tasacion", "idealista", "fotocasa", "registradores", "casafari")
+
+_TEXTOS_SEMAFORO = {
+    "verde": (
+        "Bajo",
+        "Aprobación recomendada",
+        "La operación presenta un margen atractivo y bajo riesgo.",
+    ),
+    "amarillo": (
+        "Medio",
+        "Requiere revisión adicional",
+        "La operación es viable, aunque el margen es ajustado.",
+    ),
+    "rojo": (
+        "Alto",
+        "No recomendable",
+        "El margen es insuficiente. Se desaconseja la operación.",
+    ),
+}
+
+
+def a_numero(v) -> float:
+    """`v || 0` del JS para valores ya numéricos (None, "", 0 => 0)."""
+    if v is None or v == "":
+        return 0
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return 0
+
+
+def semaforo(roi: float) -> str:
+    if roi >= ROI_VERDE:
+        return "verde"
+    if roi >= ROI_AMARILLO:
+        return "amarillo"
+    return "rojo"
+
+
+def recalcular_estudio(precio_escritura, valoraciones=(), gastos_extras=None, itp_pct=ITP_PCT):
+    """KPIs del estudio como los deja `recalcularTodo` en `estadoEstudio`.
+
+    `valoraciones` en el orden de VALORACIONES (las <= 0 se ignoran, como en el JS).
+    `itp_pct` solo se cambia para simular otro tipo de ITP (recálculo masivo).
+    Devuelve None si no hay precio de escritura: el JS no recalcula en ese caso.
+    """
+    precio = a_numero(precio_escritura)
+    if not precio:
+        return None
+
+    itp = precio * itp_pct
+    notaria = max(precio * NOTARIA_PCT, NOTARIA_MIN)
+    registro = max(precio * REGISTRO_PCT, REGISTRO_MIN)
+
+    suma = 0
+    contador = 0
+    for v in valoraciones:
+        val = a_numero(v)
+        if val > 0:
+            suma += val
+            contador += 1
+    media = suma / contador if contador else None
+    valor_transmision = media
+
+    valor_adquisicion = precio + itp + notaria + registro + a_numero(gastos_extras)
+
+    # En el JS `null - x` vale `-x`: sin valoraciones, el beneficio es -valor_adquisicion
+    vt = valor_transmision or 0
+    beneficio = vt - valor_adquisicion
+    roi = (beneficio / valor_adquisicion) * 100 if valor_adquisicion > 0 else 0
+    margen_pct = (beneficio / vt) * 100 if vt > 0 else 0
+    color = semaforo(roi)
+    nivel_riesgo, decision_texto, conclusion = _TEXTOS_SEMAFORO[color]
+
+    return {
+        "precio_escritura": precio,
+        "itp": itp,
+        "notaria": notaria,
+        "registro": registro,
+        "gastos_extras": a_numero(gastos_extras),
+        "media_valoraciones": media,
+        "valor_transmision": valor_transmision,
+        "valor_adquisicion": valor_adquisicion,
+        "comite": {
+            "beneficio_bruto": beneficio,
+            "roi": roi,
+            "margen_pct": margen_pct,
+            "semaforo": color,
+            "ratio_euro_beneficio": valor_adquisicion / beneficio if beneficio > 0 else 0,
+            "colchon_seguridad": (vt - valor_adquisicion) - BENEFICIO_MINIMO if vt > 0 else 0,
+            "breakeven": valor_adquisicion + BENEFICIO_OBJETIVO if valor_adquisicion > 0 else 0,
+            "nivel_riesgo": nivel_riesgo,
+            "colchon_mercado": (vt / valor_adquisicion) * 100 if valor_adquisicion > 0 else 0,
+            "decision_texto": decision_texto,
+            "conclusion": conclusion,
+        },
+    }
+
+
+def calcular_inversor(valor_adquisicion, beneficio_bruto, comision_pct) -> dict:
+    """Vista inversor: la comisión de Inversure (% sobre beneficio bruto) se descuenta antes del reparto.
+
+    Sin beneficio no hay comisión. Solo en el servidor: no tiene equivalente en simulador.js.
+    """
+    va = a_numero(valor_adquisicion)
+    bruto = a_numero(beneficio_bruto)
+    pct = a_numero(comision_pct)
+    comision = bruto * pct / 100 if bruto > 0 else 0
+    neto = bruto - comision
+    return {
+        "inversion_total": va,
+        "comision_pct": pct,
+        "comision_eur": comision,
+        "beneficio_neto": neto,
+        "roi_neto": (neto / va) * 100 if va > 0 else 0,
+    }
+
+
+def entradas_desde_datos(datos: dict) -> dict:
+    """Entradas del motor a partir de `Estudio.datos` (el simulador guarda su estado en `snapshot`)."""
+    datos = datos if isinstance(datos, dict) else {}
+    snap = datos.get("snapshot") if isinstance(datos.get("snapshot"), dict) else {}
+
+    def _primero(*claves):
+        for origen in (snap, datos):
+            for k in claves:
+                v = origen.get(k)
+                if v not in (None, ""):
+                    return v
+        return None
+
+    valores = [None] * len(VALORACIONES)
+    for origen in (datos, snap):
+        vals = origen.get("valoraciones") if isinstance(origen.get("valoraciones"), dict) else {}
+        for i, nombre in enumerate(VALORACIONES):
+            for k in (f"valoracion_{i}", nombre, f"valoracion_{nombre}"):
+                if vals.get(k) not in (None, ""):
+                    valores[i] = vals[k]
+            if origen.get(f"valoracion_{nombre}") not in (None, ""):
+                valores[i] = origen[f"valoracion_{nombre}"]
+
+    inversor = datos.get("inversor") if isinstance(datos.get("inversor"), dict) else {}
+    comision = datos.get("inversure_comision_pct")
+    if comision in (None, ""):
+        comision = inversor.get("comision_pct") or datos.get("comision_inversure_pct")
+
+    return {
+        "precio_escritura": _primero("precio_escritura"),
+        "gastos_extras": _primero("gastos_extras"),
+        "valoraciones": valores,
+        "comision_pct": comision,
+    }
+
+
+def recalcular_desde_datos(datos: dict, itp_pct=ITP_PCT, comision_pct=None):
+    """KPIs completos (comité + inversor) de un `Estudio.datos`; None si no hay precio de escritura.
+
+    `comision_pct` sustituye a la comisión guardada en el estudio.
+    """
+    e = entradas_desde_datos(datos)
+    res = recalcular_estudio(e["precio_escritura"], e["valoraciones"], e["gastos_extras"], itp_pct=itp_pct)
+    if res is None:
+        return None
+    if comision_pct is None:
+        comision_pct = e["comision_pct"]
+    res["inversor"] = calcular_inversor(res["valor_adquisicion"], res["comite"]["beneficio_bruto"], comision_pct)
+    return res
@@ -0,0 +1,266 @@
+"""Recálculo masivo de KPIs de estudios con NumPy (p. ej. tras cambiar la comisión o el ITP).
+
+Los `Estudio.datos` de un lote se pasan a columnas (arrays) y las fórmulas de
+core.services.motor_financiero se aplican a todas las filas a la vez, con el mismo orden
+de operaciones: el resultado es idéntico al de recalcular fila a fila (`kpis_fila`).
+
+Estudios sin precio de escritura (guardados antes del simulador actual) no se pueden
+recalcular desde las entradas: se parte de su valor_adquisicion / valor_transmision
+guardados y solo se recalculan beneficio, ROI, comisión y métricas derivadas.
+
+`valor_transmision` y `comision_pct` valen None cuando el estudio no los tiene (sin
+valoraciones / sin comisión): se calcula con 0, como el JS, pero no se escriben en `datos`.
+"""
+
+from core.services.motor_financiero import (
+    BENEFICIO_MINIMO,
+    BENEFICIO_OBJETIVO,
+    ITP_PCT,
+    NOTARIA_MIN,
+    NOTARIA_PCT,
+    REGISTRO_MIN,
+    REGISTRO_PCT,
+    VALORACIONES,
+    a_numero,
+    calcular_inversor,
+    entradas_desde_datos,
+    recalcular_estudio,
+)
+
+
+def _kpis(va, vt, beneficio, roi, comite, inversor) -> dict:
+    return {
+        "valor_adquisicion": va,
+        "valor_transmision": vt,
+        "beneficio": beneficio,
+        "roi": roi,
+        "comision_pct": inversor["comision_pct"],
+        "comision_eur": inversor["comision_eur"],
+        "beneficio_neto": inversor["beneficio_neto"],
+        "roi_neto": inversor["roi_neto"],
+        "ratio_euro_beneficio": comite["ratio_euro_beneficio"],
+        "colchon_seguridad": comite["colchon_seguridad"],
+        "breakeven": comite["breakeven"],
+    }
+
+
+def kpis_fila(datos: dict, itp_pct=ITP_PCT, comision_pct=None):
+    """Camino por fila (referencia del cálculo vectorizado). None si no hay con qué calcular."""
+    e = entradas_desde_datos(datos)
+    pct = e["comision_pct"] if comision_pct is None else comision_pct
+    con_comision = pct not in (None, "")
+    res = recalcular_estudio(e["precio_escritura"], e["valoraciones"], e["gastos_extras"], itp_pct=itp_pct)
+    if res is not None:
+        c = res["comite"]
+        inv = calcular_inversor(res["valor_adquisicion"], c["beneficio_bruto"], pct)
+        if not con_comision:
+            inv["comision_pct"] = None
+        return _kpis(res["valor_adquisicion"], res["valor_transmision"], c["beneficio_bruto"], c["roi"], c, inv)
+
+    va = a_numero((datos or {}).get("valor_adquisicion"))
+    if not va > 0:
+        return None
+    vt_guardado = (datos or {}).get("valor_transmision")
+    vt = a_numero(vt_guardado)
+    beneficio = vt - va
+    comite = {
+        "ratio_euro_beneficio": va / beneficio if beneficio > 0 else 0,
+        "colchon_seguridad": (vt - va) - BENEFICIO_MINIMO if vt > 0 else 0,
+        "breakeven": va + BENEFICIO_OBJETIVO,
+    }
+    inv = calcular_inversor(va, beneficio, pct)
+    if not con_comision:
+        inv["comision_pct"] = None
+    return _kpis(va, vt if vt_guardado not in (None, "") else None, beneficio, (beneficio / va) * 100, comite, inv)
+
+
+def columnas(lista_datos, comision_pct=None) -> dict:
+    """Entradas del lote como arrays float64 (0 donde falta el dato; `con_*` marca si existe)."""
+    import numpy as np
+
+    filas = []
+    for datos in lista_datos:
+        e = entradas_desde_datos(datos)
+        guardado = datos if isinstance(datos, dict) else {}
+        pct = e["comision_pct"] if comision_pct is None else comision_pct
+        filas.append(
+            (
+                a_numero(e["precio_escritura"]),
+                a_numero(e["gastos_extras"]),
+                a_numero(pct),
+                pct not in (None, ""),
+                a_numero(guardado.get("valor_adquisicion")),
+                a_numero(guardado.get("valor_transmision")),
+                guardado.get("valor_transmision") not in (None, ""),
+                *(a_numero(v) for v in e["valoraciones"]),
+            )
+        )
+    # Una sola conversión lista -> array; traspuesta para tener cada columna contigua
+    m = np.array(filas, dtype=np.float64).reshape(len(filas), 7 + len(VALORACIONES)).T.copy()
+    return {
+        "precio": m[0],
+        "gastos": m[1],
+        "comision_pct": m[2],
+        "con_comision": m[3] != 0,
+        "va_guardado": m[4],
+        "vt_guardado": m[5],
+        "con_vt_guardado": m[6] != 0,
+        "valoraciones": m[7:],
+    }
+
+
+def kpis_lote(col: dict, itp_pct=ITP_PCT) -> dict:
+    """KPIs vectorizados; `calculable` marca las filas con resultado (las demás no se tocan).
+
+    `con_transmision` / `con_comision` marcan las filas que tienen ese dato (ver `filas_lote`).
+    """
+    import numpy as np
+
+    precio = col["precio"]
+    con_precio = precio != 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        itp = precio * itp_pct
+        notaria = np.maximum(precio * NOTARIA_PCT, NOTARIA_MIN)
+        registro = np.maximum(precio * REGISTRO_PCT, REGISTRO_MIN)
+        va_motor = precio + itp + notaria + registro + col["gastos"]
+
+        # Suma secuencial (no pairwise de np.sum) para reproducir el redondeo del bucle del JS
+        suma = np.zeros_like(precio)
+        contador = np.zeros_like(precio)
+        for fila in col["valoraciones"]:
+            positiva = fila > 0
+            suma = suma + np.where(positiva, fila, 0.0)
+            contador = contador + positiva
+        vt_motor = np.where(contador > 0, suma / contador, 0.0)
+
+        va = np.where(con_precio, va_motor, col["va_guardado"])
+        vt = np.where(con_precio, vt_motor, col["vt_guardado"])
+        calculable = con_precio | (va > 0)
+
+        beneficio = vt - va
+        roi = np.where(va > 0, (beneficio / va) * 100, 0.0)
+        ratio = np.where(beneficio > 0, va / beneficio, 0.0)
+        colchon = np.where(vt > 0, (vt - va) - BENEFICIO_MINIMO, 0.0)
+        breakeven = np.where(va > 0, va + BENEFICIO_OBJETIVO, 0.0)
+
+        comision_eur = np.where(beneficio > 0, beneficio * col["comision_pct"] / 100, 0.0)
+        neto = beneficio - comision_eur
+        roi_neto = np.where(va > 0, (neto / va) * 100, 0.0)
+
+    return {
+        "calculable": calculable,
+        "con_transmision": np.where(con_precio, contador > 0, col["con_vt_guardado"]),
+        "con_comision": col["con_comision"],
+        "valor_adquisicion": va,
+        "valor_transmision": vt,
+        "beneficio": beneficio,
+        "roi": roi,
+        "comision_pct": col["comision_pct"],
+        "comision_eur": comision_eur,
+        "beneficio_neto": neto,
+        "roi_neto": roi_neto,
+        "ratio_euro_beneficio": ratio,
+        "colchon_seguridad": colchon,
+        "breakeven": breakeven,
+    }
+
+
+def aplicar_kpis(datos: dict, k: dict) -> None:
+    """Escribe los KPIs en `datos` con las claves que leen el listado, el snapshot y el PDF.
+
+    `valor_transmision` y `comision_pct` a None (el estudio no los tiene) no se escriben.
+    """
+    datos["valor_adquisicion"] = k["valor_adquisicion"]
+    if k["valor_transmision"] is not None:
+        datos["valor_transmision"] = k["valor_transmision"]
+    for clave in ("beneficio", "beneficio_bruto", "beneficio_estimado"):
+        datos[clave] = k["beneficio"]
+    datos["roi"] = datos["roi_estimado"] = k["roi"]
+    if k["comision_pct"] is not None:
+        datos["comision_inversure_pct"] = datos["inversure_comision_pct"] = k["comision_pct"]
+    for clave in ("comision_inversure_eur", "inversure_comision_eur", "comision_inversure"):
+        datos[clave] = k["comision_eur"]
+    datos["beneficio_neto"] = k["beneficio_neto"]
+    datos["roi_neto"] = k["roi_neto"]
+    datos["inversion_total"] = k["valor_adquisicion"]
+    datos["ratio_euro_beneficio"] = k["ratio_euro_beneficio"]
+    datos["colchon_seguridad"] = k["colchon_seguridad"]
+    datos["precio_breakeven"] = k["breakeven"]
+
+
+def filas_lote(kpis: dict):
+    """(índice, dict de KPIs en float de Python) de cada fila calculable del lote.
+
+    Sin dato de origen, `valor_transmision` / `comision_pct` salen como None (igual que `kpis_fila`).
+    """
+    import numpy as np
+
+    claves = [c for c in kpis if c not in ("calculable", "con_transmision", "con_comision")]
+    listas = {c: kpis[c].tolist() for c in claves}
+    con_transmision = kpis["con_transmision"].tolist()
+    con_comision = kpis["con_comision"].tolist()
+    for i in np.flatnonzero(kpis["calculable"]).tolist():
+        fila = {c: listas[c][i] for c in claves}
+        if not con_transmision[i]:
+            fila["valor_transmision"] = None
+        if not con_comision[i]:
+            fila["comision_pct"] = None
+        yield i, fila
+
+
+def recalcular_kpis_estudios(
+    chunk: int = 1000, itp_pct=ITP_PCT, comision_pct=None, guardar: bool = True, incluir_bloqueados: bool = False
+) -> dict:
+    """Recalcula y guarda (bulk_update) los KPIs de los estudios, por lotes de `chunk`.
+
+    Los estudios bloqueados (ya convertidos en proyecto) están congelados y se saltan salvo
+    con `incluir_bloqueados`. Solo se escriben, y solo cambia su `actualizado` (ETag), los
+    estudios cuyos KPIs cambian de verdad.
+    """
+    from django.utils import timezone
+
+    from core.models import Estudio
+    from core.services.proyecto_kpis import a_decimal_columna
+
+    qs = Estudio.objects.all() if incluir_bloqueados else Estudio.objects.filter(bloqueado=False)
+    revisados = actualizados = 0
+    ultimo_id = 0
+    while True:
+        # Keyset por id: cada lote es una consulta acotada aunque la tabla sea grande
+        lote = list(
+            qs.filter(id__gt=ultimo_id)
+            .order_by("id")
+            .only("id", "datos", "valor_adquisicion", "beneficio", "roi", "actualizado")[:chunk]
+        )
+        if not lote:
+            break
+        ultimo_id = lote[-1].id
+        revisados += len(lote)
+
+        lista_datos = [e.datos if isinstance(e.datos, dict) else {} for e in lote]
+        ahora = timezone.now()
+        cambiados = []
+        for i, k in filas_lote(kpis_lote(columnas(lista_datos, comision_pct), itp_pct=itp_pct)):
+            estudio = lote[i]
+            # aplicar_kpis solo toca claves de primer nivel: basta una copia superficial
+            datos = dict(lista_datos[i])
+            aplicar_kpis(datos, k)
+            columnas_nuevas = {
+                "valor_adquisicion": a_decimal_columna(k["valor_adquisicion"], 12),
+                "beneficio": a_decimal_columna(k["beneficio"], 12),
+                "roi": a_decimal_columna(k["roi"], 6),
+            }
+            if datos == lista_datos[i] and all(getattr(estudio, c) == v for c, v in columnas_nuevas.items()):
+                continue
+            estudio.datos = datos
+            for campo, valor in columnas_nuevas.items():
+                setattr(estudio, campo, valor)
+            # bulk_update no aplica auto_now: sin esto no cambian los ETag basados en `actualizado`
+            estudio.actualizado = ahora
+            cambiados.append(estudio)
+        if guardar and cambiados:
+            Estudio.objects.bulk_update(cambiados, ["datos", "valor_adquisicion", "beneficio", "roi", "actualizado"])
+        actualizados += len(cambiados)
+
+    return {"revisados": revisados, "actualizados": actualizados}
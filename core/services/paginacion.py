@@ -0,0 +1,113 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+
+# Mayor id representable en BIGINT: un id mayor en el cursor desbordaría la consulta
+MAX_ID = 2**63 - 1
+
+
+def codificar_cursor(valores: list) -> str:
+    raw = json.dumps(valores, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str):
+    """Devuelve la lista de valores del cursor o None si no es válido."""
+    if not cursor:
+        return None
+    try:
+        pad = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode((cursor + pad).encode("ascii")).decode("utf-8"))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(valores, list) or not valores:
+        return None
+    return valores
+
+
+def _valores_cursor(qs, campo, valores):
+    """(valor de `campo`, id) del cursor validados contra el modelo; None si no son válidos.
+
+    El cursor llega del cliente: un valor manipulado no debe llegar crudo al filtro.
+    """
+    try:
+        ultimo_id = int(valores[-1])
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if isinstance(valores[-1], bool) or not 0 < ultimo_id <= MAX_ID:
+        return None
+    if not campo:
+        return None, ultimo_id
+    if len(valores) != 2:
+        return None
+    if valores[0] is None:
+        return None, ultimo_id
+    try:
+        # to_python + validadores del campo (p. ej. max_digits de un DecimalField)
+        return qs.model._meta.get_field(campo).clean(valores[0], None), ultimo_id
+    except (ValidationError, TypeError, ValueError, ArithmeticError):
+        return None
+
+
+def paginar_keyset(qs, cursor: str = "", limite: int = 24, campo: str | None = None):
+    """Paginación por cursor (keyset) en orden descendente.
+
+    - Sin `campo`: orden (-id).
+    - Con `campo`: orden (-campo, -id) con los NULL al final (NULLS LAST explícito: PostgreSQL
+      y SQLite colocan los NULL distinto por defecto). Las filas con `campo` NULL se sirven
+      tras todas las demás, ordenadas por -id; en el cursor se marcan con valor null.
+
+    El coste de cada página no depende de cuántas filas hay antes (no hay OFFSET):
+    se filtra a partir del último (campo, id) servido, que viaja en el cursor.
+
+    Devuelve (filas, siguiente_cursor). `siguiente_cursor` es "" si no hay más; un cursor
+    no válido se trata como la primera página.
+    `qs` puede ser un queryset de modelos o de `values()` (debe incluir `id` y `campo`).
+    """
+    if campo:
+        qs = qs.order_by(F(campo).desc(nulls_last=True), "-id")
+    else:
+        qs = qs.order_by("-id")
+
+    valores = decodificar_cursor(cursor)
+    validos = _valores_cursor(qs, campo, valores) if valores is not None else None
+    # Cursor no válido (manipulado, de otro orden...): se sirve la primera página
+    if validos is not None:
+        ultimo_valor, ultimo_id = validos
+        if not campo:
+            qs = qs.filter(id__lt=ultimo_id)
+        elif ultimo_valor is None:
+            # Ya en el tramo de NULL: solo quedan NULL con id menor
+            qs = qs.filter(**{f"{campo}__isnull": True, "id__lt": ultimo_id})
+        else:
+            qs = qs.filter(
+                Q(**{f"{campo}__lt": ultimo_valor})
+                | Q(**{campo: ultimo_valor, "id__lt": ultimo_id})
+                | Q(**{f"{campo}__isnull": True})
+            )
+
+    filas = list(qs[: limite + 1])
+    siguiente = ""
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+
+        def _get(fila, k):
+            return fila.get(k) if isinstance(fila, dict) else getattr(fila, k, None)
+
+        if campo:
+            siguiente = codificar_cursor([_get(ultima, campo), _get(ultima, "id")])
+        else:
+            siguiente = codificar_cursor([_get(ultima, "id")])
+
+    return filas, siguiente
+
+
+def limite_desde_request(request, defecto: int = 24, maximo: int = 100) -> int:
+    try:
+        limite = int(request.GET.get("limite") or defecto)
+    except (TypeError, ValueError):
+        limite = defecto
+    return max(1, min(limite, maximo))
@@ -0,0 +1,345 @@
+"""PDF real del estudio (WeasyPrint) con caché en disco.
+
+El PDF solo depende del snapshot congelado y de la plantilla: la clave es
+sha256(hash del snapshot + versión de plantilla), así que una descarga repetida de un
+estudio sin cambios se sirve desde disco sin volver a renderizar.
+"""
+
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import urlparse
+
+from django.conf import settings
+
+from core.services.snapshot_delta import hash_contenido
+
+PLANTILLA_PDF_ESTUDIO = "core/pdf_estudio_rentabilidad.html"
+PLANTILLA_PDF_PROYECTO = "core/memoria_economica.html"
+
+# Subir si cambia el render sin tocar la plantilla (CSS de impresión, fetcher, versión de WeasyPrint...)
+VERSION_PLANTILLA_PDF = 2
+
+
+class PDFNoDisponible(RuntimeError):
+    """WeasyPrint no está instalado o le faltan las librerías del sistema (pango/cairo)."""
+
+
+def _directorio() -> Path:
+    return Path(getattr(settings, "PDF_CACHE_DIR", Path(settings.BASE_DIR) / "pdf_cache"))
+
+
+@lru_cache(maxsize=None)
+def version_plantilla(nombre: str = PLANTILLA_PDF_ESTUDIO) -> str:
+    """VERSION_PLANTILLA_PDF + hash del fuente de la plantilla (un despliegue con plantilla nueva invalida)."""
+    from django.template.loader import get_template
+
+    fuente = b""
+    try:
+        origen = get_template(nombre).origin.name
+        fuente = Path(origen).read_bytes()
+    except Exception:
+        pass
+    return f"{VERSION_PLANTILLA_PDF}-{hashlib.sha256(fuente).hexdigest()[:12]}"
+
+
+def clave_pdf(snapshot_data, nombre: str = PLANTILLA_PDF_ESTUDIO, variante: str = "") -> str:
+    raw = f"{hash_contenido(snapshot_data or {})}|{version_plantilla(nombre)}|{variante}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def ruta_pdf(clave: str) -> Path:
+    # Dos niveles para no acumular miles de ficheros en un mismo directorio
+    return _directorio() / clave[:2] / f"{clave}.pdf"
+
+
+def pdf_cacheado(clave: str):
+    """Ruta del PDF ya generado para `clave`; None si no existe."""
+    ruta = ruta_pdf(clave)
+    return ruta if ruta.is_file() else None
+
+
+def guardar_pdf(clave: str, contenido: bytes) -> Path:
+    """Escritura atómica (fichero temporal + rename): un lector nunca ve un PDF a medias."""
+    ruta = ruta_pdf(clave)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=ruta.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(contenido)
+        os.replace(tmp, ruta)
+    except Exception:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return ruta
+
+
+def _ruta_estatico(path: str):
+    """Fichero local para una URL bajo STATIC_URL (collectstatic o finders en desarrollo)."""
+    relativo = path[len(settings.STATIC_URL):].lstrip("/")
+    if not relativo:
+        return None
+    raiz = getattr(settings, "STATIC_ROOT", None)
+    if raiz:
+        candidato = Path(raiz) / relativo
+        if candidato.is_file():
+            return candidato
+    from django.contrib.staticfiles import finders
+
+    encontrado = finders.find(relativo)
+    return Path(encontrado) if encontrado else None
+
+
+# --- Estado caliente del proceso renderizador (ver `calentar`) ---
+# Cada render en frío paga el descubrimiento de fuentes (fontconfig/Pango), el parseo del
+# <style> de la plantilla (~240 líneas) y la lectura de los logos. En un proceso de vida
+# larga todo eso se hace una vez y se reutiliza.
+_fuentes = None
+_fetcher = None
+_estaticos = {}  # ruta relativa en static -> (bytes, mime)
+_hojas_css = {}  # sha256 del texto CSS -> weasyprint.CSS ya parseado
+MAX_HOJAS_CSS = 32
+
+_ESTILO_RE = re.compile(r"<style(?:\s+type=[\"']text/css[\"'])?\s*>(.*?)</style>", re.S | re.I)
+_LINK_CSS_RE = re.compile(r"<link\b[^>]*\bstylesheet\b", re.I)
+
+
+def _estatico_en_memoria(url: str):
+    """(bytes, mime) de un fichero bajo STATIC_URL; se lee de disco una sola vez por proceso."""
+    path = urlparse(url).path
+    if not path.startswith(settings.STATIC_URL):
+        return None
+    relativo = path[len(settings.STATIC_URL):].lstrip("/")
+    if relativo not in _estaticos:
+        ruta = _ruta_estatico(path)
+        if ruta is None:
+            return None
+        _estaticos[relativo] = (
+            ruta.read_bytes(),
+            mimetypes.guess_type(str(ruta))[0] or "application/octet-stream",
+        )
+    return _estaticos[relativo]
+
+
+def _url_fetcher():
+    """Fetcher que sirve /static/ desde memoria: pedirlo por HTTP al propio worker lo bloquearía.
+
+    WeasyPrint >= 68 espera una subclase de URLFetcher; las versiones anteriores, una función
+    que devuelve un dict.
+    """
+    global _fetcher
+    if _fetcher is not None:
+        return _fetcher
+
+    import weasyprint
+
+    URLFetcher = getattr(weasyprint, "URLFetcher", None)
+    if URLFetcher is None:
+        from weasyprint import default_url_fetcher
+
+        def _fetch(url, *args, **kwargs):
+            recurso = _estatico_en_memoria(url)
+            if recurso is not None:
+                return {"string": recurso[0], "mime_type": recurso[1], "redirected_url": url}
+            return default_url_fetcher(url, *args, **kwargs)
+
+        _fetcher = _fetch
+    else:
+        from weasyprint.urls import URLFetcherResponse
+
+        class _FetcherEstaticos(URLFetcher):
+            def fetch(self, url, headers=None):
+                recurso = _estatico_en_memoria(url)
+                if recurso is not None:
+                    return URLFetcherResponse(url, recurso[0], {"Content-Type": recurso[1]})
+                return super().fetch(url, headers)
+
+        _fetcher = _FetcherEstaticos()
+    return _fetcher
+
+
+def _config_fuentes():
+    global _fuentes
+    if _fuentes is None:
+        try:
+            from weasyprint.text.fonts import FontConfiguration
+        except ImportError:  # WeasyPrint < 53
+            from weasyprint.fonts import FontConfiguration
+        _fuentes = FontConfiguration()
+    return _fuentes
+
+
+def _hoja_css(texto: str, base_url: str):
+    from weasyprint import CSS
+
+    # La clave es solo el texto: las URL de /static/ se resuelven por ruta, no por host
+    clave = hashlib.sha256(texto.encode("utf-8")).hexdigest()
+    hoja = _hojas_css.get(clave)
+    if hoja is None:
+        hoja = CSS(string=texto, base_url=base_url, url_fetcher=_url_fetcher(), font_config=_config_fuentes())
+        if len(_hojas_css) < MAX_HOJAS_CSS:
+            _hojas_css[clave] = hoja
+    return hoja
+
+
+def _separar_estilos(html: str, base_url: str):
+    """Quita los <style> del HTML y los devuelve ya parseados (reutilizados entre renders).
+
+    Si hay <link rel=stylesheet> se deja el HTML intacto para no alterar el orden de la cascada.
+    """
+    if _LINK_CSS_RE.search(html):
+        return html, []
+    bloques = _ESTILO_RE.findall(html)
+    if not bloques:
+        return html, []
+    return _ESTILO_RE.sub("", html), [_hoja_css(b, base_url) for b in bloques]
+
+
+def calentar(plantillas=(PLANTILLA_PDF_ESTUDIO,)) -> None:
+    """Precarga fuentes, estáticos (PDF_ESTATICOS_PRECARGA) y el CSS de las plantillas."""
+    from weasyprint import HTML
+
+    from django.templatetags.static import static
+
+    for relativo in getattr(settings, "PDF_ESTATICOS_PRECARGA", ()):
+        try:
+            # Misma URL que genera {% static %} (con hash del manifest en producción)
+            _estatico_en_memoria(static(relativo))
+        except ValueError:
+            _estatico_en_memoria(settings.STATIC_URL + relativo)
+
+    for nombre in plantillas:
+        try:
+            from django.template.loader import get_template
+
+            fuente = Path(get_template(nombre).origin.name).read_text(encoding="utf-8")
+        except Exception:
+            continue
+        for bloque in _ESTILO_RE.findall(fuente):
+            if "{%" not in bloque and "{{" not in bloque:
+                _hoja_css(bloque, base_url_pdf())
+
+    # matplotlib (gráficos del PDF) con su caché de fuentes construida
+    from core.services.graficos import graficos_listos
+
+    graficos_listos(esperar=True)
+
+    # Primer layout: dispara el descubrimiento de fuentes de fontconfig/Pango
+    HTML(string="<p>Inversure 0123456789 €</p>").write_pdf(font_config=_config_fuentes())
+
+
+@lru_cache(maxsize=1)
+def weasyprint_disponible() -> bool:
+    try:
+        import weasyprint  # noqa: F401
+    except (ImportError, OSError):
+        return False
+    return True
+
+
+def html_a_pdf(html: str, base_url: str) -> bytes:
+    try:
+        from weasyprint import HTML
+    except (ImportError, OSError) as e:
+        raise PDFNoDisponible(str(e)) from e
+    html, hojas = _separar_estilos(html, base_url)
+    return HTML(string=html, base_url=base_url, url_fetcher=_url_fetcher()).write_pdf(
+        stylesheets=hojas, font_config=_config_fuentes()
+    )
+
+
+def base_url_pdf() -> str:
+    """Base para resolver URLs relativas cuando no hay request (worker `procesar_pdfs`)."""
+    return getattr(settings, "PDF_BASE_URL", "http://localhost/")
+
+
+def inicializar_proceso(caliente: bool = True) -> None:
+    """Initializer de los ProcessPoolExecutor de render.
+
+    Con el arranque `spawn` el hijo no hereda Django. Con `caliente` deja el proceso listo
+    (fuentes, CSS, estáticos) antes del primer trabajo; un fallo aquí no rompe el pool.
+    """
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    if caliente and weasyprint_disponible():
+        try:
+            calentar()
+        except Exception:
+            pass
+
+
+def renderizar_a_cache(clave: str, html: str) -> str:
+    """Render + escritura en la caché; pensado para ejecutarse en un proceso hijo."""
+    if pdf_cacheado(clave) is None:
+        guardar_pdf(clave, html_a_pdf(html, base_url=base_url_pdf()))
+    return clave
+
+
+# --- Pools persistentes para las vistas ---
+# Un pool por worker web y uso, compartido por todas las peticiones: el número de
+# procesos de render no crece con las peticiones concurrentes.
+# - Renderizador (PDF_RENDERER_PROCESOS, 1 por defecto): vista previa, un PDF por petición.
+# - Exportador (PDF_EXPORTACION_PROCESOS, un proceso por núcleo): exportación ZIP en paralelo.
+class _PoolCompartido:
+    """ProcessPoolExecutor perezoso y compartido entre hilos; si un hijo muere, se recrea una vez."""
+
+    def __init__(self, ajuste: str, por_defecto):
+        self.ajuste = ajuste
+        self.por_defecto = por_defecto
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def obtener(self):
+        with self.lock:
+            if self.pool is None:
+                procesos = getattr(settings, self.ajuste, None) or self.por_defecto()
+                self.pool = ProcessPoolExecutor(max_workers=max(1, int(procesos)), initializer=inicializar_proceso)
+            return self.pool
+
+    def enviar(self, fn, *args):
+        pool = self.obtener()
+        try:
+            return pool.submit(fn, *args)
+        except BrokenProcessPool:
+            with self.lock:
+                # Otro hilo puede haberlo recreado ya: solo se descarta el pool roto que vimos
+                if self.pool is pool:
+                    self.pool = None
+                    pool.shutdown(wait=False, cancel_futures=True)
+            return self.obtener().submit(fn, *args)
+
+
+_renderizador = _PoolCompartido("PDF_RENDERER_PROCESOS", lambda: 1)
+_exportador = _PoolCompartido("PDF_EXPORTACION_PROCESOS", os.cpu_count)
+
+
+def enviar_al_renderizador(fn, *args):
+    """`submit` al pool renderizador (vista previa)."""
+    return _renderizador.enviar(fn, *args)
+
+
+def enviar_al_exportador(fn, *args):
+    """`submit` al pool de la exportación ZIP (un proceso por núcleo por defecto)."""
+    return _exportador.enviar(fn, *args)
+
+
+def html_a_pdf_renderizador(html: str, base_url: str) -> bytes:
+    """Como `html_a_pdf`, pero en el proceso renderizador de larga vida (ya caliente).
+
+    El proceso se crea con el primer PDF del worker web y se reutiliza; si muere, se
+    recrea una vez (ver `enviar_al_renderizador`).
+    """
+    return enviar_al_renderizador(html_a_pdf, html, base_url).result()
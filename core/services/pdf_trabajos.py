@@ -0,0 +1,108 @@
+"""Cola de renders de PDF en la propia BD (sin broker externo).
+
+La web solo inserta un TrabajoPDF y responde; `manage.py procesar_pdfs` reclama los
+pendientes, prepara el HTML (consultas + plantilla, barato) y reparte el render con
+WeasyPrint (CPU) entre procesos. El PDF acaba en la caché de disco de
+core.services.pdf_render con la misma clave que usa `pdf_estudio_preview?formato=pdf`.
+
+Reclamar es un `UPDATE ... WHERE estado='pendiente'` por fila: si dos workers compiten
+por el mismo trabajo, solo a uno le afecta la actualización.
+"""
+
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+
+ESTADOS_ACTIVOS = ("pendiente", "en_curso")
+
+
+def encolar_trabajo_pdf(tipo: str, objeto_id: int):
+    """Crea el trabajo, o devuelve el que ya esté pendiente/en curso para el mismo objeto."""
+    from core.models import TrabajoPDF
+
+    activo = (
+        TrabajoPDF.objects.filter(tipo=tipo, objeto_id=objeto_id, estado__in=ESTADOS_ACTIVOS)
+        .order_by("-id")
+        .first()
+    )
+    if activo is not None:
+        return activo
+    return TrabajoPDF.objects.create(tipo=tipo, objeto_id=objeto_id)
+
+
+def reclamar_trabajos(limite: int) -> list:
+    """Pasa a `en_curso` hasta `limite` trabajos pendientes (los más antiguos primero)."""
+    from core.models import TrabajoPDF
+
+    reclamados = []
+    if limite <= 0:
+        return reclamados
+    candidatos = list(
+        TrabajoPDF.objects.filter(estado="pendiente").order_by("id").values_list("id", flat=True)[: limite * 2]
+    )
+    for pk in candidatos:
+        ok = TrabajoPDF.objects.filter(id=pk, estado="pendiente").update(
+            estado="en_curso",
+            iniciado=timezone.now(),
+            intentos=F("intentos") + 1,
+        )
+        if ok:
+            reclamados.append(TrabajoPDF.objects.get(id=pk))
+            if len(reclamados) >= limite:
+                break
+    return reclamados
+
+
+def completar_trabajo(trabajo_id: int, clave: str) -> None:
+    from core.models import TrabajoPDF
+
+    TrabajoPDF.objects.filter(id=trabajo_id).update(
+        estado="completado", clave=clave, error="", terminado=timezone.now()
+    )
+
+
+def fallar_trabajo(trabajo_id: int, error: str, max_intentos: int = 3, reintentar: bool = True) -> None:
+    """Vuelve a `pendiente` mientras queden intentos; si no, queda en `error`."""
+    from core.models import TrabajoPDF
+
+    TrabajoPDF.objects.filter(id=trabajo_id).update(error=(error or "")[:2000], terminado=timezone.now())
+    if reintentar:
+        if TrabajoPDF.objects.filter(id=trabajo_id, intentos__lt=max_intentos).update(estado="pendiente"):
+            return
+    TrabajoPDF.objects.filter(id=trabajo_id).update(estado="error")
+
+
+def devolver_trabajo(trabajo_id: int) -> None:
+    """Reclamado pero nunca enviado a renderizar: vuelve a `pendiente` sin gastar un intento."""
+    from core.models import TrabajoPDF
+
+    TrabajoPDF.objects.filter(id=trabajo_id, estado="en_curso").update(
+        estado="pendiente", intentos=F("intentos") - 1
+    )
+
+
+def liberar_atascados(minutos: int = 15, excluir=()) -> int:
+    """Trabajos `en_curso` de un worker que murió a medias: vuelven a la cola.
+
+    `excluir`: ids que el worker que llama sigue renderizando.
+    """
+    from core.models import TrabajoPDF
+
+    limite = timezone.now() - timedelta(minutes=minutos)
+    qs = TrabajoPDF.objects.filter(estado="en_curso", iniciado__lt=limite)
+    if excluir:
+        qs = qs.exclude(id__in=list(excluir))
+    return qs.update(estado="pendiente")
+
+
+def preparar_trabajo(trabajo):
+    """(clave de caché, HTML) del trabajo. Se ejecuta en el proceso principal (acceso a BD)."""
+    from core import views
+    from core.models import Estudio, Proyecto
+
+    if trabajo.tipo == "estudio":
+        return views._html_pdf_estudio(Estudio.objects.get(id=trabajo.objeto_id))
+    if trabajo.tipo == "proyecto":
+        return views._html_pdf_proyecto(Proyecto.objects.get(id=trabajo.objeto_id))
+    raise ValueError(f"Tipo de PDF desconocido: {trabajo.tipo!r}")
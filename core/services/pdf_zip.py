@@ -0,0 +1,106 @@
+"""ZIP de PDFs generado en streaming mientras los renders terminan en paralelo.
+
+Las entradas se escriben según acaban (no en el orden pedido) y cada trozo del ZIP se
+entrega al cliente en cuanto está listo: el ZIP completo nunca está en memoria. Los PDFs
+que ya están en la caché de disco (core.services.pdf_render) no se vuelven a renderizar.
+
+Los renders van al pool de exportación del worker web (PDF_EXPORTACION_PROCESOS procesos,
+uno por núcleo por defecto, ya calientes): varias exportaciones a la vez lo comparten y
+no multiplican los procesos, ni ocupan el renderizador de la vista previa.
+"""
+
+import os
+import zipfile
+from concurrent.futures import as_completed
+
+from core.services.pdf_render import enviar_al_exportador, pdf_cacheado, renderizar_a_cache
+
+
+class _SalidaZip:
+    """Fichero de solo escritura y sin seek: zipfile usa data descriptors y no retrocede."""
+
+    def __init__(self):
+        self._trozos = []
+        self._pos = 0
+
+    def write(self, datos):
+        self._trozos.append(bytes(datos))
+        self._pos += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def vaciar(self) -> bytes:
+        datos = b"".join(self._trozos)
+        self._trozos.clear()
+        return datos
+
+
+def _nombre_unico(nombre: str, usados: set) -> str:
+    base, ext = os.path.splitext(nombre)
+    n = 1
+    while nombre in usados:
+        n += 1
+        nombre = f"{base}_{n}{ext}"
+    usados.add(nombre)
+    return nombre
+
+
+def zip_pdfs_en_paralelo(entradas):
+    """Generador de bytes del ZIP.
+
+    `entradas` es un iterable (puede ser perezoso) de (nombre, clave, html) o de
+    (nombre, None, error) si no se pudo preparar. Los errores se listan en ERRORES.txt.
+    """
+    salida = _SalidaZip()
+    usados = set()
+    errores = []
+
+    # Los PDF ya comprimen sus streams: ZIP_STORED evita gastar CPU en recomprimir
+    with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_STORED) as zf:
+        pendientes = {}
+
+        def _volcar(futuro):
+            nombre = pendientes.pop(futuro)
+            try:
+                ruta = pdf_cacheado(futuro.result())
+                if ruta is None:
+                    raise OSError("PDF no encontrado en la caché tras el render")
+            except Exception as e:
+                errores.append(f"{nombre}: {e}")
+                return
+            zf.write(ruta, _nombre_unico(nombre, usados))
+            yield salida.vaciar()
+
+        try:
+            for nombre, clave, html in entradas:
+                if clave is None:
+                    errores.append(f"{nombre}: {html}")
+                    continue
+                ruta = pdf_cacheado(clave)
+                if ruta is not None:
+                    zf.write(ruta, _nombre_unico(nombre, usados))
+                    yield salida.vaciar()
+                else:
+                    try:
+                        pendientes[enviar_al_exportador(renderizar_a_cache, clave, html)] = nombre
+                    except Exception as e:
+                        errores.append(f"{nombre}: {e}")
+                # Mientras se preparan las siguientes, enviar las que ya han terminado
+                for futuro in [f for f in pendientes if f.done()]:
+                    yield from _volcar(futuro)
+
+            for futuro in as_completed(list(pendientes)):
+                yield from _volcar(futuro)
+        finally:
+            # Cliente desconectado a medias: el pool es compartido, solo se cancela lo no empezado
+            for futuro in pendientes:
+                futuro.cancel()
+
+        if errores:
+            zf.writestr("ERRORES.txt", "\n".join(errores) + "\n")
+    yield salida.vaciar()
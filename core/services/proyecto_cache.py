@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _clave(proyecto_id) -> str:
+    return f"core:proyecto:{proyecto_id}:snapshot_renderizado"
+
+
+def _timeout() -> int:
+    return int(getattr(settings, "PROYECTO_SNAPSHOT_CACHE_TIMEOUT", 60 * 60))
+
+
+def obtener_snapshot_proyecto(proyecto_id, version):
+    """Devuelve el snapshot fusionado cacheado si corresponde a `version`; None si no hay o está obsoleto.
+
+    `version` identifica el estado del proyecto (último ProyectoSnapshot + fecha del overlay),
+    así que un valor de otra versión nunca se sirve aunque la invalidación explícita fallara.
+    """
+    try:
+        entrada = cache.get(_clave(proyecto_id))
+    except Exception:
+        return None
+    if not isinstance(entrada, dict) or entrada.get("version") != list(version):
+        return None
+    return entrada.get("valor")
+
+
+def guardar_snapshot_proyecto(proyecto_id, version, valor) -> None:
+    try:
+        cache.set(_clave(proyecto_id), {"version": list(version), "valor": valor}, _timeout())
+    except Exception:
+        # La caché es una optimización: nunca debe romper la vista
+        pass
+
+
+def invalidar_snapshot_proyecto(proyecto_id) -> None:
+    try:
+        cache.delete(_clave(proyecto_id))
+    except Exception:
+        pass
@@ -0,0 +1,91 @@
+from decimal import Decimal, InvalidOperation
+
+
+def _as_float(val, default=0.0):
+    try:
+        if val is None or val == "":
+            return float(default)
+        return float(val)
+    except Exception:
+        return float(default)
+
+
+def a_decimal_columna(val, max_digits: int):
+    """Convierte a Decimal(2 decimales) acotado al rango de la columna; None si no es numérico."""
+    if val is None:
+        return None
+    try:
+        d = Decimal(str(val))
+        if not d.is_finite():
+            return None
+        d = d.quantize(Decimal("0.01"))
+    except (InvalidOperation, ValueError):
+        return None
+    tope = Decimal(10) ** (max_digits - 2) - Decimal("0.01")
+    return max(-tope, min(d, tope))
+
+
+def extraer_kpis_proyecto(snap: dict) -> dict:
+    """KPIs de listado a partir de un snapshot de proyecto (mismas cadenas de fallback que la vista)."""
+    if not isinstance(snap, dict):
+        snap = {}
+    economico = snap.get("economico") if isinstance(snap.get("economico"), dict) else {}
+    inversor = snap.get("inversor") if isinstance(snap.get("inversor"), dict) else {}
+    kpis = snap.get("kpis") if isinstance(snap.get("kpis"), dict) else {}
+    metricas = kpis.get("metricas") if isinstance(kpis.get("metricas"), dict) else {}
+
+    # Capital objetivo (lo que realmente se invierte) – heredado del estudio
+    capital_objetivo = (
+        inversor.get("inversion_total")
+        or metricas.get("inversion_total")
+        or metricas.get("valor_adquisicion_total")
+        or metricas.get("valor_adquisicion")
+        or economico.get("valor_adquisicion")
+        or metricas.get("precio_adquisicion")
+        or metricas.get("precio_compra")
+        or 0
+    )
+
+    # ROI heredado del estudio (preferimos neto si existe)
+    roi = (
+        inversor.get("roi_neto")
+        or metricas.get("roi_neto")
+        or metricas.get("roi")
+        or economico.get("roi_estimado")
+        or economico.get("roi")
+        or 0
+    )
+
+    beneficio_neto = (
+        inversor.get("beneficio_neto")
+        or metricas.get("beneficio_neto")
+        or economico.get("beneficio_neto")
+    )
+
+    return {
+        "capital_objetivo": _as_float(capital_objetivo, 0.0),
+        "roi": _as_float(roi, 0.0),
+        "beneficio_neto": _as_float(beneficio_neto, 0.0) if beneficio_neto not in (None, "") else None,
+    }
+
+
+def aplicar_kpis_proyecto(proyecto, snap: dict, version_num=None) -> list:
+    """Copia los KPIs del snapshot a las columnas desnormalizadas del Proyecto.
+
+    No guarda: devuelve la lista de campos modificados para usar en `save(update_fields=...)`.
+    """
+    kpis = extraer_kpis_proyecto(snap)
+    valores = {
+        "capital_objetivo": a_decimal_columna(kpis["capital_objetivo"], 12),
+        "roi": a_decimal_columna(kpis["roi"], 6),
+        "beneficio_neto": a_decimal_columna(kpis["beneficio_neto"], 12),
+    }
+    if version_num is not None:
+        valores["ultima_version_num"] = int(version_num)
+
+    cambiados = []
+    for campo, valor in valores.items():
+        if getattr(proyecto, campo, None) != valor:
+            setattr(proyecto, campo, valor)
+            cambiados.append(campo)
+    return cambiados
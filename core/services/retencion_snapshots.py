@@ -0,0 +1,195 @@
+"""Política de retención de snapshots (ProyectoSnapshot / EstudioSnapshot).
+
+Por defecto:
+- Todo lo de las últimas `completo_horas` (24h) se conserva.
+- Hasta `horario_dias` (30 días) se conserva la última versión de cada hora.
+- Más antiguo: la última versión de cada día.
+Siempre se conservan la última versión, las de conversión/cierre y los
+EstudioSnapshot usados como origen de un proyecto.
+
+Configurable con `SNAPSHOT_RETENCION = {"completo_horas": ..., "horario_dias": ...}`.
+
+Los bytes liberados se miden igual para proyectos y estudios: lo que ocupan las columnas en
+BD (`datos` comprimido, `delta` como texto JSON), no el JSON sin comprimir.
+"""
+
+from datetime import timedelta
+import json
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.functions import Cast, Length
+
+from core.services.snapshot_delta import aplicar_delta, calcular_delta, intervalo_keyframe
+
+FUENTES_PROTEGIDAS = ("conversion", "cierre")
+
+
+def politica() -> dict:
+    cfg = getattr(settings, "SNAPSHOT_RETENCION", None) or {}
+    return {
+        "completo_horas": int(cfg.get("completo_horas", 24)),
+        "horario_dias": int(cfg.get("horario_dias", 30)),
+    }
+
+
+def seleccionar_conservados(filas, ahora, protegidos=()) -> set:
+    """Ids a conservar.
+
+    `filas`: iterable de (id, creado_en) en cualquier orden. Dentro de cada tramo
+    (hora o día) se conserva la versión más reciente.
+    """
+    pol = politica()
+    limite_completo = ahora - timedelta(hours=pol["completo_horas"])
+    limite_horario = ahora - timedelta(days=pol["horario_dias"])
+
+    conservar = set(protegidos)
+    por_tramo = {}
+    for fid, creado in filas:
+        if creado is None or creado >= limite_completo:
+            conservar.add(fid)
+            continue
+        if creado >= limite_horario:
+            tramo = ("h", creado.replace(minute=0, second=0, microsecond=0))
+        else:
+            tramo = ("d", creado.date())
+        actual = por_tramo.get(tramo)
+        if actual is None or (creado, fid) > actual:
+            por_tramo[tramo] = (creado, fid)
+    conservar.update(fid for _, fid in por_tramo.values())
+    return conservar
+
+
+def _tam_json(obj) -> int:
+    # Mismo criterio que core.services.snapshot_delta para decidir entre delta y keyframe
+    return len(json.dumps(obj, separators=(",", ":"), default=str))
+
+
+def _tams_en_bd():
+    """Anotaciones con los bytes que ocupan `datos` y `delta` de cada ProyectoSnapshot."""
+    return {"tam_datos": Length("datos"), "tam_delta": Length(Cast("delta", models.TextField()))}
+
+
+def _tam_en_bd(datos, delta) -> int:
+    """Lo que ocuparán en BD unos `datos` / `delta` nuevos (misma medida que `_tams_en_bd`)."""
+    from core.models import ProyectoSnapshot
+
+    tam = 0
+    if datos is not None:
+        tam += len(ProyectoSnapshot._meta.get_field("datos").get_prep_value(datos))
+    if delta is not None:
+        # JSONField guarda json.dumps con los separadores por defecto
+        tam += len(json.dumps(delta))
+    return tam
+
+
+def compactar_proyecto(proyecto_id, ahora, dry_run: bool = False) -> dict:
+    """Poda las versiones de un proyecto según la política y re-encadena los deltas.
+
+    Todo ocurre en una transacción corta que bloquea solo la fila del proyecto
+    (serializa con los autosaves de ese proyecto, no con el resto de la tabla).
+    """
+    from core.models import Proyecto, ProyectoSnapshot
+
+    res = {"eliminados": 0, "reescritos": 0, "bytes": 0}
+    with transaction.atomic():
+        proyecto = Proyecto.objects.select_for_update().filter(id=proyecto_id).only("id", "ultimo_snapshot_id").first()
+        if proyecto is None:
+            return res
+
+        meta = list(
+            ProyectoSnapshot.objects.filter(proyecto_id=proyecto_id).values_list("id", "creado_en", "fuente", "version_num")
+        )
+        if not meta:
+            return res
+
+        ultimo_id = proyecto.ultimo_snapshot_id or max(meta, key=lambda m: ((m[3] or 0), m[0]))[0]
+        protegidos = {m[0] for m in meta if m[2] in FUENTES_PROTEGIDAS}
+        protegidos.add(ultimo_id)
+        conservar = seleccionar_conservados([(m[0], m[1]) for m in meta], ahora, protegidos)
+        if len(conservar) >= len(meta):
+            return res
+
+        intervalo = intervalo_keyframe()
+        doc = {}
+        previo_conservado = None
+        keyframe_actual = None
+        largo_cadena = 0
+        eliminar = []
+
+        filas = (
+            ProyectoSnapshot.objects.filter(proyecto_id=proyecto_id)
+            .order_by("version_num", "id")
+            .only("id", "version_num", "keyframe_num", "fuente", "datos", "delta")
+            .annotate(**_tams_en_bd())
+        )
+        for s in filas.iterator(chunk_size=50):
+            # Documento completo de esta versión (recorrido secuencial de la cadena original)
+            doc = (s.datos if isinstance(s.datos, dict) else {}) if s.delta is None else aplicar_delta(doc, s.delta)
+
+            if s.id not in conservar:
+                eliminar.append(s.id)
+                res["bytes"] += (s.tam_datos or 0) + (s.tam_delta or 0)
+                continue
+
+            nuevo_delta = None
+            if (
+                previo_conservado is not None
+                and s.fuente not in FUENTES_PROTEGIDAS
+                and largo_cadena < intervalo
+            ):
+                ops = calcular_delta(previo_conservado, doc)
+                if _tam_json(ops) < _tam_json(doc) // 2:
+                    nuevo_delta = ops
+
+            if nuevo_delta is None:
+                nuevos = {"datos": doc, "delta": None, "keyframe_num": s.version_num}
+                keyframe_actual = s.version_num
+                largo_cadena = 1
+            else:
+                nuevos = {"datos": None, "delta": nuevo_delta, "keyframe_num": keyframe_actual}
+                largo_cadena += 1
+
+            antes = (s.tam_datos or 0) + (s.tam_delta or 0)
+            if (s.delta is None) != (nuevos["delta"] is None) or s.delta != nuevos["delta"] or s.keyframe_num != nuevos["keyframe_num"]:
+                res["reescritos"] += 1
+                res["bytes"] += antes - _tam_en_bd(nuevos["datos"], nuevos["delta"])
+                if not dry_run:
+                    ProyectoSnapshot.objects.filter(pk=s.pk).update(**nuevos)
+
+            previo_conservado = doc
+
+        res["eliminados"] = len(eliminar)
+        if eliminar and not dry_run:
+            ProyectoSnapshot.objects.filter(id__in=eliminar).delete()
+    return res
+
+
+def compactar_estudio(estudio_id, ahora, dry_run: bool = False) -> dict:
+    """Poda los EstudioSnapshot de un estudio (sin deltas: borrado directo)."""
+    from core.models import EstudioSnapshot, Proyecto
+
+    res = {"eliminados": 0, "reescritos": 0, "bytes": 0}
+    meta = list(
+        EstudioSnapshot.objects.filter(estudio_id=estudio_id).values_list("id", "creado_en")
+    )
+    if len(meta) <= 1:
+        return res
+
+    protegidos = set(
+        Proyecto.objects.filter(origen_snapshot__estudio_id=estudio_id).values_list("origen_snapshot_id", flat=True)
+    )
+    protegidos.add(max(meta, key=lambda m: (m[1], m[0]))[0])
+    conservar = seleccionar_conservados(meta, ahora, protegidos)
+    eliminar = [m[0] for m in meta if m[0] not in conservar]
+    if not eliminar:
+        return res
+
+    res["eliminados"] = len(eliminar)
+    # Bytes realmente ocupados en la columna (ya comprimidos)
+    tams = EstudioSnapshot.objects.filter(id__in=eliminar).annotate(tam=Length("datos")).values_list("tam", flat=True)
+    res["bytes"] = sum(t or 0 for t in tams)
+    if not dry_run:
+        with transaction.atomic():
+            EstudioSnapshot.objects.filter(id__in=eliminar).delete()
+    return res
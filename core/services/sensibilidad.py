@@ -0,0 +1,97 @@
+"""Rejilla de sensibilidad para el comité: precio de compra × precio de venta × meses.
+
+Toda la rejilla se calcula en una pasada con broadcasting de NumPy (ejes: compra, venta,
+meses) y las mismas fórmulas de core.services.motor_financiero. El simulador no tiene
+dimensión temporal: los meses entran como coste de tenencia (`coste_mensual` × meses, que
+se suma al valor de adquisición) y en el ROI anualizado.
+"""
+
+from core.services.motor_financiero import (
+    BENEFICIO_OBJETIVO,
+    ITP_PCT,
+    NOTARIA_MIN,
+    NOTARIA_PCT,
+    REGISTRO_MIN,
+    REGISTRO_PCT,
+)
+
+MAX_PASOS_PRECIO = 100
+MAX_MESES = 60
+
+
+def ejes(centro, variacion_pct: float, pasos: int, minimo=None, maximo=None):
+    """Valores del eje: `pasos` puntos entre minimo/maximo o ±variacion_pct alrededor de `centro`."""
+    import numpy as np
+
+    if minimo is None or maximo is None:
+        minimo = centro * (1 - variacion_pct / 100)
+        maximo = centro * (1 + variacion_pct / 100)
+    return np.linspace(float(minimo), float(maximo), max(1, int(pasos)))
+
+
+def rejilla_sensibilidad(precios, ventas, meses, gastos_extras=0.0, comision_pct=0.0, coste_mensual=0.0, itp_pct=ITP_PCT):
+    """KPIs de cada combinación. Las rejillas 3D tienen forma (compra, venta, meses).
+
+    El breakeven (precio de venta necesario para el beneficio objetivo) no depende de la
+    venta: se devuelve como rejilla (compra, meses).
+    """
+    import numpy as np
+
+    p = np.asarray(precios, dtype=np.float64)[:, None, None]
+    v = np.asarray(ventas, dtype=np.float64)[None, :, None]
+    m = np.asarray(meses, dtype=np.float64)[None, None, :]
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        itp = p * itp_pct
+        notaria = np.maximum(p * NOTARIA_PCT, NOTARIA_MIN)
+        registro = np.maximum(p * REGISTRO_PCT, REGISTRO_MIN)
+        va = p + itp + notaria + registro + gastos_extras + coste_mensual * m  # (compra, 1, meses)
+
+        beneficio = v - va
+        roi = np.where(va > 0, (beneficio / va) * 100, 0.0)
+        comision = np.where(beneficio > 0, beneficio * comision_pct / 100, 0.0)
+        neto = beneficio - comision
+        roi_neto = np.where(va > 0, (neto / va) * 100, 0.0)
+        # Interés compuesto equivalente a 12 meses; con pérdida total (ROI <= -100) no tiene sentido
+        base = 1 + roi_neto / 100
+        roi_anual = np.where((base > 0) & (m > 0), (np.power(np.clip(base, 1e-12, None), 12 / m) - 1) * 100, np.nan)
+        breakeven = np.where(va > 0, va + BENEFICIO_OBJETIVO, 0.0)[:, 0, :]
+
+    return {
+        "roi": roi,
+        "roi_neto": roi_neto,
+        "roi_anual": roi_anual,
+        "beneficio_neto": neto,
+        "breakeven": breakeven,
+    }
+
+
+def a_json(rejilla: dict, decimales: int = 2) -> dict:
+    """Rejillas como listas anidadas redondeadas (NaN -> None) para JsonResponse."""
+    import numpy as np
+
+    salida = {}
+    for clave, arr in rejilla.items():
+        redondeado = np.round(arr, decimales).astype(object)
+        redondeado[np.isnan(arr)] = None
+        salida[clave] = redondeado.tolist()
+    return salida
+
+
+def a_binario(rejilla: dict) -> dict:
+    """Rejillas como float32 little-endian en base64 (orden C) + forma.
+
+    Para el heatmap del simulador: serializar ~100k floats como JSON cuesta decenas de ms;
+    así la respuesta se genera en ~1 ms y el navegador la lee con un Float32Array.
+    """
+    import base64
+
+    import numpy as np
+
+    return {
+        clave: {
+            "forma": list(arr.shape),
+            "datos": base64.b64encode(np.ascontiguousarray(arr, dtype="<f4").tobytes()).decode("ascii"),
+        }
+        for clave, arr in rejilla.items()
+    }
@@ -0,0 +1,251 @@
+"""Almacenamiento delta de ProyectoSnapshot.
+
+Cada proyecto guarda un *keyframe* (documento completo en `datos`) cada
+`PROYECTO_SNAPSHOT_KEYFRAME_INTERVAL` versiones y, entre medias, solo el diff
+JSON contra la versión anterior (`delta`). Reconstruir cualquier versión cuesta
+una consulta y, como mucho, `intervalo - 1` aplicaciones de diff.
+
+Formato del diff: lista de operaciones
+    ["s", [clave, subclave, ...], valor]   -> asigna valor en la ruta
+    ["d", [clave, subclave, ...]]          -> borra la ruta
+Las listas se tratan como valores atómicos (se reemplazan enteras).
+"""
+
+from copy import deepcopy
+from datetime import timedelta
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+
+def intervalo_keyframe() -> int:
+    return max(1, int(getattr(settings, "PROYECTO_SNAPSHOT_KEYFRAME_INTERVAL", 20)))
+
+
+def calcular_delta(anterior, nuevo, _ruta=None) -> list:
+    ruta = _ruta or []
+    if not isinstance(anterior, dict) or not isinstance(nuevo, dict):
+        return [] if anterior == nuevo else [["s", ruta, nuevo]]
+
+    ops = []
+    for k, v in nuevo.items():
+        if k not in anterior:
+            ops.append(["s", ruta + [k], v])
+        elif isinstance(v, dict) and isinstance(anterior[k], dict):
+            ops.extend(calcular_delta(anterior[k], v, ruta + [k]))
+        elif anterior[k] != v or type(anterior[k]) is not type(v):
+            ops.append(["s", ruta + [k], v])
+    for k in anterior:
+        if k not in nuevo:
+            ops.append(["d", ruta + [k]])
+    return ops
+
+
+def aplicar_delta(base, ops: list):
+    """Aplica un diff sobre una copia de `base` y devuelve el documento resultante."""
+    doc = deepcopy(base) if isinstance(base, dict) else {}
+    for op in ops or []:
+        accion, ruta = op[0], op[1]
+        if not ruta:
+            if accion == "s":
+                doc = deepcopy(op[2])
+            continue
+        nodo = doc
+        for k in ruta[:-1]:
+            if not isinstance(nodo.get(k), dict):
+                if accion == "d":
+                    nodo = None
+                    break
+                nodo[k] = {}
+            nodo = nodo[k]
+        if nodo is None:
+            continue
+        if accion == "s":
+            nodo[ruta[-1]] = deepcopy(op[2])
+        elif accion == "d":
+            nodo.pop(ruta[-1], None)
+    return doc
+
+
+def _tam(obj) -> int:
+    return len(json.dumps(obj, separators=(",", ":"), default=str))
+
+
+def hash_contenido(doc) -> str:
+    """SHA-256 de la forma canónica del documento (claves ordenadas, sin espacios)."""
+    canon = json.dumps(doc, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()
+
+
+def es_keyframe(snap) -> bool:
+    return snap.delta is None
+
+
+def reconstruir_version(proyecto_id, version_num):
+    """Documento completo de la versión `version_num` del proyecto (None si no existe)."""
+    from core.models import ProyectoSnapshot
+
+    objetivo = (
+        ProyectoSnapshot.objects.filter(proyecto_id=proyecto_id, version_num=version_num)
+        .order_by("-id")
+        .only("id", "version_num", "keyframe_num", "datos", "delta")
+        .first()
+    )
+    if objetivo is None:
+        return None
+    return datos_snapshot(objetivo)
+
+
+def datos_snapshot(snap) -> dict:
+    """Documento completo de un ProyectoSnapshot, sea keyframe o delta."""
+    from core.models import ProyectoSnapshot
+
+    if es_keyframe(snap):
+        return snap.datos if isinstance(snap.datos, dict) else {}
+
+    # Keyframe + deltas intermedios en una sola consulta (rango acotado por el intervalo)
+    cadena = list(
+        ProyectoSnapshot.objects.filter(
+            proyecto_id=snap.proyecto_id,
+            version_num__gte=snap.keyframe_num,
+            version_num__lte=snap.version_num,
+        )
+        .order_by("version_num", "id")
+        .only("id", "version_num", "keyframe_num", "datos", "delta")
+    )
+    doc = None
+    for s in cadena:
+        if es_keyframe(s):
+            if s.version_num == snap.keyframe_num:
+                doc = s.datos if isinstance(s.datos, dict) else {}
+            continue
+        if doc is None or s.keyframe_num != snap.keyframe_num:
+            continue
+        doc = aplicar_delta(doc, s.delta)
+        if s.id == snap.id:
+            break
+    return doc if isinstance(doc, dict) else {}
+
+
+def crear_snapshot_proyecto(
+    proyecto, datos: dict, fuente: str = "guardado", nota: str = "", anterior=None, abierta: bool = False
+):
+    """Crea la siguiente versión del proyecto como keyframe o como delta de la anterior.
+
+    `anterior` es el último ProyectoSnapshot (si se conoce); si no, se busca.
+    Conversión y cierre se guardan siempre completos.
+    `abierta=True` deja la versión abierta para que los autosaves siguientes la actualicen
+    (ver `snapshot_abierto`); crear una versión nueva sella las abiertas anteriores.
+
+    El número de versión se reserva antes de leer la anterior: el contador queda bloqueado
+    hasta el final de la transacción, así que dos guardados concurrentes no pueden
+    encadenar su diff sobre la misma versión.
+    """
+    from core.models import ProyectoSnapshot
+    from core.services.contadores import siguiente_version_proyecto
+
+    with transaction.atomic():
+        version_num = siguiente_version_proyecto(proyecto.id)
+        if anterior is None or anterior.version_num != version_num - 1:
+            anterior = (
+                ProyectoSnapshot.objects.filter(proyecto=proyecto)
+                .order_by("-version_num", "-id")
+                .only("id", "proyecto_id", "version_num", "keyframe_num", "datos", "delta", "abierta")
+                .first()
+            )
+
+        delta = None
+        if (
+            fuente == "guardado"
+            and anterior is not None
+            and anterior.version_num is not None
+            and anterior.keyframe_num is not None
+            and (anterior.version_num - anterior.keyframe_num + 1) < intervalo_keyframe()
+        ):
+            ops = calcular_delta(datos_snapshot(anterior), datos)
+            # Si el diff no compensa (cambio casi total), guardamos keyframe
+            if _tam(ops) < _tam(datos) // 2:
+                delta = ops
+
+        if anterior is not None and anterior.abierta:
+            ProyectoSnapshot.objects.filter(proyecto=proyecto, abierta=True).update(abierta=False)
+
+        snap = ProyectoSnapshot(
+            proyecto=proyecto,
+            version_num=version_num,
+            fuente=fuente,
+            nota=nota,
+            datos=None if delta is not None else datos,
+            delta=delta,
+            hash_contenido=hash_contenido(datos),
+            keyframe_num=anterior.keyframe_num if delta is not None else None,
+            abierta=abierta,
+        )
+        snap.save()
+    return snap
+
+
+def ventana_autosave() -> int:
+    return max(0, int(getattr(settings, "PROYECTO_AUTOSAVE_VENTANA", 120)))
+
+
+def snapshot_abierto(proyecto):
+    """Última versión del proyecto si sigue abierta y dentro de la ventana de autosave (bloqueada).
+
+    La ventana cuenta desde la creación de la versión: una sesión de edición larga sigue
+    generando una versión cada `PROYECTO_AUTOSAVE_VENTANA` segundos.
+    """
+    from core.models import ProyectoSnapshot
+
+    ventana = ventana_autosave()
+    if not ventana:
+        return None
+    ultimo = (
+        ProyectoSnapshot.objects.select_for_update()
+        .filter(proyecto=proyecto)
+        .order_by("-version_num", "-id")
+        .only("id", "proyecto_id", "version_num", "keyframe_num", "creado_en", "abierta", "delta", "codigo_version")
+        .first()
+    )
+    if ultimo is None or not ultimo.abierta:
+        return None
+    if ultimo.creado_en is None or ultimo.creado_en < timezone.now() - timedelta(seconds=ventana):
+        return None
+    return ultimo
+
+
+def actualizar_snapshot_abierto(snap, datos: dict, sellar: bool = False):
+    """Reescribe en sitio la versión abierta con el documento nuevo (mismo version_num).
+
+    Es la última versión, así que ninguna otra depende de ella: basta con recalcular su
+    diff contra la versión anterior (o guardarla completa si es keyframe).
+    """
+    from core.models import ProyectoSnapshot
+
+    campos = ["datos", "delta", "keyframe_num", "hash_contenido", "abierta"]
+    previa = None
+    if snap.delta is not None:
+        previa = (
+            ProyectoSnapshot.objects.filter(proyecto_id=snap.proyecto_id, version_num__lt=snap.version_num)
+            .order_by("-version_num", "-id")
+            .only("id", "proyecto_id", "version_num", "keyframe_num", "datos", "delta")
+            .first()
+        )
+
+    delta = None
+    if previa is not None and previa.keyframe_num == snap.keyframe_num:
+        ops = calcular_delta(datos_snapshot(previa), datos)
+        if _tam(ops) < _tam(datos) // 2:
+            delta = ops
+
+    snap.delta = delta
+    snap.datos = None if delta is not None else datos
+    if delta is None:
+        snap.keyframe_num = snap.version_num
+    snap.hash_contenido = hash_contenido(datos)
+    snap.abierta = not sellar
+    snap.save(update_fields=campos)
+    return snap
@@ -0,0 +1,210 @@
+"""TIR anualizada (XIRR) de proyectos y de la cartera a partir de sus flujos con fecha.
+
+Flujos de cada proyecto:
+- GastoProyecto confirmado: salida (−importe). Los estimados no cuentan: la TIR es la de
+  la caja real, y un estimado sin fecha real falsearía el calendario de flujos.
+- IngresoProyecto: entrada (+importe; puede venir negativo, p. ej. devoluciones).
+- MovimientoEconomicoProyecto: `ingreso` entra (+importe); `operacion` y
+  `comercializacion` salen (−importe).
+
+Los flujos del mismo día se suman. El tiempo se mide en años de 365 días desde el primer
+flujo (convención de XIRR en Excel).
+
+Todos los proyectos se resuelven a la vez: los flujos se colocan en una matriz
+(proyecto × flujo, con relleno a cero) y se itera Newton sobre el vector de tasas, con
+un intervalo que siempre contiene la raíz; si el paso de Newton se sale del intervalo se
+bisecta. La cartera es una fila más con todos los flujos juntos.
+
+Los flujos y la TIR de cada proyecto se cachean; core/signals.py invalida la entrada al
+guardar o borrar un gasto, ingreso o movimiento. La invalidación solo llega a la caché del
+proceso que guarda: con la caché local por proceso (sin REDIS_URL) las entradas duran
+PROYECTO_XIRR_CACHE_TIMEOUT_LOCAL, para que otros workers no sirvan una TIR vieja.
+"""
+
+from collections import defaultdict
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+
+TASA_MIN = -0.999999
+TASA_MAX = 1e6  # 100.000.000 %: por encima no se busca raíz
+MAX_ITERACIONES = 100
+TOLERANCIA = 1e-10
+
+SALIDAS_MOVIMIENTO = ("operacion", "comercializacion")
+
+
+def _clave(proyecto_id) -> str:
+    return f"core:proyecto:{proyecto_id}:xirr"
+
+
+def _cache_compartida() -> bool:
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    return not backend.endswith(("LocMemCache", "DummyCache"))
+
+
+def _timeout() -> int:
+    if not _cache_compartida():
+        return int(getattr(settings, "PROYECTO_XIRR_CACHE_TIMEOUT_LOCAL", 60))
+    return int(getattr(settings, "PROYECTO_XIRR_CACHE_TIMEOUT", 24 * 60 * 60))
+
+
+def invalidar_xirr_proyecto(proyecto_id) -> None:
+    try:
+        cache.delete(_clave(proyecto_id))
+    except Exception:
+        pass
+
+
+def flujos_proyectos(proyecto_ids=None) -> dict:
+    """{proyecto_id: [(ordinal de la fecha, importe), ...]} ordenados por fecha (3 consultas en total)."""
+    from core.models import GastoProyecto, IngresoProyecto, MovimientoEconomicoProyecto
+
+    por_dia = defaultdict(lambda: defaultdict(float))
+
+    def _filtrar(qs):
+        return qs if proyecto_ids is None else qs.filter(proyecto_id__in=list(proyecto_ids))
+
+    gastos = GastoProyecto.objects.filter(estado="confirmado")
+    for pid, fecha, importe in _filtrar(gastos).values_list("proyecto_id", "fecha", "importe"):
+        por_dia[pid][fecha.toordinal()] -= float(importe or 0)
+    for pid, fecha, importe in _filtrar(IngresoProyecto.objects.all()).values_list("proyecto_id", "fecha", "importe"):
+        por_dia[pid][fecha.toordinal()] += float(importe or 0)
+    for pid, tipo, fecha, importe in _filtrar(MovimientoEconomicoProyecto.objects.all()).values_list(
+        "proyecto_id", "tipo", "fecha", "importe"
+    ):
+        signo = -1.0 if tipo in SALIDAS_MOVIMIENTO else 1.0
+        por_dia[pid][fecha.toordinal()] += signo * float(importe or 0)
+
+    return {pid: sorted((d, round(v, 2)) for d, v in dias.items() if v) for pid, dias in por_dia.items()}
+
+
+def xirr_lote(series) -> list:
+    """XIRR de cada serie [(ordinal, importe), ...]; None si no tiene solución (sin cambio de signo)."""
+    import numpy as np
+
+    n = len(series)
+    if not n:
+        return []
+    ancho = max(1, max(len(s) for s in series))
+    t = np.zeros((n, ancho))
+    c = np.zeros((n, ancho))
+    for i, s in enumerate(series):
+        if s:
+            dias, importes = zip(*s)
+            t[i, : len(s)] = (np.asarray(dias, dtype=np.float64) - dias[0]) / 365.0
+            c[i, : len(s)] = importes
+
+    def _vpn(r):
+        # Tasa por fila (n, 1) contra la matriz de flujos; el relleno (c = 0) no aporta
+        base = (1.0 + r)[:, None]
+        descuento = np.power(base, -t)
+        return (c * descuento).sum(axis=1), (-t * c * descuento / base).sum(axis=1)
+
+    valida = (c > 0).any(axis=1) & (c < 0).any(axis=1)
+    escala = np.maximum(np.abs(c).sum(axis=1), 1.0)
+
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        bajo = np.full(n, TASA_MIN)
+        alto = np.full(n, 1.0)
+        f_bajo, _ = _vpn(bajo)
+        f_alto, _ = _vpn(alto)
+        # Ampliar el extremo superior hasta encerrar la raíz (rentabilidades muy altas)
+        while True:
+            ampliar = valida & (np.sign(f_bajo) == np.sign(f_alto)) & (alto < TASA_MAX)
+            if not ampliar.any():
+                break
+            alto = np.where(ampliar, alto * 10, alto)
+            f_alto = np.where(ampliar, _vpn(alto)[0], f_alto)
+        valida &= np.sign(f_bajo) != np.sign(f_alto)
+
+        r = np.clip(np.full(n, 0.1), bajo, alto)
+        pendiente = valida.copy()
+        for _ in range(MAX_ITERACIONES):
+            if not pendiente.any():
+                break
+            f, df = _vpn(r)
+            # El intervalo siempre conserva el cambio de signo
+            lado_bajo = np.sign(f) == np.sign(f_bajo)
+            bajo = np.where(pendiente & lado_bajo, r, bajo)
+            f_bajo = np.where(pendiente & lado_bajo, f, f_bajo)
+            alto = np.where(pendiente & ~lado_bajo, r, alto)
+
+            newton = r - f / df
+            dentro = np.isfinite(newton) & (newton > bajo) & (newton < alto)
+            nuevo = np.where(dentro, newton, (bajo + alto) / 2)
+
+            hecho = (np.abs(f) <= TOLERANCIA * escala) | (np.abs(nuevo - r) <= TOLERANCIA * (1 + np.abs(r)))
+            r = np.where(pendiente & ~hecho, nuevo, r)
+            pendiente &= ~hecho
+
+    return [float(x) if ok and np.isfinite(x) else None for x, ok in zip(r, valida)]
+
+
+def _resumen(serie, tasa) -> dict:
+    return {
+        "xirr": tasa,
+        "xirr_pct": round(tasa * 100, 4) if tasa is not None else None,
+        "flujos": len(serie),
+        "desde": date.fromordinal(serie[0][0]).isoformat() if serie else None,
+        "hasta": date.fromordinal(serie[-1][0]).isoformat() if serie else None,
+        "neto": round(sum(v for _, v in serie), 2),
+    }
+
+
+def xirr_proyectos(proyecto_ids) -> dict:
+    """{proyecto_id: resumen} usando la caché; los que faltan se calculan juntos en una pasada."""
+    ids = [int(p) for p in proyecto_ids]
+    try:
+        en_cache = cache.get_many([_clave(p) for p in ids])
+    except Exception:
+        en_cache = {}
+
+    resultado = {}
+    series = {}
+    for p in ids:
+        entrada = en_cache.get(_clave(p))
+        if isinstance(entrada, dict) and "serie" in entrada:
+            resultado[p] = entrada
+        else:
+            series[p] = None
+
+    if series:
+        calculadas = flujos_proyectos(list(series))
+        pendientes = [p for p in series]
+        tasas = xirr_lote([calculadas.get(p, []) for p in pendientes])
+        nuevas = {}
+        for p, tasa in zip(pendientes, tasas):
+            serie = calculadas.get(p, [])
+            resultado[p] = dict(_resumen(serie, tasa), serie=serie)
+            nuevas[_clave(p)] = resultado[p]
+        try:
+            cache.set_many(nuevas, _timeout())
+        except Exception:
+            # La caché es una optimización: nunca debe romper la vista
+            pass
+
+    return resultado
+
+
+def xirr_cartera(proyecto_ids=None) -> dict:
+    """TIR por proyecto y de la cartera (todos los flujos juntos). Sin ids: todos los proyectos."""
+    if proyecto_ids is None:
+        from core.models import Proyecto
+
+        proyecto_ids = list(Proyecto.objects.order_by("id").values_list("id", flat=True))
+
+    por_proyecto = xirr_proyectos(proyecto_ids)
+
+    agregado = defaultdict(float)
+    for r in por_proyecto.values():
+        for dia, importe in r["serie"]:
+            agregado[dia] += importe
+    serie_cartera = sorted((d, round(v, 2)) for d, v in agregado.items() if v)
+    (tasa_cartera,) = xirr_lote([serie_cartera])
+
+    return {
+        "proyectos": {p: {k: v for k, v in r.items() if k != "serie"} for p, r in por_proyecto.items()},
+        "cartera": _resumen(serie_cartera, tasa_cartera),
+    }
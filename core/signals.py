@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import GastoProyecto, IngresoProyecto, MovimientoEconomicoProyecto
+from core.services.xirr import invalidar_xirr_proyecto
+
+
+@receiver(post_save, sender=GastoProyecto)
+@receiver(post_save, sender=IngresoProyecto)
+@receiver(post_save, sender=MovimientoEconomicoProyecto)
+@receiver(post_delete, sender=GastoProyecto)
+@receiver(post_delete, sender=IngresoProyecto)
+@receiver(post_delete, sender=MovimientoEconomicoProyecto)
+def invalidar_xirr_por_movimiento(sender, instance, **kwargs):
+    # Los update()/bulk_* de QuerySet no emiten señales: quien los use debe invalidar a mano
+    invalidar_xirr_proyecto(instance.proyecto_id)
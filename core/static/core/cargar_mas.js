@@ -0,0 +1,42 @@
+/*
+  Carga incremental de listados (paginación por cursor)
+
+  Convención en HTML (botón .js-cargar-mas):
+  - data-url:    endpoint que devuelve el fragmento de tarjetas (cabecera X-Next-Cursor)
+  - data-target: id del grid al que se añaden las tarjetas
+  - data-cursor: cursor de la siguiente página
+  - data-error:  mensaje si falla la carga (opcional)
+*/
+(function () {
+  document.addEventListener('click', function (e) {
+    const btn = e.target.closest('.js-cargar-mas');
+    if (!btn) return;
+
+    const grid = document.getElementById(btn.dataset.target);
+    if (!grid) return;
+
+    const url = new URL(btn.dataset.url, window.location.origin);
+    url.searchParams.set('cursor', btn.dataset.cursor || '');
+
+    btn.disabled = true;
+    fetch(url.toString(), { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+      .then(res => {
+        if (!res.ok) throw new Error('Error al cargar');
+        const next = res.headers.get('X-Next-Cursor') || '';
+        return res.text().then(html => ({ html, next }));
+      })
+      .then(({ html, next }) => {
+        grid.insertAdjacentHTML('beforeend', html);
+        if (next) {
+          btn.dataset.cursor = next;
+          btn.disabled = false;
+        } else {
+          btn.remove();
+        }
+      })
+      .catch(() => {
+        btn.disabled = false;
+        alert(btn.dataset.error || 'No se pudieron cargar más resultados.');
+      });
+  });
+})();
@@ -504,9 +504,15 @@ const AUTOSAVE_STORAGE_KEY = "inversure_proyecto_autosave_last";
 let __autosaveTimer = null;
 let __autosaveInFlight = false;
 let __autosaveQueued = false;
-let __autosaveResolvedUrl = null;
 let __autosaveBound = false;
 let __autosaveLastPayloadSig = "";
+// Autosave incremental (JSON Patch): último payload confirmado por el servidor y su versión
+let __autosaveBasePayload = null;
+let __autosaveBaseVersion = null;
+let __autosaveBaseHash = "";
+// La última respuesta dejó una versión abierta (coalescencia): hay que sellarla al salir
+let __autosaveAbierta = false;
+let __autosaveQueuedKeepalive = false;
 
 function getCsrfToken() {
   try {
@@ -527,37 +533,77 @@ function getProyectoIdFromPath() {
   }
 }
 
-function getSaveUrlCandidates() {
-  const id = getProyectoIdFromPath();
-// 0) Prioridad máxima: URL real inyectada por la plantilla en el form
-try {
-  const form = document.querySelector("#proyectoForm");
-  const u = form && form.dataset ? (form.dataset.guardarUrl || "") : "";
-  if (u) return [u];
-} catch (e) {}
-  // 1) Si la plantilla define un global, úsalo
+// URL de guardado resuelta por la vista `proyecto` (data-guardar-url). Una sola URL:
+// nada de ir probando rutas candidatas contra el servidor.
+function getSaveUrl() {
+  try {
+    const form = document.querySelector("#proyectoForm");
+    const u = form && form.dataset ? (form.dataset.guardarUrl || "") : "";
+    if (u) return u;
+  } catch (e) {}
   if (window.PROYECTO_GUARDAR_URL && typeof window.PROYECTO_GUARDAR_URL === "string") {
-    return [window.PROYECTO_GUARDAR_URL];
+    return window.PROYECTO_GUARDAR_URL;
   }
+  const id = getProyectoIdFromPath();
+  return id ? `/proyectos/${id}/guardar/` : "";
+}
 
-  // 2) Si hay un atributo data-save-url en body o en un contenedor
-  const el = document.querySelector("[data-proyecto-save-url]") || document.body;
-  const attr = el && el.getAttribute ? el.getAttribute("data-proyecto-save-url") : "";
-  if (attr) return [attr];
-
-  // 3) Heurísticas por rutas típicas
-  const pathname = (window.location && window.location.pathname) ? window.location.pathname : "";
-  const normalized = pathname.endsWith("/") ? pathname : (pathname + "/");
+// Idempotency-Key: la misma para todos los envíos de un mismo payload (patch, completo,
+// reintentos y beacons keepalive), así el servidor descarta los duplicados.
+// El sufijo aleatorio distingue pestañas aunque el HTML venga de caché (304).
+const __autosaveInstancia = Math.random().toString(36).slice(2, 8);
+let __autosaveClaveSig = "";
+let __autosaveClave = "";
+let __autosaveSeq = 0;
+
+function getAutosaveClave(sig) {
+  if (sig !== __autosaveClaveSig) {
+    let prefijo = "";
+    try {
+      const form = document.querySelector("#proyectoForm");
+      prefijo = form && form.dataset ? (form.dataset.autosaveClave || "") : "";
+    } catch (e) {}
+    __autosaveClaveSig = sig;
+    __autosaveSeq += 1;
+    __autosaveClave = `${prefijo || "p" + getProyectoIdFromPath()}-${__autosaveInstancia}-${__autosaveSeq}`;
+  }
+  return __autosaveClave;
+}
 
-  const candidates = [];
-  if (id) {
-    candidates.push(`/proyectos/${id}/guardar/`);
-    candidates.push(`/proyectos/guardar/${id}/`);
+function getSavePatchUrl() {
+  try {
+    const form = document.querySelector("#proyectoForm");
+    return form && form.dataset ? (form.dataset.guardarPatchUrl || "") : "";
+  } catch (e) {
+    return "";
   }
-  // Por si la vista detalle es /proyectos/<id>/
-  candidates.push(normalized + "guardar/");
+}
 
-  return candidates;
+function _jsonPointer(parts) {
+  return parts.map((k) => "/" + String(k).replace(/~/g, "~0").replace(/\//g, "~1")).join("");
+}
+
+function _isPlainObject(v) {
+  return !!v && typeof v === "object" && !Array.isArray(v);
+}
+
+// Diff JSON Patch (RFC 6902) entre dos payloads. Las listas se reemplazan enteras.
+function buildJsonPatch(prev, next, path = []) {
+  const ops = [];
+  for (const k of Object.keys(next)) {
+    const p = path.concat([k]);
+    if (!(k in prev)) {
+      ops.push({ op: "add", path: _jsonPointer(p), value: next[k] });
+    } else if (_isPlainObject(prev[k]) && _isPlainObject(next[k])) {
+      ops.push(...buildJsonPatch(prev[k], next[k], p));
+    } else if (JSON.stringify(prev[k]) !== JSON.stringify(next[k])) {
+      ops.push({ op: "replace", path: _jsonPointer(p), value: next[k] });
+    }
+  }
+  for (const k of Object.keys(prev)) {
+    if (!(k in next)) ops.push({ op: "remove", path: _jsonPointer(path.concat([k])) });
+  }
+  return ops;
 }
 
 function _deepSet(obj, pathParts, value) {
@@ -724,13 +770,14 @@ function buildOverlayPayloadFromDOM() {
   return payload;
 }
 
-async function postJson(url, data, { keepalive = false } = {}) {
+async function postJson(url, data, { keepalive = false, clave = "" } = {}) {
   const csrf = getCsrfToken();
   const resp = await fetch(url, {
     method: "POST",
     headers: {
       "Content-Type": "application/json",
       ...(csrf ? { "X-CSRFToken": csrf } : {}),
+      ...(clave ? { "Idempotency-Key": clave } : {}),
     },
     credentials: "same-origin",
     body: JSON.stringify(data),
@@ -739,36 +786,99 @@ async function postJson(url, data, { keepalive = false } = {}) {
   return resp;
 }
 
-async function tryAutosaveOnce(payload, { keepalive = false } = {}) {
-  const candidates = __autosaveResolvedUrl ? [__autosaveResolvedUrl] : getSaveUrlCandidates();
+async function _leerJson(resp) {
+  try {
+    return await resp.json();
+  } catch (e) {
+    return null;
+  }
+}
+
+// Devuelve la respuesta del servidor ({ok, version, sin_cambios...}) o null si no se pudo guardar
+async function tryAutosaveOnce(payload, { keepalive = false, clave = "" } = {}) {
+  const url = getSaveUrl();
+  if (!url) return null;
 
   // Envolvemos el payload en {payload: ...} para que el backend pueda extraerlo con seguridad
-  const body = { payload };
+  // autosave: el servidor agrupa los guardados seguidos en una versión abierta; sellar (salida) la cierra
+  const body = { payload, autosave: true, sellar: keepalive };
 
-  let lastErr = null;
-  for (const url of candidates) {
-    try {
-      const resp = await postJson(url, body, { keepalive });
-      if (resp && resp.ok) {
-        __autosaveResolvedUrl = url;
-        try {
-          sessionStorage.setItem(AUTOSAVE_STORAGE_KEY, String(Date.now()));
-        } catch (e) {}
-        return true;
-      }
-      lastErr = new Error(`Autosave HTTP ${resp ? resp.status : "?"}`);
-    } catch (e) {
-      lastErr = e;
+  try {
+    const resp = await postJson(url, body, { keepalive, clave });
+    if (resp && resp.ok) {
+      try {
+        sessionStorage.setItem(AUTOSAVE_STORAGE_KEY, String(Date.now()));
+      } catch (e) {}
+      return (await _leerJson(resp)) || { ok: true };
     }
-  }
+  } catch (e) {}
 
   // Silencioso para no romper UX
-  return false;
+  return null;
+}
+
+// Envía solo los cambios respecto al último payload confirmado.
+// null => no aplica (sin base, patch mayor que el documento, 409 por versión distinta...) y
+// el llamador cae al guardado completo.
+// `forzar`: enviar aunque no haya cambios (patch vacío), p. ej. para sellar la versión abierta.
+async function tryAutosavePatch(payload, { keepalive = false, clave = "", forzar = false } = {}) {
+  const url = getSavePatchUrl();
+  if (!url || !__autosaveBasePayload || __autosaveBaseVersion === null) return null;
+
+  const ops = buildJsonPatch(__autosaveBasePayload, payload);
+  if (!ops.length && !forzar) return { ok: true, sin_cambios: true, version: __autosaveBaseVersion };
+
+  const body = {
+    base_version: __autosaveBaseVersion,
+    base_hash: __autosaveBaseHash,
+    patch: ops,
+    autosave: true,
+    sellar: keepalive,
+  };
+  if (JSON.stringify(body).length >= JSON.stringify({ payload }).length) return null;
+
+  try {
+    const resp = await postJson(url, body, { keepalive, clave });
+    if (resp && resp.ok) {
+      try {
+        sessionStorage.setItem(AUTOSAVE_STORAGE_KEY, String(Date.now()));
+      } catch (e) {}
+      return (await _leerJson(resp)) || { ok: true };
+    }
+  } catch (e) {}
+  return null;
+}
+
+// Al salir sin cambios desde el último autosave: cerrar la versión abierta igualmente
+// (si no, quedaría abierta y el siguiente autosave, dentro de la ventana, la reescribiría).
+// Clave propia: la del último guardado haría que el servidor lo tomase por un reintento.
+async function sellarVersionAbierta(payload, sig) {
+  const clave = `${getAutosaveClave(sig)}-sello`;
+  let data = await tryAutosavePatch(payload, { keepalive: true, clave, forzar: true });
+  if (!data) data = await tryAutosaveOnce(payload, { keepalive: true, clave });
+  if (data) __autosaveAbierta = !!data.abierta;
+}
+
+function _recordarBaseAutosave(payload, data) {
+  // Sin cambios: el servidor conserva el overlay anterior, que sigue siendo nuestra base
+  // (salvo `repetido`: era este mismo payload, ya aplicado en un envío anterior)
+  if (data && data.sin_cambios && !data.repetido) return;
+  if (data && data.version !== null && data.version !== undefined) {
+    __autosaveBasePayload = JSON.parse(JSON.stringify(payload));
+    __autosaveBaseVersion = data.version;
+    __autosaveBaseHash = data.hash || "";
+  } else {
+    __autosaveBasePayload = null;
+    __autosaveBaseVersion = null;
+    __autosaveBaseHash = "";
+  }
 }
 
 async function autosaveNow({ keepalive = false } = {}) {
   if (__autosaveInFlight) {
     __autosaveQueued = true;
+    // Salida de la página con un guardado en curso: el siguiente debe sellar
+    __autosaveQueuedKeepalive = __autosaveQueuedKeepalive || keepalive;
     return;
   }
   __autosaveInFlight = true;
@@ -787,13 +897,21 @@ async function autosaveNow({ keepalive = false } = {}) {
     if (hasSomething) {
       // Firma estable del payload para evitar envíos duplicados
       const sig = JSON.stringify(payload);
-      if (sig === __autosaveLastPayloadSig) return;
+      if (sig === __autosaveLastPayloadSig) {
+        if (keepalive && __autosaveAbierta) await sellarVersionAbierta(payload, sig);
+        return;
+      }
       __autosaveLastPayloadSig = sig;
 
-      const ok = await tryAutosaveOnce(payload, { keepalive });
+      const clave = getAutosaveClave(sig);
+      let data = await tryAutosavePatch(payload, { keepalive, clave });
+      if (!data) data = await tryAutosaveOnce(payload, { keepalive, clave });
       // Si falló, permitimos reintento en el siguiente cambio
-      if (!ok) {
+      if (!data) {
         __autosaveLastPayloadSig = "";
+      } else {
+        _recordarBaseAutosave(payload, data);
+        if (data.abierta !== undefined) __autosaveAbierta = !!data.abierta;
       }
     }
   } catch (e) {
@@ -802,8 +920,15 @@ async function autosaveNow({ keepalive = false } = {}) {
     __autosaveInFlight = false;
     if (__autosaveQueued) {
       // Si hubo cambios mientras guardábamos, guardamos una vez más
+      const keepaliveSiguiente = __autosaveQueuedKeepalive;
       __autosaveQueued = false;
-      setTimeout(() => autosaveNow({ keepalive: false }), 0);
+      __autosaveQueuedKeepalive = false;
+      if (keepaliveSiguiente) {
+        // La página se está cerrando: sin setTimeout, que podría no llegar a ejecutarse
+        autosaveNow({ keepalive: true });
+      } else {
+        setTimeout(() => autosaveNow({ keepalive: false }), 0);
+      }
     }
   }
 }
@@ -592,10 +592,180 @@ function actualizarVistaComite() {
       ? formatEuro(estadoEstudio.comite.breakeven)
       : "—";
   }
+  programarSensibilidad();
   renderSemaforoVisual();
   renderRoiBarra();
 }
 
+// ==============================
+// SENSIBILIDAD (COMITÉ)
+// ==============================
+// La rejilla compra × venta × meses la calcula el servidor (NumPy) en una sola pasada;
+// aquí solo se pide (con debounce) y se pinta el corte del plazo seleccionado.
+let __sensibilidadTimer = null;
+let __sensibilidadClave = "";
+let __sensibilidad = null;
+
+function programarSensibilidad() {
+  if (!document.getElementById("sensibilidad_heatmap")) return;
+  clearTimeout(__sensibilidadTimer);
+  __sensibilidadTimer = setTimeout(cargarSensibilidad, 400);
+}
+
+function _decodificarRejillaF32(r) {
+  const bin = atob(r.datos);
+  const bytes = new Uint8Array(bin.length);
+  for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+  return { forma: r.forma, datos: new Float32Array(bytes.buffer) };
+}
+
+async function cargarSensibilidad() {
+  const estado = document.getElementById("sensibilidad_estado");
+  const precio = estadoEstudio.precio_escritura;
+  const venta = estadoEstudio.valor_transmision;
+  if (!precio || !venta) {
+    __sensibilidad = null;
+    __sensibilidadClave = "";
+    if (estado) estado.textContent = "Introduce precio de escritura y valoraciones para ver la sensibilidad.";
+    renderHeatmapSensibilidad();
+    return;
+  }
+
+  const sel = document.getElementById("inv_porcentaje_comision");
+  const coste = document.getElementById("sensibilidad_coste_mensual");
+  const params = new URLSearchParams({
+    precio_escritura: String(precio),
+    venta: String(venta),
+    gastos_extras: String(estadoEstudio.gastos_extras || 0),
+    comision_pct: String(sel ? (parseFloat(sel.value) || 0) : 0),
+    coste_mensual: String(coste ? (parseEuro(coste.value) || 0) : 0),
+    metricas: "roi,roi_anual,beneficio_neto",
+    formato: "f32",
+  });
+  const clave = params.toString();
+  if (clave === __sensibilidadClave) return;
+  __sensibilidadClave = clave;
+
+  const url = estudioIdActual && /^\d+$/.test(String(estudioIdActual))
+    ? `/estudios/${estudioIdActual}/sensibilidad/`
+    : "/estudios/sensibilidad/";
+  try {
+    const resp = await fetch(`${url}?${clave}`, { headers: { "Accept": "application/json" } });
+    const data = await resp.json();
+    if (clave !== __sensibilidadClave) return; // llegó una respuesta más nueva
+    if (!resp.ok || !data.ok) {
+      __sensibilidad = null;
+      if (estado) estado.textContent = data.error || "No se pudo calcular la sensibilidad.";
+    } else {
+      const rejillas = {};
+      Object.keys(data.rejillas).forEach(k => { rejillas[k] = _decodificarRejillaF32(data.rejillas[k]); });
+      __sensibilidad = { ejes: data.ejes, rejillas };
+      const slider = document.getElementById("sensibilidad_meses");
+      if (slider) {
+        slider.max = String(data.ejes.meses.length - 1);
+        if (Number(slider.value) > data.ejes.meses.length - 1) slider.value = "0";
+      }
+      if (estado) estado.textContent = "";
+    }
+  } catch (e) {
+    __sensibilidadClave = "";
+    __sensibilidad = null;
+    if (estado) estado.textContent = "Error de comunicación con el servidor";
+  }
+  renderHeatmapSensibilidad();
+}
+
+function _colorSensibilidad(metrica, v) {
+  if (!Number.isFinite(v)) return "#e5e7eb";
+  // Mismos umbrales que el semáforo (ROI) y cero como frontera en euros
+  let t;
+  if (metrica === "beneficio_neto") {
+    t = v <= 0 ? 0 : Math.min(1, 0.5 + v / 100000);
+  } else {
+    t = v <= 0 ? 0 : v < 10 ? 0.25 + v / 40 : v < 20 ? 0.5 + (v - 10) / 40 : Math.min(1, 0.75 + (v - 20) / 80);
+  }
+  const hue = Math.round(t * 120); // 0 rojo → 120 verde
+  return `hsl(${hue}, 65%, ${v <= 0 ? 45 : 50}%)`;
+}
+
+function _celdaSensibilidad(i, j, k) {
+  const s = __sensibilidad;
+  const metrica = (document.getElementById("sensibilidad_metrica") || {}).value || "roi";
+  const r = s.rejillas[metrica];
+  const [, nV, nM] = r.forma;
+  return r.datos[(i * nV + j) * nM + k];
+}
+
+function renderHeatmapSensibilidad() {
+  const canvas = document.getElementById("sensibilidad_heatmap");
+  if (!canvas) return;
+  const ctx = canvas.getContext("2d");
+  ctx.clearRect(0, 0, canvas.width, canvas.height);
+  const mesesTxt = document.getElementById("sensibilidad_meses_txt");
+  const s = __sensibilidad;
+  if (!s) {
+    if (mesesTxt) mesesTxt.textContent = "--";
+    return;
+  }
+
+  const metrica = (document.getElementById("sensibilidad_metrica") || {}).value || "roi";
+  const slider = document.getElementById("sensibilidad_meses");
+  const k = slider ? Number(slider.value) || 0 : 0;
+  if (mesesTxt) mesesTxt.textContent = String(s.ejes.meses[k]);
+
+  const nP = s.ejes.precio_escritura.length;
+  const nV = s.ejes.venta.length;
+  const w = canvas.width / nV;
+  const h = canvas.height / nP;
+  for (let i = 0; i < nP; i++) {
+    // Precio de compra de arriba (más caro) a abajo (más barato)
+    const fila = nP - 1 - i;
+    for (let j = 0; j < nV; j++) {
+      ctx.fillStyle = _colorSensibilidad(metrica, _celdaSensibilidad(i, j, k));
+      ctx.fillRect(j * w, fila * h, Math.ceil(w), Math.ceil(h));
+    }
+  }
+
+  // Marca del escenario actual (centro de los ejes)
+  ctx.strokeStyle = "#122135";
+  ctx.lineWidth = 2;
+  ctx.strokeRect(Math.floor((nV - 1) / 2) * w, (nP - 1 - Math.floor((nP - 1) / 2)) * h, w, h);
+}
+
+(function initSensibilidad() {
+  const canvas = document.getElementById("sensibilidad_heatmap");
+  if (!canvas) return;
+  ["sensibilidad_metrica", "sensibilidad_meses"].forEach(id => {
+    const el = document.getElementById(id);
+    if (el) el.addEventListener("input", renderHeatmapSensibilidad);
+  });
+  const coste = document.getElementById("sensibilidad_coste_mensual");
+  if (coste) {
+    aplicarFormatoInput(coste);
+    coste.addEventListener("change", programarSensibilidad);
+  }
+  const sel = document.getElementById("inv_porcentaje_comision");
+  if (sel) sel.addEventListener("change", programarSensibilidad);
+
+  canvas.addEventListener("mousemove", ev => {
+    const s = __sensibilidad;
+    const info = document.getElementById("sensibilidad_celda");
+    if (!s || !info) return;
+    const rect = canvas.getBoundingClientRect();
+    const nP = s.ejes.precio_escritura.length;
+    const nV = s.ejes.venta.length;
+    const j = Math.min(nV - 1, Math.max(0, Math.floor((ev.clientX - rect.left) / rect.width * nV)));
+    const i = nP - 1 - Math.min(nP - 1, Math.max(0, Math.floor((ev.clientY - rect.top) / rect.height * nP)));
+    const slider = document.getElementById("sensibilidad_meses");
+    const k = slider ? Number(slider.value) || 0 : 0;
+    const metrica = (document.getElementById("sensibilidad_metrica") || {}).value || "roi";
+    const v = _celdaSensibilidad(i, j, k);
+    const valor = !Number.isFinite(v) ? "—" : metrica === "beneficio_neto" ? formatEuro(v) : formatNumberEs(v, 2) + " %";
+    info.textContent = `Compra ${formatEuro(s.ejes.precio_escritura[i])} · Venta ${formatEuro(s.ejes.venta[j])} · ` +
+      `${s.ejes.meses[k]} meses → ${valor}`;
+  });
+})();
+
 // ==============================
 // FORMATO EN TIEMPO REAL
 // ==============================
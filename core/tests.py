@@ -1,3 +1,1247 @@
-from django.test import TestCase
+import io
+import json
+import threading
+import time
+from datetime import date
 
-# Create your tests here.
+from django.db import connection
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from core.models import Estudio, GastoProyecto, IngresoProyecto, MovimientoEconomicoProyecto, Proyecto, ProyectoSnapshot
+from core.services.motor_financiero import calcular_inversor, recalcular_desde_datos, recalcular_estudio
+from core.services.motor_lotes import aplicar_kpis, columnas, filas_lote, kpis_fila, kpis_lote
+from core.services.montecarlo import riesgo_estudio
+from core.services.sensibilidad import rejilla_sensibilidad
+from core.services.xirr import xirr_cartera, xirr_lote
+from core.services.snapshot_delta import datos_snapshot, hash_contenido
+
+
+class ContadoresConcurrenciaTests(TransactionTestCase):
+    """Numeración sin carreras (core.services.contadores) con escrituras desde varios hilos."""
+
+    HILOS = 8
+    GUARDADOS_POR_HILO = 5
+
+    def _en_hilos(self, trabajo):
+        errores = []
+
+        def _run(n):
+            try:
+                trabajo(n, errores)
+            except Exception as e:  # pragma: no cover - se reporta en el assert
+                errores.append(repr(e))
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=_run, args=(n,)) for n in range(self.HILOS)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        return errores
+
+    def test_guardar_proyecto_concurrente_versiones_unicas(self):
+        proyecto = Proyecto.objects.create(nombre="Concurrencia", snapshot_datos={"base": {"valor": 1}})
+        url = reverse("core:guardar_proyecto", args=[proyecto.id])
+
+        def trabajo(n, errores):
+            client = Client()
+            for i in range(self.GUARDADOS_POR_HILO):
+                payload = {"payload": {"reales": {"hilo": n, "guardado": i}}}
+                r = client.post(url, data=json.dumps(payload), content_type="application/json")
+                if r.status_code != 200 or not r.json().get("ok") or r.json().get("version") is None:
+                    errores.append(r.content.decode())
+
+        errores = self._en_hilos(trabajo)
+        self.assertEqual(errores, [])
+
+        snaps = list(ProyectoSnapshot.objects.filter(proyecto=proyecto).order_by("version_num"))
+        versiones = [s.version_num for s in snaps]
+        self.assertEqual(len(versiones), self.HILOS * self.GUARDADOS_POR_HILO)
+        self.assertEqual(len(set(versiones)), len(versiones))
+
+        # Cada versión (keyframe o delta) se reconstruye exactamente
+        for s in snaps:
+            self.assertEqual(hash_contenido(datos_snapshot(s)), s.hash_contenido)
+
+        proyecto.refresh_from_db()
+        self.assertEqual(proyecto.ultimo_snapshot.version_num, max(versiones))
+
+    def test_codigo_estudio_concurrente_unico(self):
+        def trabajo(n, errores):
+            for i in range(self.GUARDADOS_POR_HILO):
+                Estudio.objects.create(nombre=f"E{n}-{i}", datos={})
+
+        errores = self._en_hilos(trabajo)
+        self.assertEqual(errores, [])
+
+        codigos = list(Estudio.objects.values_list("codigo_estudio", flat=True))
+        self.assertEqual(len(codigos), self.HILOS * self.GUARDADOS_POR_HILO)
+        self.assertEqual(len(set(codigos)), len(codigos))
+
+
+class ContadoresTests(TestCase):
+    def test_incremento_y_semilla(self):
+        from core.services.contadores import siguiente_valor
+
+        self.assertEqual(siguiente_valor("prueba", lambda: 41), 42)
+        self.assertEqual(siguiente_valor("prueba", lambda: 0), 43)  # la semilla solo cuenta al crear
+        self.assertEqual(siguiente_valor("otra"), 1)
+
+    def test_incremento_en_una_consulta(self):
+        from django.test.utils import CaptureQueriesContext
+
+        from core.services.contadores import siguiente_valor
+
+        siguiente_valor("prueba")
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(siguiente_valor("prueba"), 2)
+        # Sin contar los SAVEPOINT del atomic: un único UPDATE ... RETURNING
+        sql = [q["sql"] for q in consultas.captured_queries if "SAVEPOINT" not in q["sql"]]
+        self.assertEqual(len(sql), 1)
+        self.assertIn("RETURNING", sql[0])
+
+
+class MotorFinancieroGoldenTests(SimpleTestCase):
+    """core.services.motor_financiero frente a `recalcularTodo` de simulador.js.
+
+    Los valores esperados son salidas reales del JS (node, mismas entradas): la igualdad
+    es exacta porque Python y JS comparten la aritmética IEEE-754 si se respeta el orden
+    de las operaciones.
+    """
+
+    CAMPOS = (
+        "itp", "notaria", "media_valoraciones", "valor_adquisicion", "beneficio_bruto", "roi", "margen_pct",
+        "semaforo", "ratio_euro_beneficio", "colchon_seguridad", "breakeven", "colchon_mercado",
+    )
+    # ((precio_escritura, gastos_extras, valoraciones), valores de CAMPOS)
+    CASOS = (
+        ((147199.66, 3500, [210000, 0, 198500.5, 0, 205000]),
+         (2943.9932000000003, 500, 204500.16666666666, 154643.6532, 49856.513466666656, 32.23961180106592, 24.37969331728336, "verde", 3.1017743208897373, 19856.513466666656, 184643.6532, 132.2396118010659)),
+        ((100000, 0, [0, 0, 0, 0, 0]),
+         (2000, 500, None, 103000, -103000, -100, 0, "rojo", 0, 0, 133000, 0)),
+        ((180000, 12000.35, [195000, 201000, 0, 189999.99, 0]),
+         (3600, 500, 195333.33, 196600.35, -1267.0200000000186, -0.6444647733333224, -0.6486450622635772, "rojo", 0, -31267.02000000002, 226600.35, 99.35553522666667)),
+        ((20000, None, [0, 26000, 0, 0, 0]),
+         (400, 500, 26000, 21400, 4600, 21.49532710280374, 17.692307692307693, "verde", 4.6521739130434785, -25400, 51400, 121.49532710280373)),
+        ((250000, 1000, [240000, 245000, 250000, 255000, 238000]),
+         (5000, 500, 245600, 257000, -11400, -4.43579766536965, -4.641693811074918, "rojo", 0, -41400, 287000, 95.56420233463035)),
+        ((95000.1, 7000, [131000, 0, 0, 0, 129500]),
+         (1900.0020000000002, 500, 130250, 104900.102, 25349.898, 24.165751526151997, 19.462493666026873, "verde", 4.138087735106469, -4650.101999999999, 134900.102, 124.165751526152)),
+        ((400000, 2500, [470000, 480000, 0, 0, 0]),
+         (8000, 800, 475000, 412100, 62900, 15.263285610288765, 13.242105263157894, "amarillo", 6.5516693163751984, 32900, 442100, 115.26328561028876)),
+        ((612345.67, 0, [0, 0, 0, 0, 690000]),
+         (12246.913400000001, 1224.69134, 690000, 627041.96608, 62958.03391999996, 10.04048171027321, 9.124352742028979, "amarillo", 9.959681505886524, 32958.03391999996, 657041.96608, 110.04048171027321)),
+    )
+
+    def test_igual_que_simulador_js(self):
+        for (precio, gastos, valoraciones), esperado in self.CASOS:
+            with self.subTest(precio=precio):
+                r = recalcular_estudio(precio, valoraciones, gastos)
+                obtenido = {**r, **r["comite"]}
+                self.assertEqual(tuple(obtenido[c] for c in self.CAMPOS), esperado)
+                self.assertEqual(r["registro"], r["notaria"])
+                self.assertEqual(r["valor_transmision"], r["media_valoraciones"])
+
+    def test_sin_precio_no_recalcula(self):
+        self.assertIsNone(recalcular_estudio(None, [200000]))
+        self.assertIsNone(recalcular_estudio(0, [200000]))
+
+    def test_desde_datos_del_simulador(self):
+        datos = {
+            "inversure_comision_pct": 30,
+            "snapshot": {
+                "precio_escritura": 400000,
+                "gastos_extras": 2500,
+                "valoraciones": {"valoracion_0": 470000, "valoracion_1": 480000},
+            },
+        }
+        r = recalcular_desde_datos(datos)
+        self.assertEqual(r["valor_adquisicion"], 412100)
+        self.assertEqual(r["comite"]["beneficio_bruto"], 62900)
+        self.assertEqual(r["inversor"]["comision_eur"], 62900 * 30 / 100)
+        self.assertEqual(r["inversor"]["beneficio_neto"], 62900 - 18870)
+        self.assertAlmostEqual(r["inversor"]["roi_neto"], 44030 / 412100 * 100, places=12)
+
+    def test_sin_beneficio_no_hay_comision(self):
+        inv = calcular_inversor(103000, -103000, 35)
+        self.assertEqual(inv["comision_eur"], 0)
+        self.assertEqual(inv["beneficio_neto"], -103000)
+
+
+class MotorLotesTests(SimpleTestCase):
+    """El recálculo vectorizado da exactamente lo mismo que el camino fila a fila."""
+
+    def test_lote_igual_que_fila(self):
+        datos = [
+            {"inversure_comision_pct": 35, "snapshot": {"precio_escritura": 147199.66, "gastos_extras": 3500,
+                                                        "valoraciones": {"valoracion_0": 210000, "valoracion_2": 198500.5}}},
+            {"snapshot": {"precio_escritura": 100000}},  # sin valoraciones: pérdida total
+            {"valor_adquisicion": 120000, "valor_transmision": 150000, "comision_inversure_pct": 30},  # sin precio
+            {"valor_adquisicion": 0},  # nada que calcular
+            {},
+        ]
+        for itp, comision in ((0.02, None), (0.03, 40)):
+            with self.subTest(itp=itp, comision=comision):
+                lote = dict(filas_lote(kpis_lote(columnas(datos, comision), itp_pct=itp)))
+                self.assertEqual(sorted(lote), [0, 1, 2])
+                for i, d in enumerate(datos):
+                    self.assertEqual(lote.get(i), kpis_fila(d, itp, comision))
+
+    def test_no_escribe_claves_que_el_estudio_no_tenia(self):
+        datos = {"snapshot": {"precio_escritura": 100000}}
+        (_, k), = filas_lote(kpis_lote(columnas([datos])))
+        aplicar_kpis(datos, k)
+        self.assertNotIn("valor_transmision", datos)
+        self.assertNotIn("comision_inversure_pct", datos)
+        self.assertNotIn("inversure_comision_pct", datos)
+        self.assertEqual(datos["beneficio"], -(100000 + 2000 + 500 + 500))
+
+
+class RecalcularKpisEstudiosTests(TestCase):
+    def test_actualiza_columnas_y_fecha(self):
+        from core.services.motor_lotes import recalcular_kpis_estudios
+
+        estudio = Estudio.objects.create(
+            nombre="E", datos={"snapshot": {"precio_escritura": 100000, "valoraciones": {"valoracion_0": 150000}}}
+        )
+        antes = Estudio.objects.get(pk=estudio.pk).actualizado
+        time.sleep(0.01)
+        self.assertEqual(recalcular_kpis_estudios(), {"revisados": 1, "actualizados": 1})
+        estudio.refresh_from_db()
+        self.assertGreater(estudio.actualizado, antes)
+        self.assertEqual(str(estudio.beneficio), "47000.00")
+        self.assertEqual(estudio.datos["valor_transmision"], 150000)
+
+        # Sin cambios en los KPIs no se reescribe nada (ni cambia el ETag)
+        self.assertEqual(recalcular_kpis_estudios(), {"revisados": 1, "actualizados": 0})
+        self.assertEqual(Estudio.objects.get(pk=estudio.pk).actualizado, estudio.actualizado)
+        self.assertEqual(recalcular_kpis_estudios(comision_pct=10)["actualizados"], 1)
+
+    def test_no_toca_estudios_bloqueados(self):
+        from django.core.management import call_command
+
+        datos = {"snapshot": {"precio_escritura": 100000, "valoraciones": {"valoracion_0": 150000}}}
+        estudio = Estudio.objects.create(nombre="E", datos=datos, bloqueado=True)
+        antes = Estudio.objects.get(pk=estudio.pk)
+
+        call_command("recalcular_kpis_estudios", stdout=io.StringIO())
+        despues = Estudio.objects.get(pk=estudio.pk)
+        self.assertEqual((despues.datos, despues.actualizado, despues.roi), (antes.datos, antes.actualizado, antes.roi))
+
+        salida = io.StringIO()
+        call_command("recalcular_kpis_estudios", "--incluir-bloqueados", stdout=salida)
+        self.assertIn("recalculados: 1", salida.getvalue())
+        self.assertEqual(str(Estudio.objects.get(pk=estudio.pk).beneficio), "47000.00")
+
+
+class SensibilidadTests(SimpleTestCase):
+    def test_punto_base_igual_que_motor(self):
+        base = recalcular_estudio(147199.66, [210000, 0, 198500.5, 0, 205000], 3500)
+        r = rejilla_sensibilidad([100000, 147199.66], [base["valor_transmision"]], [6, 9, 12], gastos_extras=3500)
+        self.assertEqual(r["roi"].shape, (2, 1, 3))
+        self.assertEqual(r["breakeven"].shape, (2, 3))
+        self.assertEqual(r["roi"][1, 0, 1], base["comite"]["roi"])
+        self.assertEqual(r["breakeven"][1, 1], base["comite"]["breakeven"])
+        # Sin coste de tenencia el plazo solo cambia el ROI anualizado
+        self.assertEqual(r["roi"][1, 0, 0], r["roi"][1, 0, 2])
+        self.assertGreater(r["roi_anual"][1, 0, 0], r["roi_anual"][1, 0, 2])
+
+    def test_coste_mensual_reduce_beneficio(self):
+        r = rejilla_sensibilidad([200000], [260000], [6, 12], comision_pct=30, coste_mensual=1000)
+        neto_6, neto_12 = r["beneficio_neto"][0, 0]
+        self.assertAlmostEqual(neto_6 - neto_12, 6000 * 0.7, places=6)
+
+    def test_endpoint(self):
+        c = Client()
+        self.assertEqual(c.get(reverse("core:sensibilidad_simulador")).status_code, 400)
+        resp = c.get(
+            reverse("core:sensibilidad_simulador"),
+            {"precio_escritura": 180000, "venta": 240000, "precio_pasos": 5, "venta_pasos": 4, "meses_min": 6, "meses_max": 8},
+        )
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data["ejes"]["meses"], [6, 7, 8])
+        self.assertEqual(len(data["rejillas"]["roi"]), 5)
+        self.assertEqual(len(data["rejillas"]["roi"][0]), 4)
+        binario = c.get(reverse("core:sensibilidad_simulador"), {"precio_escritura": 180000, "venta": 240000, "formato": "f32"})
+        self.assertEqual(binario.json()["rejillas"]["roi"]["forma"], [50, 50, 12])
+
+
+class MonteCarloTests(SimpleTestCase):
+    DATOS = {
+        "inversure_comision_pct": 35,
+        "snapshot": {
+            "precio_escritura": 147199.66,
+            "gastos_extras": 3500,
+            "valoraciones": {"valoracion_0": 210000, "valoracion_2": 198500.5, "valoracion_4": 205000},
+        },
+    }
+
+    def test_reproducible_y_rapido(self):
+        t0 = time.perf_counter()
+        a = riesgo_estudio(self.DATOS)
+        self.assertLess(time.perf_counter() - t0, 1.0)
+        self.assertEqual(a["simulaciones"], 100_000)
+        self.assertEqual(a, riesgo_estudio(self.DATOS))
+        otra = riesgo_estudio(self.DATOS, semilla=a["semilla"] + 1)
+        self.assertNotEqual({k: v for k, v in a.items() if k != "semilla"}, {k: v for k, v in otra.items() if k != "semilla"})
+        self.assertLessEqual(a["roi_p5"], a["roi_p50"])
+        self.assertLessEqual(a["roi_p50"], a["roi_p95"])
+
+    def test_operacion_ajustada_tiene_riesgo(self):
+        # Venta media ~ adquisición: en torno a la mitad de los escenarios pierden
+        datos = {"snapshot": {"precio_escritura": 180000, "valoraciones": {"valoracion_0": 185000, "valoracion_1": 190000}}}
+        r = riesgo_estudio(datos, simulaciones=20_000)
+        self.assertGreater(r["prob_perdida"], 20)
+        self.assertEqual(r["nivel_riesgo"], "Alto")
+
+    def test_sin_valoraciones(self):
+        self.assertIsNone(riesgo_estudio({"snapshot": {"precio_escritura": 100000}}))
+
+
+class MonteCarloEndpointTests(TestCase):
+    def test_parametros(self):
+        estudio = Estudio.objects.create(nombre="E", datos=MonteCarloTests.DATOS)
+        url = reverse("core:montecarlo_estudio", args=[estudio.id])
+        c = Client()
+        r = c.get(url, {"simulaciones": 10_000_000, "semilla": 7}).json()["riesgo"]
+        self.assertEqual((r["simulaciones"], r["semilla"]), (100_000, 7))
+        self.assertEqual(c.get(url, {"semilla": -1}).status_code, 400)
+        self.assertEqual(c.get(url, {"simulaciones": "x"}).status_code, 400)
+        self.assertEqual(c.get(reverse("core:montecarlo_estudio", args=[999999])).status_code, 404)
+
+
+class XirrTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_ejemplo_excel(self):
+        d = lambda *a: date(*a).toordinal()  # noqa: E731
+        serie = [
+            (d(2008, 1, 1), -10000),
+            (d(2008, 3, 1), 2750),
+            (d(2008, 10, 30), 4250),
+            (d(2009, 2, 15), 3250),
+            (d(2009, 4, 1), 2750),
+        ]
+        tasa, sin_salidas, vacia = xirr_lote([serie, [(d(2020, 1, 1), 100)], []])
+        self.assertAlmostEqual(tasa, 0.373362535, places=8)
+        self.assertIsNone(sin_salidas)
+        self.assertIsNone(vacia)
+
+    def test_proyectos_cartera_e_invalidacion(self):
+        a = Proyecto.objects.create(nombre="A")
+        b = Proyecto.objects.create(nombre="B")
+        GastoProyecto.objects.create(
+            proyecto=a, fecha=date(2024, 1, 1), categoria="adquisicion", concepto="Compra", importe=100000, estado="confirmado"
+        )
+        # Los gastos estimados no son caja real: no entran en la TIR
+        GastoProyecto.objects.create(proyecto=a, fecha=date(2024, 6, 1), categoria="reforma", concepto="Obra", importe=5000)
+        IngresoProyecto.objects.create(proyecto=a, fecha=date(2025, 1, 1), tipo="venta", concepto="Venta", importe=120000)
+        MovimientoEconomicoProyecto.objects.create(proyecto=b, tipo="operacion", concepto="Compra", fecha=date(2024, 1, 1), importe=50000)
+        MovimientoEconomicoProyecto.objects.create(proyecto=b, tipo="ingreso", concepto="Venta", fecha=date(2024, 7, 1), importe=55000)
+
+        res = xirr_cartera([a.id, b.id])
+        # 2024 es bisiesto: 366 días => algo menos del 20 %
+        self.assertAlmostEqual(res["proyectos"][a.id]["xirr"], 1.2 ** (365 / 366) - 1, places=10)
+        self.assertGreater(res["proyectos"][b.id]["xirr"], res["proyectos"][a.id]["xirr"])
+        self.assertEqual(res["cartera"]["neto"], 25000)
+        self.assertEqual(res["cartera"]["flujos"], 3)  # las dos compras del 1/1/2024 se agregan
+
+        # Un movimiento nuevo invalida la caché del proyecto
+        IngresoProyecto.objects.create(proyecto=a, fecha=date(2025, 1, 1), tipo="otro", concepto="Extra", importe=10000)
+        self.assertAlmostEqual(xirr_cartera([a.id])["proyectos"][a.id]["xirr"], 1.3 ** (365 / 366) - 1, places=10)
+
+        from core.services import xirr
+
+        self.assertEqual(xirr._timeout(), 60)  # LocMem: no compartida entre procesos
+        with self.settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": ""}}):
+            self.assertEqual(xirr._timeout(), 24 * 60 * 60)
+
+        resp = Client().get(reverse("core:xirr_proyectos"), {"ids": f"{a.id},{b.id}"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(set(resp.json()["proyectos"]), {str(a.id), str(b.id)})
+
+
+class GraficosForkTests(SimpleTestCase):
+    def test_hijo_de_fork_no_se_queda_esperando_al_hilo_de_carga(self):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        from core.services import graficos
+
+        # Simula el hilo de carga aún en marcha en el padre en el momento del fork
+        soltar = threading.Event()
+        hilo = threading.Thread(target=soltar.wait, daemon=True)
+        hilo.start()
+        previo = (graficos._hilo, graficos._listo)
+        graficos._hilo, graficos._listo = hilo, threading.Event()
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork")) as pool:
+                self.assertTrue(pool.submit(graficos.graficos_listos, True).result(timeout=60))
+        finally:
+            soltar.set()
+            graficos._hilo, graficos._listo = previo
+
+
+class DecimalColumnaTests(SimpleTestCase):
+    def test_no_finitos_se_guardan_como_null(self):
+        from core.services.proyecto_kpis import a_decimal_columna
+
+        for valor in (float("nan"), float("inf"), float("-inf"), "NaN", "Infinity"):
+            self.assertIsNone(a_decimal_columna(valor, 12))
+        self.assertEqual(str(a_decimal_columna(1e20, 6)), "9999.99")
+        self.assertEqual(str(a_decimal_columna("12.346", 12)), "12.35")
+
+
+class KpisProyectoTests(TestCase):
+    SNAP = {"inversor": {"inversion_total": 100000, "roi_neto": 12.5, "beneficio_neto": 12500}}
+
+    def test_aplicar_kpis_proyecto(self):
+        from core.services.proyecto_kpis import aplicar_kpis_proyecto
+
+        proyecto = Proyecto.objects.create(nombre="P")
+        cambiados = aplicar_kpis_proyecto(proyecto, self.SNAP, 3)
+        self.assertEqual(sorted(cambiados), ["beneficio_neto", "capital_objetivo", "roi", "ultima_version_num"])
+        self.assertEqual(
+            (str(proyecto.capital_objetivo), str(proyecto.roi), str(proyecto.beneficio_neto), proyecto.ultima_version_num),
+            ("100000.00", "12.50", "12500.00", 3),
+        )
+        self.assertEqual(aplicar_kpis_proyecto(proyecto, self.SNAP, 3), [])  # sin cambios, nada que guardar
+
+        # Cadena de fallback: métricas del snapshot si no hay bloque inversor
+        aplicar_kpis_proyecto(proyecto, {"kpis": {"metricas": {"valor_adquisicion": 5, "roi": "7.5"}}})
+        self.assertEqual((str(proyecto.capital_objetivo), str(proyecto.roi), proyecto.beneficio_neto), ("5.00", "7.50", None))
+
+    def test_guardar_actualiza_columnas(self):
+        proyecto = Proyecto.objects.create(nombre="P")
+        url = reverse("core:guardar_proyecto", args=[proyecto.id])
+        r = Client().post(url, json.dumps({"payload": self.SNAP}), content_type="application/json").json()
+        proyecto.refresh_from_db()
+        self.assertEqual((str(proyecto.roi), str(proyecto.beneficio_neto)), ("12.50", "12500.00"))
+        self.assertEqual(proyecto.ultima_version_num, r["version"])
+
+    def test_recalcular_kpis_proyectos_rellena(self):
+        from django.core.management import call_command
+
+        from core.services.snapshot_delta import crear_snapshot_proyecto
+
+        con_version = Proyecto.objects.create(nombre="A")
+        crear_snapshot_proyecto(con_version, {"inversor": {"roi_neto": 1}})
+        crear_snapshot_proyecto(con_version, self.SNAP)
+        solo_datos = Proyecto.objects.create(nombre="B", snapshot_datos={"economico": {"roi_estimado": 4}})
+        # Columnas sin rellenar (proyectos anteriores a la desnormalización)
+        Proyecto.objects.update(roi=None, capital_objetivo=None, beneficio_neto=None, ultima_version_num=None)
+
+        salida = io.StringIO()
+        call_command("recalcular_kpis_proyectos", stdout=salida)
+        self.assertIn("actualizados: 2", salida.getvalue())
+        con_version.refresh_from_db()
+        solo_datos.refresh_from_db()
+        self.assertEqual((str(con_version.roi), con_version.ultima_version_num), ("12.50", 2))
+        self.assertEqual((str(solo_datos.roi), solo_datos.ultima_version_num), ("4.00", None))
+
+        call_command("recalcular_kpis_proyectos", stdout=salida)
+        self.assertIn("actualizados: 0", salida.getvalue())
+
+
+class UltimoSnapshotTests(TestCase):
+    def test_guardar_mueve_el_puntero(self):
+        proyecto = Proyecto.objects.create(nombre="P")
+        url = reverse("core:guardar_proyecto", args=[proyecto.id])
+        for nombre in ("A", "B"):
+            r = Client().post(url, json.dumps({"payload": {"proyecto": {"nombre": nombre}}}), content_type="application/json").json()
+            proyecto.refresh_from_db()
+            self.assertEqual(proyecto.ultimo_snapshot_id, r["snapshot_id"])
+            self.assertEqual(proyecto.ultima_version_num, r["version"])
+        self.assertEqual(proyecto.ultimo_snapshot_id, ProyectoSnapshot.objects.filter(proyecto=proyecto).latest("version_num").id)
+
+    def test_convertir_apunta_al_snapshot_de_conversion(self):
+        estudio = Estudio.objects.create(
+            nombre="E", guardado=True, datos={"valor_adquisicion": 100000, "roi_neto": 12.5, "beneficio_neto": 12500}
+        )
+        r = Client().post(reverse("core:convertir_a_proyecto", args=[estudio.id])).json()
+        proyecto = Proyecto.objects.get(pk=r["proyecto_id"])
+        snap = ProyectoSnapshot.objects.get(proyecto=proyecto)
+        self.assertEqual((proyecto.ultimo_snapshot_id, proyecto.ultima_version_num), (snap.id, snap.version_num))
+        self.assertEqual(snap.fuente, "conversion")
+        self.assertEqual((str(proyecto.capital_objetivo), str(proyecto.roi)), ("100000.00", "12.50"))
+
+        # El primer guardado encadena sobre la conversión
+        url = reverse("core:guardar_proyecto", args=[proyecto.id])
+        g = Client().post(url, json.dumps({"payload": {"proyecto": {"nombre": "X"}}}), content_type="application/json").json()
+        proyecto.refresh_from_db()
+        self.assertEqual((proyecto.ultimo_snapshot_id, g["version"]), (g["snapshot_id"], snap.version_num + 1))
+
+
+class PaginacionKeysetTests(TestCase):
+    def test_orden_por_campo_incluye_null_al_final(self):
+        from core.services.paginacion import paginar_keyset
+
+        rois = [None, 10, 5, None, 10, 20, None]
+        ids = [Proyecto.objects.create(nombre=f"P{i}", roi=r).id for i, r in enumerate(rois)]
+        esperado = sorted(zip(rois, ids), key=lambda x: (x[0] is None, -(x[0] or 0), -x[1]))
+
+        vistos, cursor = [], ""
+        while True:
+            filas, cursor = paginar_keyset(Proyecto.objects.values("id", "roi"), cursor=cursor, limite=2, campo="roi")
+            vistos += [f["id"] for f in filas]
+            if not cursor:
+                break
+        self.assertEqual(vistos, [i for _, i in esperado])
+
+        resp = Client().get(reverse("core:lista_proyectos_mas"), {"orden": "roi", "limite": 100})
+        self.assertEqual(len(resp.context["proyectos"]), len(rois))
+        self.assertEqual(resp["X-Next-Cursor"], "")
+
+    def test_cursor_manipulado_es_la_primera_pagina(self):
+        from core.services.paginacion import codificar_cursor
+
+        for i, roi in enumerate((5, 10, None)):
+            Proyecto.objects.create(nombre=f"P{i}", roi=roi)
+            Estudio.objects.create(nombre=f"E{i}", datos={}, roi=roi)
+        primera = Client().get(reverse("core:lista_proyectos_mas"), {"orden": "roi", "limite": 2})
+
+        for valores in (
+            ["abc", 1], ["1e999", 1], [1, "x"], [1, 10**30], [1, -1], [1, True], [[1], 1], [{"a": 1}, [2]],
+        ):
+            cursor = codificar_cursor(valores)
+            with self.subTest(valores=valores):
+                resp = Client().get(reverse("core:lista_proyectos_mas"), {"orden": "roi", "limite": 2, "cursor": cursor})
+                self.assertEqual(resp.status_code, 200)
+                self.assertEqual(resp["X-Next-Cursor"], primera["X-Next-Cursor"])
+                self.assertEqual(Client().get(reverse("core:lista_estudio_mas"), {"cursor": cursor}).status_code, 200)
+                self.assertEqual(Client().get(reverse("core:lista_proyectos_mas"), {"cursor": cursor}).status_code, 200)
+        self.assertEqual(Client().get(reverse("core:lista_proyectos_mas"), {"cursor": "%%%"}).status_code, 200)
+
+
+def _render_que_muere(clave, html):
+    # Simula un hijo que muere a medias (OOM, segfault en WeasyPrint...)
+    import os
+
+    os._exit(1)
+
+
+class ColaPDFTests(TestCase):
+    def setUp(self):
+        import tempfile
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        ajustes = self.settings(PDF_CACHE_DIR=self.tmp.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.estudio = Estudio.objects.create(nombre="E")
+
+    def test_reclamar_y_reintentos(self):
+        from core.models import TrabajoPDF
+        from core.services.pdf_trabajos import encolar_trabajo_pdf, fallar_trabajo, reclamar_trabajos
+
+        t1 = encolar_trabajo_pdf("estudio", self.estudio.id)
+        self.assertEqual(encolar_trabajo_pdf("estudio", self.estudio.id).id, t1.id)  # no duplica
+        t2 = TrabajoPDF.objects.create(tipo="proyecto", objeto_id=1)
+
+        self.assertEqual([t.id for t in reclamar_trabajos(1)], [t1.id])
+        self.assertEqual([t.id for t in reclamar_trabajos(5)], [t2.id])
+        self.assertEqual(reclamar_trabajos(5), [])
+
+        fallar_trabajo(t1.id, "fallo", max_intentos=2)
+        t1.refresh_from_db()
+        self.assertEqual((t1.estado, t1.intentos, t1.error), ("pendiente", 1, "fallo"))
+        reclamar_trabajos(1)
+        fallar_trabajo(t1.id, "otra vez", max_intentos=2)
+        t1.refresh_from_db()
+        self.assertEqual((t1.estado, t1.intentos), ("error", 2))
+
+        fallar_trabajo(t2.id, "sin WeasyPrint", reintentar=False)
+        self.assertEqual(TrabajoPDF.objects.get(id=t2.id).estado, "error")
+
+    def test_endpoints_encolar_estado_descargar(self):
+        from core.models import TrabajoPDF
+        from core.services.pdf_render import guardar_pdf
+        from core.services.pdf_trabajos import completar_trabajo
+
+        c = Client()
+        self.assertEqual(c.get(reverse("core:encolar_pdf", args=["estudio", self.estudio.id])).status_code, 405)
+        self.assertEqual(c.post(reverse("core:encolar_pdf", args=["otro", self.estudio.id])).status_code, 400)
+        self.assertEqual(c.post(reverse("core:encolar_pdf", args=["estudio", 999999])).status_code, 404)
+
+        resp = c.post(reverse("core:encolar_pdf", args=["estudio", self.estudio.id]))
+        self.assertEqual(resp.status_code, 202)
+        trabajo = resp.json()["trabajo"]
+        self.assertEqual(trabajo["estado"], "pendiente")
+
+        estado = c.get(trabajo["url_estado"]).json()["trabajo"]
+        self.assertNotIn("url_descarga", estado)
+        descarga = reverse("core:descargar_trabajo_pdf", args=[trabajo["id"]])
+        self.assertEqual(c.get(descarga).status_code, 409)
+        self.assertEqual(c.get(reverse("core:estado_trabajo_pdf", args=[999999])).status_code, 404)
+
+        completar_trabajo(trabajo["id"], "ab" * 32)
+        self.assertEqual(c.get(descarga).status_code, 410)  # aún no hay fichero en la caché
+
+        guardar_pdf("ab" * 32, b"%PDF-1.4 prueba")
+        estado = c.get(trabajo["url_estado"]).json()["trabajo"]
+        self.assertEqual(estado["url_descarga"], descarga)
+        resp = c.get(descarga)
+        self.assertEqual((resp.status_code, resp["Content-Type"]), (200, "application/pdf"))
+        self.assertEqual(b"".join(resp), b"%PDF-1.4 prueba")
+        self.assertEqual(c.get(descarga, HTTP_IF_NONE_MATCH=resp["ETag"]).status_code, 304)
+        self.assertEqual(TrabajoPDF.objects.get(id=trabajo["id"]).estado, "completado")
+
+    def test_worker_sobrevive_a_un_pool_roto(self):
+        from unittest import mock
+
+        from django.core.management import call_command
+
+        from core.models import TrabajoPDF
+        from core.services.pdf_trabajos import encolar_trabajo_pdf
+
+        trabajo = encolar_trabajo_pdf("estudio", self.estudio.id)
+        modulo = "core.management.commands.procesar_pdfs"
+        # close_old_connections cerraría la conexión de la transacción del test
+        with mock.patch(f"{modulo}.preparar_trabajo", return_value=("cd" * 32, "<html></html>")), mock.patch(
+            f"{modulo}.renderizar_a_cache", _render_que_muere
+        ), mock.patch(f"{modulo}.close_old_connections"):
+            call_command(
+                "procesar_pdfs", "--una-vez", "--workers=1", "--max-intentos=2", "--intervalo=0.1",
+                stdout=io.StringIO(), stderr=io.StringIO(),
+            )
+        trabajo.refresh_from_db()
+        # Cada caída cuenta como intento; con el pool recreado se reintenta hasta agotarlos
+        self.assertEqual((trabajo.estado, trabajo.intentos), ("error", 2))
+        self.assertIn("BrokenProcessPool", trabajo.error)
+
+
+class PDFEstudioPreviewTests(TestCase):
+    def setUp(self):
+        import tempfile
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # La plantilla del PDF usa {% static %}; en los tests no hay manifest de collectstatic
+        ajustes = self.settings(
+            PDF_CACHE_DIR=self.tmp.name,
+            STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage",
+        )
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.estudio = Estudio.objects.create(nombre="E")
+        self.url = reverse("core:pdf_estudio_preview", args=[self.estudio.id]) + "?formato=pdf"
+
+    def test_sirve_desde_la_cache_en_disco_y_304(self):
+        from core import views
+        from core.services.pdf_render import guardar_pdf
+
+        clave, _html = views._html_pdf_estudio(self.estudio)
+        guardar_pdf(clave, b"%PDF-1.4 cacheado")
+
+        c = Client()
+        resp = c.get(self.url)
+        self.assertEqual((resp.status_code, resp["Content-Type"]), (200, "application/pdf"))
+        self.assertEqual(b"".join(resp), b"%PDF-1.4 cacheado")
+        self.assertEqual(resp["ETag"], f'"{clave}"')
+        self.assertEqual(c.get(self.url, HTTP_IF_NONE_MATCH=resp["ETag"]).status_code, 304)
+
+    def test_clave_segun_los_graficos_del_contexto(self):
+        from unittest import mock
+
+        from core import views
+
+        # matplotlib listo pero sin gráficos (p. ej. fallan): la clave es la del PDF sin gráficos
+        with mock.patch("core.services.graficos.graficos_listos", return_value=True), mock.patch(
+            "core.services.graficos.graficos_pdf_estudio", return_value={}
+        ):
+            clave, _html = views._html_pdf_estudio(self.estudio)
+            with mock.patch("core.services.pdf_render.html_a_pdf_renderizador", return_value=b"%PDF-1.4 nuevo"):
+                resp = Client().get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["ETag"], f'"{clave}"')
+
+    def test_sin_weasyprint_503(self):
+        from unittest import mock
+
+        from core.services.pdf_render import PDFNoDisponible
+
+        with mock.patch("core.services.pdf_render.html_a_pdf_renderizador", side_effect=PDFNoDisponible("sin pango")):
+            resp = Client().get(self.url)
+        self.assertEqual(resp.status_code, 503)
+        self.assertFalse(resp.json()["ok"])
+
+
+class EstudioSnapshotHuellaTests(TestCase):
+    def test_reutiliza_el_snapshot_con_la_misma_huella(self):
+        from core import views
+        from core.models import EstudioSnapshot
+
+        estudio = Estudio.objects.create(nombre="E", datos={"valor_adquisicion": 100000})
+        datos_a, _m = views._snapshot_pdf_estudio(estudio)
+        datos_b, _m = views._snapshot_pdf_estudio(Estudio.objects.get(pk=estudio.pk))
+        self.assertEqual(EstudioSnapshot.objects.filter(estudio=estudio).count(), 1)
+        self.assertEqual(datos_b, datos_a)
+
+        # Cualquier cambio del estudio (datos, nombre...) cambia la huella: snapshot nuevo
+        estudio.datos = {"valor_adquisicion": 120000}
+        estudio.save()
+        views._snapshot_pdf_estudio(estudio)
+        self.assertEqual(EstudioSnapshot.objects.filter(estudio=estudio).count(), 2)
+        self.assertEqual(len(set(EstudioSnapshot.objects.filter(estudio=estudio).values_list("huella", flat=True))), 2)
+
+
+def _render_lento(clave, html):
+    # Render falso en el hijo: el "PDF" guarda cuándo empezó y acabó
+    from core.services.pdf_render import guardar_pdf
+
+    inicio = time.time()
+    time.sleep(0.5)
+    guardar_pdf(clave, f"{inicio} {time.time()}".encode())
+    return clave
+
+
+class ZipPDFTests(SimpleTestCase):
+    def tearDown(self):
+        from core.services import pdf_render
+
+        if pdf_render._exportador.pool is not None:
+            pdf_render._exportador.pool.shutdown(cancel_futures=True)
+            pdf_render._exportador.pool = None
+
+    def test_renders_en_paralelo(self):
+        import tempfile
+        import zipfile
+        from unittest import mock
+
+        from core.services.pdf_zip import zip_pdfs_en_paralelo
+
+        entradas = [(f"{i}.pdf", f"{i:02d}" * 32, "<html></html>") for i in range(3)]
+        with tempfile.TemporaryDirectory() as tmp, self.settings(PDF_CACHE_DIR=tmp, PDF_EXPORTACION_PROCESOS=3), mock.patch(
+            "core.services.pdf_zip.renderizar_a_cache", _render_lento
+        ):
+            zf = zipfile.ZipFile(io.BytesIO(b"".join(zip_pdfs_en_paralelo(iter(entradas)))))
+            tramos = [tuple(map(float, zf.read(n).split())) for n in zf.namelist()]
+        self.assertEqual(len(tramos), 3)
+        # Todos los renders se solapan: el último en empezar arranca antes de que acabe el primero
+        self.assertLess(max(i for i, _ in tramos), min(f for _, f in tramos))
+
+    def test_zip_desde_cache_con_errores(self):
+        import tempfile
+        import zipfile
+
+        from core.services.pdf_render import guardar_pdf
+        from core.services.pdf_zip import zip_pdfs_en_paralelo
+
+        with tempfile.TemporaryDirectory() as tmp, self.settings(PDF_CACHE_DIR=tmp):
+            guardar_pdf("ef" * 32, b"%PDF-1.4 a")
+            entradas = [("a.pdf", "ef" * 32, "<html></html>"), ("a.pdf", "ef" * 32, ""), ("b.pdf", None, "sin datos")]
+            zf = zipfile.ZipFile(io.BytesIO(b"".join(zip_pdfs_en_paralelo(iter(entradas)))))
+            self.assertEqual(zf.namelist(), ["a.pdf", "a_2.pdf", "ERRORES.txt"])
+            self.assertEqual(zf.read("a_2.pdf"), b"%PDF-1.4 a")
+            self.assertEqual(zf.read("ERRORES.txt"), b"b.pdf: sin datos\n")
+
+
+def _doc_version(i):
+    """Documento de proyecto de la versión `i`: fijo salvo un KPI y una clave que va y viene."""
+    doc = {"proyecto": {"nombre": "P", "descripcion": "x" * 500}, "kpis": {"n": i, "anidado": {"v": i * 10}}}
+    if i % 2 == 0:
+        doc["temporal"] = {"par": i}
+    return doc
+
+
+class SnapshotDeltaTests(TestCase):
+    def test_calcular_y_aplicar_delta(self):
+        from core.services.snapshot_delta import aplicar_delta, calcular_delta
+
+        antes = {"a": 1, "b": {"c": 2, "d": 3}, "l": [1, 2], "t": 1}
+        despues = {"a": 1, "b": {"c": 20}, "l": [1], "t": 1.0, "n": {"x": None}}
+        ops = calcular_delta(antes, despues)
+        self.assertEqual(aplicar_delta(antes, ops), despues)
+        self.assertEqual(antes["b"], {"c": 2, "d": 3})  # no modifica el original
+        self.assertIn(["d", ["b", "d"]], ops)
+        self.assertIn(["s", ["t"], 1.0], ops)  # mismo valor, otro tipo
+        self.assertEqual(calcular_delta(despues, despues), [])
+
+    def test_keyframes_y_reconstruccion(self):
+        from core.services.snapshot_delta import crear_snapshot_proyecto, reconstruir_version
+
+        proyecto = Proyecto.objects.create(nombre="P")
+        with self.settings(PROYECTO_SNAPSHOT_KEYFRAME_INTERVAL=3):
+            snaps = [crear_snapshot_proyecto(proyecto, _doc_version(i)) for i in range(1, 8)]
+
+        # Keyframe cada 3 versiones; entre medias, diff contra la anterior
+        self.assertEqual([s.version_num for s in snaps if s.delta is None], [1, 4, 7])
+        self.assertEqual([s.keyframe_num for s in snaps], [1, 1, 1, 4, 4, 4, 7])
+        for i, s in enumerate(snaps, start=1):
+            with self.subTest(version=i):
+                self.assertEqual(reconstruir_version(proyecto.id, s.version_num), _doc_version(i))
+        self.assertIsNone(reconstruir_version(proyecto.id, 99))
+
+        # Conversión / cierre siempre completos, aunque toque delta
+        cierre = crear_snapshot_proyecto(proyecto, _doc_version(8), fuente="cierre")
+        self.assertIsNone(cierre.delta)
+        self.assertEqual(reconstruir_version(proyecto.id, cierre.version_num), _doc_version(8))
+
+
+class CompactarSnapshotsTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from core.services.snapshot_delta import crear_snapshot_proyecto
+
+        self.proyecto = Proyecto.objects.create(nombre="P")
+        with self.settings(PROYECTO_SNAPSHOT_KEYFRAME_INTERVAL=3):
+            for i in range(1, 11):
+                crear_snapshot_proyecto(self.proyecto, _doc_version(i), fuente="conversion" if i == 5 else "guardado")
+        # 1-8 del mismo día de hace 40 días (a horas distintas); 9 y 10 recientes
+        ahora = timezone.now()
+        dia = (ahora - timedelta(days=40)).replace(hour=1, minute=0, second=0, microsecond=0)
+        for i in range(1, 9):
+            ProyectoSnapshot.objects.filter(proyecto=self.proyecto, version_num=i).update(creado_en=dia + timedelta(hours=i))
+
+    def _estado(self):
+        return list(
+            ProyectoSnapshot.objects.filter(proyecto=self.proyecto)
+            .order_by("version_num")
+            .values_list("version_num", "keyframe_num", "delta", "datos")
+        )
+
+    def _compactar(self, *args):
+        from django.core.management import call_command
+
+        salida = io.StringIO()
+        with self.settings(PROYECTO_SNAPSHOT_KEYFRAME_INTERVAL=3):
+            call_command("compactar_snapshots", "--solo=proyectos", *args, stdout=salida)
+        return salida.getvalue()
+
+    def test_dry_run_no_toca_nada(self):
+        antes = self._estado()
+        salida = self._compactar("--dry-run")
+        self.assertIn("eliminados 6", salida)
+        self.assertEqual(self._estado(), antes)
+
+    def test_retencion_y_cadena_reencadenada(self):
+        from core.services.snapshot_delta import reconstruir_version
+
+        self.assertIn("eliminados 6", self._compactar())
+        # Del día antiguo quedan la última versión y la de conversión (protegida); lo reciente, entero
+        restantes = [v for v, *_ in self._estado()]
+        self.assertEqual(restantes, [5, 8, 9, 10])
+        for v in restantes:
+            with self.subTest(version=v):
+                self.assertEqual(reconstruir_version(self.proyecto.id, v), _doc_version(v))
+        # La conversión sigue completa; 8 y 9 pasan a ser diffs sobre ella y 10 abre cadena (intervalo 3)
+        self.assertEqual([(v, k, delta is None) for v, k, delta, _datos in self._estado()], [
+            (5, 5, True), (8, 5, False), (9, 5, False), (10, 10, True),
+        ])
+
+        self.assertIn("eliminados 0", self._compactar())  # idempotente
+
+    def test_bytes_liberados_medidos_en_bd(self):
+        from django.utils import timezone
+
+        from core.services.retencion_snapshots import _tams_en_bd, compactar_proyecto
+
+        def _ocupado():
+            tams = ProyectoSnapshot.objects.filter(proyecto=self.proyecto).annotate(**_tams_en_bd())
+            return sum((t.tam_datos or 0) + (t.tam_delta or 0) for t in tams)
+
+        antes = _ocupado()
+        with self.settings(PROYECTO_SNAPSHOT_KEYFRAME_INTERVAL=3):
+            res = compactar_proyecto(self.proyecto.id, timezone.now())
+        # Misma unidad que los estudios (columna comprimida), no JSON sin comprimir
+        self.assertEqual(res["bytes"], antes - _ocupado())
+
+
+class RenderizadorCompartidoTests(SimpleTestCase):
+    def tearDown(self):
+        from core.services import pdf_render
+
+        if pdf_render._renderizador.pool is not None:
+            pdf_render._renderizador.pool.shutdown(cancel_futures=True)
+            pdf_render._renderizador.pool = None
+
+    def test_pool_roto_se_cierra_y_se_recrea(self):
+        from concurrent.futures.process import BrokenProcessPool
+
+        from core.services import pdf_render
+
+        roto = pdf_render._renderizador.obtener()
+        with self.assertRaises(BrokenProcessPool):
+            roto.submit(_render_que_muere, "x", "y").result()
+
+        self.assertEqual(pdf_render.enviar_al_renderizador(abs, -3).result(), 3)
+        self.assertIsNot(pdf_render._renderizador.pool, roto)
+        self.assertTrue(roto._shutdown_thread)  # el pool descartado no deja procesos colgados
+
+
+class AutosaveCoalescenciaTests(TestCase):
+    def setUp(self):
+        self.proyecto = Proyecto.objects.create(nombre="P")
+        self.url = reverse("core:guardar_proyecto", args=[self.proyecto.id])
+        self.url_patch = reverse("core:guardar_proyecto_patch", args=[self.proyecto.id])
+        self.client = Client()
+
+    def _autosave(self, nombre, **extra):
+        body = {"payload": {"proyecto": {"nombre": nombre}}, "autosave": True, **extra}
+        return self.client.post(self.url, json.dumps(body), content_type="application/json").json()
+
+    def test_coalesce_dentro_de_la_ventana_y_sella(self):
+        with self.settings(PROYECTO_AUTOSAVE_VENTANA=120):
+            a = self._autosave("A")
+            b = self._autosave("B")
+            self.assertTrue(a["abierta"])
+            self.assertEqual((b["version"], b["abierta"]), (a["version"], True))
+            self.assertEqual(ProyectoSnapshot.objects.filter(proyecto=self.proyecto).count(), 1)
+
+            # Salida de la página sin cambios: patch vacío con `sellar` (lo que envía proyecto.js)
+            sello = self.client.post(
+                self.url_patch,
+                json.dumps({"base_version": b["version"], "base_hash": b["hash"], "patch": [], "autosave": True, "sellar": True}),
+                content_type="application/json",
+            ).json()
+            self.assertEqual((sello["version"], sello["sin_cambios"], sello["abierta"]), (b["version"], True, False))
+            self.assertFalse(ProyectoSnapshot.objects.get(proyecto=self.proyecto).abierta)
+
+            c = self._autosave("C")
+            self.assertEqual(c["version"], b["version"] + 1)
+            self.assertEqual(datos_snapshot(ProyectoSnapshot.objects.get(pk=b["snapshot_id"]))["proyecto"]["nombre"], "B")
+
+    def test_fuera_de_la_ventana_crea_version(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        with self.settings(PROYECTO_AUTOSAVE_VENTANA=120):
+            a = self._autosave("A")
+            ProyectoSnapshot.objects.filter(pk=a["snapshot_id"]).update(creado_en=timezone.now() - timedelta(minutes=5))
+            b = self._autosave("B")
+            self.assertEqual(b["version"], a["version"] + 1)
+            # Salida con cambios (`sellar`): reescribe la versión abierta y la cierra
+            s = self._autosave("C", sellar=True)
+            self.assertEqual((s["version"], s["abierta"]), (b["version"], False))
+
+        with self.settings(PROYECTO_AUTOSAVE_VENTANA=0):
+            d = self._autosave("D")
+            e = self._autosave("E")
+            self.assertEqual((d["abierta"], e["version"]), (False, d["version"] + 1))
+
+
+class SinCambiosGuardadoTests(TestCase):
+    def setUp(self):
+        self.proyecto = Proyecto.objects.create(nombre="P")
+        self.url = reverse("core:guardar_proyecto", args=[self.proyecto.id])
+        self.client = Client()
+
+    def _guardar(self, nombre):
+        body = {"payload": {"proyecto": {"nombre": nombre}, "kpis": {"metricas": {"roi": 5}}}}
+        return self.client.post(self.url, json.dumps(body), content_type="application/json").json()
+
+    def test_documento_identico_no_crea_version(self):
+        a = self._guardar("A")
+        self.assertFalse(a["sin_cambios"])
+        self.assertEqual(a["hash"], ProyectoSnapshot.objects.get(pk=a["snapshot_id"]).hash_contenido)
+        self.proyecto.refresh_from_db()
+        extra = self.proyecto.extra
+
+        r = self._guardar("A")
+        self.assertTrue(r["sin_cambios"])
+        self.assertEqual((r["version"], r["snapshot_id"], r["hash"]), (a["version"], a["snapshot_id"], a["hash"]))
+        self.assertEqual(ProyectoSnapshot.objects.filter(proyecto=self.proyecto).count(), 1)
+        self.proyecto.refresh_from_db()
+        self.assertEqual(self.proyecto.extra, extra)  # ni siquiera reescribe el overlay
+
+        b = self._guardar("B")
+        self.assertFalse(b["sin_cambios"])
+        self.assertEqual(b["version"], a["version"] + 1)
+        self.assertNotEqual(b["hash"], a["hash"])
+
+
+class GetCondicionalTests(TestCase):
+    def setUp(self):
+        # Las plantillas completas usan {% static %}; en los tests no hay manifest de collectstatic
+        ajustes = self.settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.client = Client()
+
+    def _revalidar(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_proyecto(self):
+        proyecto = Proyecto.objects.create(nombre="P")
+        url = reverse("core:proyecto", args=[proyecto.id])
+        guardar = reverse("core:guardar_proyecto", args=[proyecto.id])
+        body = json.dumps({"payload": {"proyecto": {"nombre": "A"}}})
+        self.client.post(guardar, body, content_type="application/json")
+
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        etag = resp["ETag"]
+        self.assertEqual(self._revalidar(url, etag).status_code, 304)
+
+        # Guardado sin versión nueva (documento idéntico) que sí cambia una columna del proyecto
+        Proyecto.objects.filter(pk=proyecto.pk).update(nombre="Otro")
+        self.assertTrue(self.client.post(guardar, body, content_type="application/json").json()["sin_cambios"])
+        resp = self._revalidar(url, etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+    def test_simulador(self):
+        estudio = Estudio.objects.create(nombre="E", datos={})
+        url = reverse("core:simulador")
+        resp = self.client.get(url, {"estudio_id": estudio.id})
+        self.assertEqual(resp.status_code, 200)
+        etag = resp["ETag"]
+        self.assertEqual(self._revalidar(url, etag).status_code, 304)
+
+        estudio.nombre = "Cambiado"
+        estudio.save()
+        resp = self._revalidar(url, etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+    def test_pdf_debug(self):
+        estudio = Estudio.objects.create(nombre="E", datos={})
+        url = reverse("core:pdf_estudio_preview", args=[estudio.id]) + "?debug=1"
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        etag = resp["ETag"]
+        self.assertEqual(self._revalidar(url, etag).status_code, 304)
+
+        estudio.datos = {"valor_adquisicion": 1}
+        estudio.save()
+        resp = self._revalidar(url, etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+
+class CacheSnapshotProyectoTests(TestCase):
+    def setUp(self):
+        ajustes = self.settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = Client()
+        self.proyecto = Proyecto.objects.create(nombre="P")
+        self.url = reverse("core:proyecto", args=[self.proyecto.id])
+        self.url_guardar = reverse("core:guardar_proyecto", args=[self.proyecto.id])
+        self.url_patch = reverse("core:guardar_proyecto_patch", args=[self.proyecto.id])
+        self.base = self._guardar("A")
+
+    def _guardar(self, nombre):
+        body = json.dumps({"payload": {"proyecto": {"nombre": nombre}}})
+        return self.client.post(self.url_guardar, body, content_type="application/json").json()
+
+    def _consultas_snapshot(self):
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        tabla = ProyectoSnapshot._meta.db_table
+        return [q["sql"] for q in consultas.captured_queries if tabla in q["sql"]]
+
+    def _en_cache(self):
+        from core.services.proyecto_cache import _clave
+
+        return cache.get(_clave(self.proyecto.id)) is not None
+
+    def test_segundo_get_no_lee_snapshots(self):
+        self.assertTrue(self._consultas_snapshot())
+        self.assertTrue(self._en_cache())
+        self.assertEqual(self._consultas_snapshot(), [])
+
+    def test_guardar_y_patch_invalidan(self):
+        self._consultas_snapshot()
+        self._guardar("B")
+        self.assertFalse(self._en_cache())
+
+        ultimo = self._guardar("C")
+        self._consultas_snapshot()
+        self.assertTrue(self._en_cache())
+        body = {
+            "base_version": ultimo["version"],
+            "base_hash": ultimo["hash"],
+            "patch": [{"op": "replace", "path": "/proyecto/nombre", "value": "D"}],
+        }
+        resp = self.client.post(self.url_patch, json.dumps(body), content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(self._en_cache())
+        self.assertIn('"D"', self.client.get(self.url).content.decode())
+
+
+class JsonPatchTests(SimpleTestCase):
+    def test_operaciones(self):
+        from core.services.json_patch import aplicar_json_patch
+
+        doc = {"a": 1, "b": {"c": 2, "x/y": 3}, "l": [1, 2]}
+        res = aplicar_json_patch(
+            doc,
+            [
+                {"op": "replace", "path": "/a", "value": 10},
+                {"op": "add", "path": "/b/d", "value": {"e": 4}},
+                {"op": "remove", "path": "/b/c"},
+                {"op": "replace", "path": "/b/x~1y", "value": 5},
+                {"op": "add", "path": "/nuevo/hijo", "value": 6},  # el padre inexistente se crea
+                {"op": "replace", "path": "/l", "value": [3]},
+            ],
+        )
+        self.assertEqual(res, {"a": 10, "b": {"d": {"e": 4}, "x/y": 5}, "l": [3], "nuevo": {"hijo": 6}})
+        self.assertEqual(doc["b"], {"c": 2, "x/y": 3})  # no modifica el original
+        self.assertEqual(aplicar_json_patch(doc, [{"op": "replace", "path": "", "value": {"z": 1}}]), {"z": 1})
+
+    def test_operaciones_no_validas(self):
+        from core.services.json_patch import JSONPatchError, aplicar_json_patch
+
+        for ops in (
+            {"op": "add"},
+            ["no es un dict"],
+            [{"op": "move", "path": "/a", "from": "/b"}],
+            [{"op": "remove", "path": "/no_existe"}],
+            [{"op": "remove", "path": "/b/no/existe"}],
+            [{"op": "add", "path": "a", "value": 1}],
+            [{"op": "replace", "path": "/a"}],
+            [{"op": "remove", "path": ""}],
+        ):
+            with self.subTest(ops=ops), self.assertRaises(JSONPatchError):
+                aplicar_json_patch({"a": 1, "b": {}}, ops)
+
+
+class GuardarProyectoPatchTests(TestCase):
+    def setUp(self):
+        self.proyecto = Proyecto.objects.create(nombre="P")
+        self.client = Client()
+        self.url_patch = reverse("core:guardar_proyecto_patch", args=[self.proyecto.id])
+        base = {"payload": {"proyecto": {"nombre": "Base"}, "kpis": {"metricas": {"roi": 10, "viejo": 1}}}}
+        self.base = self.client.post(
+            reverse("core:guardar_proyecto", args=[self.proyecto.id]), json.dumps(base), content_type="application/json"
+        ).json()
+
+    def _patch(self, ops, **extra):
+        body = {"base_version": self.base["version"], "base_hash": self.base["hash"], "patch": ops, **extra}
+        return self.client.post(self.url_patch, json.dumps(body), content_type="application/json")
+
+    def test_aplica_add_replace_remove(self):
+        resp = self._patch(
+            [
+                {"op": "replace", "path": "/kpis/metricas/roi", "value": 12.5},
+                {"op": "add", "path": "/inmueble/direccion", "value": "Calle Mayor 1"},
+                {"op": "remove", "path": "/kpis/metricas/viejo"},
+            ]
+        )
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data["version"], self.base["version"] + 1)
+        self.proyecto.refresh_from_db()
+        overlay = self.proyecto.extra["ultimo_guardado"]["payload"]
+        self.assertEqual(overlay["kpis"]["metricas"], {"roi": 12.5})
+        self.assertEqual(overlay["inmueble"]["direccion"], "Calle Mayor 1")
+        self.assertEqual(str(self.proyecto.roi), "12.50")
+        snap = ProyectoSnapshot.objects.get(pk=data["snapshot_id"])
+        self.assertEqual(datos_snapshot(snap)["kpis"]["metricas"], {"roi": 12.5})
+
+    def test_409_si_la_base_no_coincide(self):
+        ops = [{"op": "replace", "path": "/kpis/metricas/roi", "value": 1}]
+        for extra in ({"base_version": self.base["version"] + 1}, {"base_hash": "otro"}, {"base_version": None}):
+            with self.subTest(extra=extra):
+                resp = self._patch(ops, **extra)
+                self.assertEqual(resp.status_code, 409)
+                self.assertEqual(resp.json()["version"], self.base["version"])
+        self.assertEqual(ProyectoSnapshot.objects.filter(proyecto=self.proyecto).count(), 1)
+
+    def test_409_si_el_patch_no_aplica(self):
+        for ops in ([{"op": "remove", "path": "/no_existe"}], [{"op": "copy", "path": "/a"}], "no es lista"):
+            with self.subTest(ops=ops):
+                resp = self._patch(ops)
+                self.assertEqual(resp.status_code, 409)
+                self.assertTrue(resp.json()["conflicto"])
+        self.assertEqual(ProyectoSnapshot.objects.filter(proyecto=self.proyecto).count(), 1)
+
+    def test_metodo_y_proyecto(self):
+        self.assertEqual(self.client.get(self.url_patch).status_code, 405)
+        url = reverse("core:guardar_proyecto_patch", args=[999999])
+        self.assertEqual(self.client.post(url, "{}", content_type="application/json").status_code, 404)
+
+
+class IdempotenciaGuardadoTests(TestCase):
+    def setUp(self):
+        self.proyecto = Proyecto.objects.create(nombre="P")
+        self.client = Client()
+        self.url = reverse("core:guardar_proyecto", args=[self.proyecto.id])
+
+    def _guardar(self, nombre, clave, url=None, body=None):
+        body = body if body is not None else {"payload": {"proyecto": {"nombre": nombre}}}
+        return self.client.post(
+            url or self.url, json.dumps(body), content_type="application/json", HTTP_IDEMPOTENCY_KEY=clave
+        ).json()
+
+    def test_clave_repetida_no_crea_version(self):
+        a = self._guardar("A", "k-1")
+        self.assertFalse(a["sin_cambios"])
+        # Reintento de red del mismo envío (aunque el cuerpo llegue distinto, manda la clave)
+        r = self._guardar("Otro", "k-1")
+        self.assertEqual((r["version"], r["snapshot_id"], r["repetido"]), (a["version"], a["snapshot_id"], True))
+        self.assertEqual(ProyectoSnapshot.objects.filter(proyecto=self.proyecto).count(), 1)
+        self.proyecto.refresh_from_db()
+        self.assertEqual(self.proyecto.nombre, "A")
+
+        b = self._guardar("B", "k-2")
+        self.assertEqual(b["version"], a["version"] + 1)
+        self.assertNotIn("repetido", b)
+        self.assertEqual(ProyectoSnapshot.objects.filter(proyecto=self.proyecto).count(), 2)
+
+    def test_patch_repetido_antes_que_el_conflicto_de_version(self):
+        a = self._guardar("A", "k-1")
+        url_patch = reverse("core:guardar_proyecto_patch", args=[self.proyecto.id])
+        body = {
+            "base_version": a["version"],
+            "base_hash": a["hash"],
+            "patch": [{"op": "replace", "path": "/proyecto/nombre", "value": "B"}],
+        }
+        b = self._guardar(None, "k-2", url=url_patch, body=body)
+        self.assertEqual(b["version"], a["version"] + 1)
+        # El mismo patch otra vez: su base ya no es la última versión, pero es un reintento
+        resp = self.client.post(url_patch, json.dumps(body), content_type="application/json", HTTP_IDEMPOTENCY_KEY="k-2")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp.json()["version"], resp.json()["repetido"]), (b["version"], True))
+        self.assertEqual(ProyectoSnapshot.objects.filter(proyecto=self.proyecto).count(), 2)
+        # Sin clave, el mismo patch sí choca con la versión nueva
+        resp = self.client.post(url_patch, json.dumps(body), content_type="application/json")
+        self.assertEqual(resp.status_code, 409)
+
+
+class JSONComprimidoFieldTests(TestCase):
+    def test_codificacion(self):
+        from core.fields import MARCA_PLANO, MARCA_ZLIB, codificar_json, decodificar_json
+
+        pequeno = {"a": 1, "ñ": "€"}
+        grande = {"filas": [{"id": i, "texto": "x" * 50} for i in range(2000)]}
+        bin_pequeno = codificar_json(pequeno)
+        bin_grande = codificar_json(grande)
+        self.assertTrue(bin_pequeno.startswith(MARCA_PLANO))
+        self.assertTrue(bin_grande.startswith(MARCA_ZLIB))
+        self.assertLess(len(bin_grande), len(json.dumps(grande)) // 10)
+        self.assertEqual(decodificar_json(bin_pequeno), pequeno)
+        self.assertEqual(decodificar_json(memoryview(bin_grande)), grande)
+        self.assertIsNone(decodificar_json(None))
+        # Datos anteriores a la migración: JSON sin marca, como texto o como bytes
+        self.assertEqual(decodificar_json('{"b": 2}'), {"b": 2})
+        self.assertEqual(decodificar_json(b'{"b": 2}'), {"b": 2})
+
+    def test_ida_y_vuelta_en_bd(self):
+        grande = {"reales": {"gastos": [{"concepto": f"Gasto {i}", "importe": i * 1.5} for i in range(5000)]}}
+        for valor in (None, {}, {"a": [1, 2, {"b": None}]}, grande):
+            with self.subTest(tam=len(json.dumps(valor))):
+                p = Proyecto.objects.create(nombre="P", snapshot_datos=valor)
+                self.assertEqual(Proyecto.objects.get(pk=p.pk).snapshot_datos, valor)
+
+        p = Proyecto.objects.create(nombre="P", snapshot_datos=grande)
+        with connection.cursor() as c:
+            c.execute("SELECT snapshot_datos FROM core_proyecto WHERE id = %s", [p.pk])
+            crudo = bytes(c.fetchone()[0])
+        self.assertTrue(crudo.startswith(b"Z1"))
+        self.assertLess(len(crudo), len(json.dumps(grande)) // 5)
@@ -13,20 +13,33 @@ urlpatterns = [
 
     # PDF estudio
     path("estudios/pdf/<int:estudio_id>/", views.pdf_estudio_preview, name="pdf_estudio_preview"),
+    path("estudios/pdf/exportar/", views.exportar_pdfs_estudios, name="exportar_pdfs_estudios"),
+    # PDF en segundo plano (cola en BD + `manage.py procesar_pdfs`)
+    path("pdf/<str:tipo>/<int:objeto_id>/encolar/", views.encolar_pdf, name="encolar_pdf"),
+    path("pdf/trabajos/<int:trabajo_id>/", views.estado_trabajo_pdf, name="estado_trabajo_pdf"),
+    path("pdf/trabajos/<int:trabajo_id>/descargar/", views.descargar_trabajo_pdf, name="descargar_trabajo_pdf"),
 
     # Estudios
     path("estudios/nuevo/", views.nuevo_estudio, name="nuevo_estudio"),
     path("estudios/", views.lista_estudio, name="lista_estudio"),
+    path("estudios/mas/", views.lista_estudio_mas, name="lista_estudio_mas"),
     path("estudios/borrar/<int:estudio_id>/", views.borrar_estudio, name="borrar_estudio"),
+    # Sensibilidad para el comité (compra × venta × meses); sin id, con los valores del simulador
+    path("estudios/sensibilidad/", views.sensibilidad_estudio, name="sensibilidad_simulador"),
+    path("estudios/<int:estudio_id>/sensibilidad/", views.sensibilidad_estudio, name="sensibilidad_estudio"),
+    path("estudios/<int:estudio_id>/montecarlo/", views.montecarlo_estudio, name="montecarlo_estudio"),
 
     # Conversión a proyecto
     path("convertir-a-proyecto/<int:estudio_id>/", views.convertir_a_proyecto, name="convertir_a_proyecto"),
 
     # Proyectos
     path("proyectos/", views.lista_proyectos, name="lista_proyectos"),
+    path("proyectos/mas/", views.lista_proyectos_mas, name="lista_proyectos_mas"),
+    path("proyectos/xirr/", views.xirr_proyectos_view, name="xirr_proyectos"),
     # Detalle de proyecto (si existe en views)
     path("proyectos/<int:proyecto_id>/", views.proyecto, name="proyecto"),
 
     # Autosave / guardado de proyecto (POST)
     path("proyectos/<int:proyecto_id>/guardar/", views.guardar_proyecto, name="guardar_proyecto"),
+    path("proyectos/<int:proyecto_id>/guardar/patch/", views.guardar_proyecto_patch, name="guardar_proyecto_patch"),
 ]
\ No newline at end of file
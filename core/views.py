@@ -1,22 +1,45 @@
 from __future__ import annotations
 
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, Http404, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.urls import reverse
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models import F
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.conf import settings
 
 from copy import deepcopy
+from pathlib import Path
 
+import hashlib
 import json
+import secrets
 from decimal import Decimal
 from datetime import date, datetime
 
 
 from .models import Estudio, Proyecto
 from .models import EstudioSnapshot, ProyectoSnapshot
+from .services.proyecto_cache import (
+    guardar_snapshot_proyecto,
+    invalidar_snapshot_proyecto,
+    obtener_snapshot_proyecto,
+)
+from .services.paginacion import limite_desde_request, paginar_keyset
+from .services.json_patch import JSONPatchError, aplicar_json_patch
+from .services.snapshot_delta import (
+    actualizar_snapshot_abierto,
+    crear_snapshot_proyecto,
+    datos_snapshot,
+    hash_contenido,
+    snapshot_abierto,
+    ventana_autosave,
+)
+from .services.proyecto_kpis import a_decimal_columna, aplicar_kpis_proyecto
 
 # --- SafeAccessDict helper and _safe_template_obj ---
 class SafeAccessDict(dict):
@@ -27,6 +50,9 @@ class SafeAccessDict(dict):
 
     def __getattr__(self, item):
         # permite `proyecto.campo` en plantillas
+        if item.startswith("__"):
+            # protocolos internos (pickle/copy, p. ej. __setstate__): no existen
+            raise AttributeError(item)
         return dict.get(self, item, "")
 
     def get(self, key, default=""):
@@ -339,6 +365,61 @@ def _datos_inmueble_desde_estudio(estudio: Estudio) -> dict:
     }
 
 
+# --- GET condicional (ETag / Last-Modified) ---
+# Token de despliegue: cambia con cada `collectstatic` (manifest de WhiteNoise), para que
+# tras un despliegue no se sirva un 304 con HTML que apunte a estáticos antiguos.
+def _token_despliegue() -> str:
+    try:
+        manifest = Path(settings.STATIC_ROOT) / "staticfiles.json"
+        return str(int(manifest.stat().st_mtime))
+    except (OSError, TypeError, ValueError):
+        return "dev"
+
+
+_TOKEN_DESPLIEGUE = _token_despliegue()
+
+
+def _validador(*partes) -> str:
+    """ETag débil a partir de valores baratos de obtener (timestamps, ids)."""
+    raw = ":".join(str(p) for p in (_TOKEN_DESPLIEGUE,) + partes)
+    return 'W/"%s"' % hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+def _timestamp(*valores):
+    """Mayor timestamp (segundos) entre datetimes o cadenas ISO; None si no hay ninguno."""
+    ts = None
+    for v in valores:
+        if isinstance(v, str) and v:
+            try:
+                v = datetime.fromisoformat(v)
+            except ValueError:
+                continue
+        if isinstance(v, datetime):
+            t = int(v.timestamp())
+            ts = t if ts is None else max(ts, t)
+    return ts
+
+
+def _respuesta_condicional(request, etag, last_modified):
+    """304/412 si el cliente ya tiene la versión actual; None si hay que renderizar."""
+    if request.method not in ("GET", "HEAD"):
+        return None
+    resp = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if resp is not None:
+        _con_validadores(resp, etag, last_modified)
+    return resp
+
+
+def _con_validadores(response, etag, last_modified):
+    if etag and not response.has_header("ETag"):
+        response["ETag"] = etag
+    if last_modified is not None and not response.has_header("Last-Modified"):
+        response["Last-Modified"] = http_date(last_modified)
+    # Revalidar siempre: el navegador guarda la página pero pregunta antes de reutilizarla
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 def home(request):
     return render(request, "core/home.html")
 
@@ -404,6 +485,19 @@ def simulador(request):
     # 2) Resolver estudio desde sesión
     estudio_obj = None
     estudio_id = request.session.get("estudio_id")
+
+    # GET condicional: si el estudio no ha cambiado desde la última carga, 304 sin leer `datos`
+    etag = None
+    last_modified = None
+    if estudio_id:
+        val = Estudio.objects.filter(id=estudio_id).values("actualizado", "guardado", "bloqueado").first()
+        if val is not None:
+            etag = _validador("simulador", estudio_id, val["actualizado"], val["guardado"], val["bloqueado"])
+            last_modified = _timestamp(val["actualizado"])
+            resp = _respuesta_condicional(request, etag, last_modified)
+            if resp is not None:
+                return resp
+
     if estudio_id:
         try:
             estudio_obj = Estudio.objects.get(id=estudio_id)
@@ -451,10 +545,14 @@ def simulador(request):
         "ESTADO_INICIAL_JSON": json.dumps(estado_inicial, ensure_ascii=False),
     }
 
-    return render(request, "core/simulador.html", ctx)
+    resp = render(request, "core/simulador.html", ctx)
+    if etag:
+        _con_validadores(resp, etag, last_modified)
+    return resp
 
 
-def lista_estudio(request):
+def _pagina_estudios(request):
+    """Página (keyset) de estudios guardados, ordenada por (-roi, -id)."""
     # Por defecto, ocultamos estudios ya convertidos a proyecto (bloqueados), para no saturar el listado.
     # Si se desea ver también los convertidos, usar ?mostrar_convertidos=1
     estudios_qs = Estudio.objects.filter(guardado=True)
@@ -468,130 +566,121 @@ def lista_estudio(request):
         # Si el modelo no tiene el campo (o hay inconsistencias), mantenemos el listado clásico
         pass
 
-    estudios_qs = estudios_qs.order_by("-datos__roi", "-id")
-    estudios = []
-
-    for e in estudios_qs:
-        d = e.datos or {}
-        estudios.append({
-            "id": e.id,
-            "nombre": e.nombre,
-            "direccion": e.direccion,
-            "ref_catastral": e.ref_catastral,
-            "valor_referencia": e.valor_referencia,
-            "valor_adquisicion": d.get("valor_adquisicion", 0),
-            "beneficio": d.get("beneficio", 0),
-            "roi": d.get("roi", 0),
-           "fecha": e.creado,
-        })
+    estudios_qs = estudios_qs.values(
+        "id",
+        "codigo_estudio",
+        "nombre",
+        "direccion",
+        "ref_catastral",
+        "valor_referencia",
+        "valor_adquisicion",
+        "beneficio",
+        "roi",
+        "creado",
+    )
+
+    estudios, siguiente = paginar_keyset(
+        estudios_qs,
+        cursor=request.GET.get("cursor", ""),
+        limite=limite_desde_request(request),
+        campo="roi",
+    )
+
+    for e in estudios:
+        e["valor_adquisicion"] = float(e["valor_adquisicion"] or 0)
+        e["beneficio"] = float(e["beneficio"] or 0)
+        e["roi"] = float(e["roi"] or 0)
+        e["fecha"] = e["creado"]
+
+    return estudios, siguiente
+
+
+def lista_estudio(request):
+    estudios, siguiente = _pagina_estudios(request)
 
     return render(
         request,
         "core/lista_estudio.html",
-        {"estudios": estudios},
+        {
+            "estudios": estudios,
+            "siguiente_cursor": siguiente,
+            "mostrar_convertidos": request.GET.get("mostrar_convertidos") == "1",
+        },
     )
 
 
-def lista_proyectos(request):
-    proyectos = Proyecto.objects.all().order_by("-id")
+def lista_estudio_mas(request):
+    """Carga incremental ("cargar más"): devuelve solo el fragmento de tarjetas.
 
-    def _as_float(val, default=0.0):
-        try:
-            if val is None or val == "":
-                return float(default)
-            return float(val)
-        except Exception:
-            return float(default)
-
-    def _get_snapshot(p: Proyecto) -> dict:
-        # Prioridad: snapshot_datos (copia inmutable) > origen_snapshot.datos > origen_estudio.datos
-        snap = getattr(p, "snapshot_datos", None)
-        if isinstance(snap, dict) and snap:
-            return snap
-        osnap = getattr(p, "origen_snapshot", None)
-        if osnap is not None:
-            datos = getattr(osnap, "datos", None)
-            if isinstance(datos, dict) and datos:
-                return datos
-        oest = getattr(p, "origen_estudio", None)
-        if oest is not None:
-            datos = getattr(oest, "datos", None)
-            if isinstance(datos, dict) and datos:
-                return datos
-        return {}
-
-    # Enriquecer cada proyecto con métricas heredadas (sin exigir cambios en el template)
-    for p in proyectos:
-        snap = _get_snapshot(p)
-        economico = snap.get("economico") if isinstance(snap.get("economico"), dict) else {}
-        inversor = snap.get("inversor") if isinstance(snap.get("inversor"), dict) else {}
-        kpis = snap.get("kpis") if isinstance(snap.get("kpis"), dict) else {}
-        metricas = kpis.get("metricas") if isinstance(kpis.get("metricas"), dict) else {}
-
-        # Capital objetivo (lo que realmente se invierte) – heredado del estudio
-        capital_objetivo = (
-            inversor.get("inversion_total")
-            or metricas.get("inversion_total")
-            or metricas.get("valor_adquisicion_total")
-            or metricas.get("valor_adquisicion")
-            or economico.get("valor_adquisicion")
-            or metricas.get("precio_adquisicion")
-            or metricas.get("precio_compra")
-            or 0
-        )
-        capital_objetivo = _as_float(capital_objetivo, 0.0)
+    El cursor de la página siguiente viaja en la cabecera `X-Next-Cursor` (vacía si no hay más).
+    """
+    estudios, siguiente = _pagina_estudios(request)
+    resp = render(request, "core/partials/lista_estudio.html", {"estudios": estudios})
+    resp["X-Next-Cursor"] = siguiente
+    return resp
+
+
+def _pagina_proyectos(request):
+    """Página (keyset) de proyectos: (-id) por defecto, (-roi, -id) con ?orden=roi."""
+    # Los KPIs del listado están desnormalizados en columnas de Proyecto
+    # (ver core.services.proyecto_kpis), así que no cargamos ni decodificamos snapshots.
+    qs = Proyecto.objects.values(
+        "id",
+        "nombre",
+        "estado",
+        "capital_objetivo",
+        "roi",
+        "beneficio_neto",
+        "ultima_version_num",
+    )
+
+    proyectos, siguiente = paginar_keyset(
+        qs,
+        cursor=request.GET.get("cursor", ""),
+        limite=limite_desde_request(request),
+        campo="roi" if request.GET.get("orden") == "roi" else None,
+    )
 
+    for p in proyectos:
+        p["pk"] = p["id"]
+        p["capital_objetivo"] = float(p["capital_objetivo"] or 0)
+        p["roi"] = float(p["roi"] or 0)
         # Mientras no exista módulo de inversores/captación, mostramos captado = objetivo
-        capital_captado = capital_objetivo
-
-        # ROI heredado del estudio (preferimos neto si existe)
-        roi = (
-            inversor.get("roi_neto")
-            or metricas.get("roi_neto")
-            or metricas.get("roi")
-            or economico.get("roi_estimado")
-            or economico.get("roi")
-            or 0
-        )
-        roi = _as_float(roi, 0.0)
+        p["capital_captado"] = p["capital_objetivo"]
+
+    return proyectos, siguiente
 
-        # Adjuntar atributos para plantilla
-        p.capital_objetivo = capital_objetivo
-        p.capital_captado = capital_captado
-        p.roi = roi
-        p._snapshot = snap
+
+def lista_proyectos(request):
+    proyectos, siguiente = _pagina_proyectos(request)
 
     return render(
         request,
         "core/lista_proyectos.html",
-        {"proyectos": proyectos},
+        {
+            "proyectos": proyectos,
+            "siguiente_cursor": siguiente,
+            "orden": request.GET.get("orden", ""),
+        },
     )
 
 
-@ensure_csrf_cookie
-def proyecto(request, proyecto_id: int):
-    """Vista única del Proyecto (pestañas), heredando el snapshot del estudio convertido."""
-    proyecto_obj = get_object_or_404(Proyecto, id=proyecto_id)
+def lista_proyectos_mas(request):
+    """Carga incremental ("cargar más"): devuelve solo el fragmento de tarjetas.
+
+    El cursor de la página siguiente viaja en la cabecera `X-Next-Cursor` (vacía si no hay más).
+    """
+    proyectos, siguiente = _pagina_proyectos(request)
+    resp = render(request, "core/partials/lista_proyectos.html", {"proyectos": proyectos})
+    resp["X-Next-Cursor"] = siguiente
+    return resp
 
-    # --- Compatibilidad de plantilla: algunos campos pueden no existir en el modelo Proyecto ---
-    # Django templates fallan con VariableDoesNotExist si se accede a un atributo inexistente.
-    # Definimos atributos "dummy" para que la plantilla no rompa (los valores reales vendrán del snapshot).
-    _tpl_expected_fields = [
-        "venta_estimada",
-        "precio_propiedad",
-        "precio_compra_inmueble",
-        "precio_venta_estimado",
-        "notaria",
-        "registro",
-        "itp",
-        "direccion",
-        "ref_catastral",
-        "valor_referencia",
-    ]
-    for _f in _tpl_expected_fields:
-        if not hasattr(proyecto_obj, _f):
-            setattr(proyecto_obj, _f, "")
 
+def _snapshot_renderizado_proyecto(proyecto_obj: Proyecto):
+    """Snapshot efectivo del proyecto fusionado con su overlay y normalizado para la plantilla.
+
+    Devuelve (snapshot, estado_inicial).
+    """
     # Snapshot efectivo del proyecto (prioridad):
     # 1) Último ProyectoSnapshot (guardados/versionado)
     # 2) snapshot_datos (copia inmutable heredada)
@@ -599,9 +688,13 @@ def proyecto(request, proyecto_id: int):
     # 4) origen_estudio.datos
     snapshot: dict = {}
     try:
-        last_ps = ProyectoSnapshot.objects.filter(proyecto=proyecto_obj).order_by("-version_num", "-id").first()
+        # Puntero mantenido por guardar_proyecto / convertir_a_proyecto (fetch por PK);
+        # para proyectos antiguos sin puntero, buscamos la versión más alta.
+        last_ps = proyecto_obj.ultimo_snapshot
+        if last_ps is None:
+            last_ps = ProyectoSnapshot.objects.filter(proyecto=proyecto_obj).order_by("-version_num", "-id").first()
         if last_ps is not None:
-            ps_d = getattr(last_ps, "datos", None)
+            ps_d = datos_snapshot(last_ps)
             if isinstance(ps_d, dict) and ps_d:
                 snapshot = ps_d
 
@@ -693,6 +786,70 @@ def proyecto(request, proyecto_id: int):
     except Exception:
         estado_inicial = {}
 
+    return snapshot, estado_inicial
+
+
+@ensure_csrf_cookie
+def proyecto(request, proyecto_id: int):
+    """Vista única del Proyecto (pestañas), heredando el snapshot del estudio convertido."""
+    # GET condicional: el validador sale de columnas baratas (sin leer snapshots ni `extra` completo),
+    # así una recarga sin cambios responde 304 antes de cualquier merge o render.
+    val = (
+        Proyecto.objects.filter(id=proyecto_id)
+        .values("actualizado", "ultimo_snapshot_id", "estado", "extra__ultimo_guardado__fecha")
+        .first()
+    )
+    if val is None:
+        raise Http404("Proyecto no encontrado")
+    fecha_overlay = val.get("extra__ultimo_guardado__fecha") or ""
+    etag = _validador("proyecto", proyecto_id, val["actualizado"], val["ultimo_snapshot_id"], val["estado"], fecha_overlay)
+    last_modified = _timestamp(val["actualizado"], fecha_overlay)
+    resp = _respuesta_condicional(request, etag, last_modified)
+    if resp is not None:
+        return resp
+
+    # Snapshot fusionado + normalizado: cacheado por proyecto y versión (se invalida al guardar/convertir)
+    version_cache = (val["ultimo_snapshot_id"], fecha_overlay)
+    cacheado = obtener_snapshot_proyecto(proyecto_id, version_cache)
+    if cacheado is None:
+        proyecto_obj = get_object_or_404(Proyecto, id=proyecto_id)
+        snapshot, estado_inicial = _snapshot_renderizado_proyecto(proyecto_obj)
+        cacheado = {
+            "snapshot": _safe_template_obj(snapshot),
+            "estado_inicial_json": json.dumps(estado_inicial, ensure_ascii=False),
+        }
+        guardar_snapshot_proyecto(proyecto_id, version_cache, cacheado)
+    else:
+        # Con el snapshot ya fusionado no necesitamos leer los JSON del proyecto
+        proyecto_obj = get_object_or_404(Proyecto.objects.defer("snapshot_datos", "extra"), id=proyecto_id)
+
+    snapshot_safe = cacheado["snapshot"]
+
+    def _seccion(obj, key):
+        v = obj.get(key) if isinstance(obj, dict) else None
+        return v if isinstance(v, SafeAccessDict) else SafeAccessDict()
+
+    kpis_safe = _seccion(snapshot_safe, "kpis")
+
+    # --- Compatibilidad de plantilla: algunos campos pueden no existir en el modelo Proyecto ---
+    # Django templates fallan con VariableDoesNotExist si se accede a un atributo inexistente.
+    # Definimos atributos "dummy" para que la plantilla no rompa (los valores reales vendrán del snapshot).
+    _tpl_expected_fields = [
+        "venta_estimada",
+        "precio_propiedad",
+        "precio_compra_inmueble",
+        "precio_venta_estimado",
+        "notaria",
+        "registro",
+        "itp",
+        "direccion",
+        "ref_catastral",
+        "valor_referencia",
+    ]
+    for _f in _tpl_expected_fields:
+        if not hasattr(proyecto_obj, _f):
+            setattr(proyecto_obj, _f, "")
+
     # --- Editabilidad del proyecto ---
     # En proyecto (fase operativa) el formulario debe ser editable por defecto.
     # Solo lo bloqueamos si existe un campo de estado/cierre que indique finalización.
@@ -707,20 +864,24 @@ def proyecto(request, proyecto_id: int):
 
     ctx = {
         "PROYECTO_ID": str(proyecto_obj.id),
-        "ESTADO_INICIAL_JSON": json.dumps(estado_inicial, ensure_ascii=False),
+        # Autosave: URLs resueltas (sin tanteo en el cliente) y prefijo para las Idempotency-Key
+        "GUARDAR_URL": reverse("core:guardar_proyecto", args=[proyecto_obj.id]),
+        "GUARDAR_PATCH_URL": reverse("core:guardar_proyecto_patch", args=[proyecto_obj.id]),
+        "AUTOSAVE_CLAVE": f"p{proyecto_obj.id}-{secrets.token_hex(6)}",
+        "ESTADO_INICIAL_JSON": cacheado["estado_inicial_json"],
         "editable": editable,
         "proyecto": proyecto_obj,
-        "snapshot": _safe_template_obj(snapshot),
+        "snapshot": snapshot_safe,
         # Atajos por si `proyecto.html` los usa como en el PDF/estudio
-        "inmueble": _safe_template_obj(snapshot.get("inmueble", {})) if isinstance(snapshot.get("inmueble"), dict) else SafeAccessDict(),
-        "economico": _safe_template_obj(snapshot.get("economico", {})) if isinstance(snapshot.get("economico"), dict) else SafeAccessDict(),
-        "inversor": _safe_template_obj(snapshot.get("inversor", {})) if isinstance(snapshot.get("inversor"), dict) else SafeAccessDict(),
-        "comite": _safe_template_obj(snapshot.get("comite", {})) if isinstance(snapshot.get("comite"), dict) else SafeAccessDict(),
-        "kpis": _safe_template_obj(snapshot.get("kpis", {})) if isinstance(snapshot.get("kpis"), dict) else SafeAccessDict(),
-        "metricas": _safe_template_obj(metricas_raw) if isinstance(metricas_raw, dict) else SafeAccessDict(),
+        "inmueble": _seccion(snapshot_safe, "inmueble"),
+        "economico": _seccion(snapshot_safe, "economico"),
+        "inversor": _seccion(snapshot_safe, "inversor"),
+        "comite": _seccion(snapshot_safe, "comite"),
+        "kpis": kpis_safe,
+        "metricas": _seccion(kpis_safe, "metricas"),
     }
 
-    return render(request, "core/proyecto.html", ctx)
+    return _con_validadores(render(request, "core/proyecto.html", ctx), etag, last_modified)
 
 
 @csrf_exempt
@@ -900,6 +1061,10 @@ def guardar_estudio(request):
             "valor_referencia": valor_referencia,
             "datos": datos,
             "guardado": True,
+            # Columnas reales (indexadas) para ordenar/filtrar el listado sin leer `datos`
+            "valor_adquisicion": a_decimal_columna(valor_adq, 12),
+            "beneficio": a_decimal_columna(beneficio, 12),
+            "roi": a_decimal_columna(roi, 6),
         }
 
         if estudio_id:
@@ -926,6 +1091,269 @@ def guardar_estudio(request):
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
 
 
+def _proyecto_bloqueado(proyecto_id: int):
+    """Proyecto con su fila bloqueada hasta el final de la transacción (None si no existe).
+
+    SQLite no tiene SELECT ... FOR UPDATE: un UPDATE vacío toma antes el bloqueo de escritura;
+    si la transacción empezase leyendo, la primera escritura fallaría con "database is locked".
+    """
+    if not connection.features.has_select_for_update:
+        Proyecto.objects.filter(id=proyecto_id).update(id=F("id"))
+    return Proyecto.objects.select_for_update().filter(id=proyecto_id).first()
+
+
+def _clave_idempotencia(request) -> str:
+    return (request.headers.get("Idempotency-Key") or "").strip()[:100]
+
+
+def _respuesta_repetida(proyecto, clave: str):
+    """Si `clave` es la del último guardado aplicado (reintento de red o beacon `keepalive`
+    repetido al cerrar la página), devuelve el estado actual sin escribir nada; si no, None."""
+    if not clave:
+        return None
+    extra = proyecto.extra if isinstance(proyecto.extra, dict) else {}
+    ultimo_guardado = extra.get("ultimo_guardado") if isinstance(extra.get("ultimo_guardado"), dict) else {}
+    if ultimo_guardado.get("clave") != clave:
+        return None
+    ultimo = (
+        ProyectoSnapshot.objects.filter(pk=proyecto.ultimo_snapshot_id)
+        .values("id", "version_num", "codigo_version", "hash_contenido", "abierta")
+        .first()
+    ) or {}
+    return JsonResponse({
+        "ok": True,
+        "proyecto_id": proyecto.id,
+        "snapshot_id": ultimo.get("id"),
+        "version": ultimo.get("version_num"),
+        "codigo_version": ultimo.get("codigo_version", ""),
+        "hash": ultimo.get("hash_contenido", ""),
+        "abierta": ultimo.get("abierta", False),
+        "sin_cambios": True,
+        "repetido": True,
+    })
+
+
+def _guardar_overlay_proyecto(
+    proyecto, overlay: dict, autosave: bool = False, sellar: bool = False, clave: str = ""
+) -> JsonResponse:
+    """Persiste un overlay ya saneado: campos principales, Proyecto.extra y nueva versión.
+
+    `autosave=True`: dentro de la ventana PROYECTO_AUTOSAVE_VENTANA se actualiza la versión
+    abierta en lugar de crear otra. `sellar=True` (guardado explícito / salida de la página)
+    cierra la versión abierta con este estado. `clave` (Idempotency-Key) queda registrada
+    para descartar reintentos del mismo guardado.
+    """
+    # ------------------------------------------------------------
+    # Persistencia en BDD (campos principales del Proyecto)
+    # - nombre (cabecera / listado)
+    # - direccion, ref_catastral, valor_referencia (si existen en el modelo)
+    # ------------------------------------------------------------
+    def _has_field(model, fname: str) -> bool:
+        try:
+            model._meta.get_field(fname)
+            return True
+        except Exception:
+            return False
+
+    def _get_str(*candidates) -> str:
+        for v in candidates:
+            if v is None:
+                continue
+            if isinstance(v, str):
+                s = v.strip()
+                if s:
+                    return s
+            else:
+                s = str(v).strip()
+                if s:
+                    return s
+        return ""
+
+    proyecto_sec = overlay.get("proyecto") if isinstance(overlay.get("proyecto"), dict) else {}
+    inmueble_sec = overlay.get("inmueble") if isinstance(overlay.get("inmueble"), dict) else {}
+
+    nuevo_nombre = _get_str(
+        proyecto_sec.get("nombre"),
+        proyecto_sec.get("nombre_proyecto"),
+        overlay.get("nombre"),
+        overlay.get("nombre_proyecto"),
+        inmueble_sec.get("nombre_proyecto"),
+    )
+    nueva_direccion = _get_str(
+        inmueble_sec.get("direccion"),
+        overlay.get("direccion"),
+        overlay.get("direccion_completa"),
+    )
+    nueva_ref = _get_str(
+        inmueble_sec.get("ref_catastral"),
+        overlay.get("ref_catastral"),
+        overlay.get("referencia_catastral"),
+    )
+
+    # valor_referencia puede venir en varias ubicaciones
+    vr_raw = None
+    if isinstance(inmueble_sec, dict):
+        vr_raw = inmueble_sec.get("valor_referencia")
+    if vr_raw in (None, ""):
+        vr_raw = overlay.get("valor_referencia")
+    nuevo_vr = _safe_float(vr_raw, None) if vr_raw not in (None, "") else None
+    # ------------------------------------------------------------
+    # Asegurar coherencia de NOMBRE en el overlay para que la UI no
+    # "vuelva" al nombre heredado del estudio al recargar.
+    # Muchas plantillas leen `snapshot.inmueble.nombre_proyecto` y/o
+    # `snapshot.proyecto.nombre_proyecto`, no solo `proyecto.nombre`.
+    # ------------------------------------------------------------
+    if nuevo_nombre:
+        # claves planas (fallbacks)
+        overlay["nombre"] = nuevo_nombre
+        overlay["nombre_proyecto"] = nuevo_nombre
+
+        # sección proyecto
+        if not isinstance(overlay.get("proyecto"), dict):
+            overlay["proyecto"] = {}
+        overlay["proyecto"]["nombre"] = nuevo_nombre
+        overlay["proyecto"]["nombre_proyecto"] = nuevo_nombre
+
+        # sección inmueble
+        if not isinstance(overlay.get("inmueble"), dict):
+            overlay["inmueble"] = {}
+        overlay["inmueble"]["nombre_proyecto"] = nuevo_nombre
+    update_fields: list[str] = []
+    if nuevo_nombre and _has_field(Proyecto, "nombre") and getattr(proyecto, "nombre", "") != nuevo_nombre:
+        proyecto.nombre = nuevo_nombre
+        update_fields.append("nombre")
+    if nueva_direccion and _has_field(Proyecto, "direccion") and getattr(proyecto, "direccion", "") != nueva_direccion:
+        proyecto.direccion = nueva_direccion
+        update_fields.append("direccion")
+    if nueva_ref and _has_field(Proyecto, "ref_catastral") and getattr(proyecto, "ref_catastral", "") != nueva_ref:
+        proyecto.ref_catastral = nueva_ref
+        update_fields.append("ref_catastral")
+    if _has_field(Proyecto, "valor_referencia"):
+        cur_vr = getattr(proyecto, "valor_referencia", None)
+        # Solo actualizamos si llega un valor explícito (evitamos pisar con None)
+        if nuevo_vr is not None and cur_vr != nuevo_vr:
+            proyecto.valor_referencia = nuevo_vr
+            update_fields.append("valor_referencia")
+
+    # Base snapshot (inmutable) + overlay (reales / ajustes / kpis)
+    base_snapshot = getattr(proyecto, "snapshot_datos", None)
+    if not isinstance(base_snapshot, dict):
+        base_snapshot = {}
+
+    merged = deepcopy(base_snapshot)
+    merged = _deep_merge_dict(merged, overlay)
+
+    # Autosave sin cambios (foco/blur, dos pestañas con el mismo estado...):
+    # si el documento es idéntico a la última versión, la devolvemos sin insertar
+    # otra fila ni reescribir `Proyecto.extra`.
+    contenido_hash = hash_contenido(merged)
+    ultimo = None
+    if proyecto.ultimo_snapshot_id:
+        ultimo = (
+            ProyectoSnapshot.objects.filter(pk=proyecto.ultimo_snapshot_id)
+            .values("id", "version_num", "codigo_version", "hash_contenido", "abierta")
+            .first()
+        )
+    if ultimo is not None and ultimo["hash_contenido"] == contenido_hash:
+        if update_fields:
+            # `actualizado` (auto_now) solo se escribe si está en update_fields; sin él el ETag no cambia
+            proyecto.save(update_fields=sorted(set(update_fields + ["actualizado"])))
+            invalidar_snapshot_proyecto(proyecto.id)
+        abierta = ultimo["abierta"]
+        if sellar and abierta:
+            ProyectoSnapshot.objects.filter(pk=ultimo["id"]).update(abierta=False)
+            abierta = False
+        return JsonResponse({
+            "ok": True,
+            "proyecto_id": proyecto.id,
+            "snapshot_id": ultimo["id"],
+            "version": ultimo["version_num"],
+            "codigo_version": ultimo["codigo_version"],
+            "hash": contenido_hash,
+            "abierta": abierta,
+            "sin_cambios": True,
+        })
+
+    # Guardar último estado recibido de forma robusta:
+    # - Preferimos `Proyecto.extra` si existe
+    # - Si el modelo no tiene `extra`, persistimos el overlay dentro de `snapshot_datos["_overlay"]`
+    saved_overlay = False
+    try:
+        Proyecto._meta.get_field("extra")
+    except Exception:
+        saved_overlay = False
+    else:
+        extra = getattr(proyecto, "extra", None)
+        if not isinstance(extra, dict):
+            extra = {}
+        extra["ultimo_guardado"] = {
+            "fecha": timezone.now().isoformat(),
+            "payload": overlay,
+        }
+        if clave:
+            extra["ultimo_guardado"]["clave"] = clave
+        proyecto.extra = extra
+        update_fields.append("extra")
+        saved_overlay = True
+
+    if not saved_overlay:
+        sd = getattr(proyecto, "snapshot_datos", None)
+        if not isinstance(sd, dict):
+            sd = {}
+        sd["_overlay"] = overlay
+        proyecto.snapshot_datos = sd
+        update_fields.append("snapshot_datos")
+
+    # Snapshot versionado + puntero `ultimo_snapshot` en la misma transacción
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                # Coalescencia de autosaves: misma versión mientras siga abierta la ventana
+                snap = snapshot_abierto(proyecto) if (autosave or sellar) else None
+                if snap is not None:
+                    actualizar_snapshot_abierto(snap, merged, sellar=sellar)
+                else:
+                    # Keyframe periódico o diff contra la versión anterior (ver services.snapshot_delta)
+                    snap = crear_snapshot_proyecto(
+                        proyecto,
+                        merged,
+                        fuente="guardado",
+                        abierta=autosave and not sellar and ventana_autosave() > 0,
+                    )
+            snap_id = snap.id
+            version_num = snap.version_num
+            codigo_version = snap.codigo_version
+            abierta = snap.abierta
+            if proyecto.ultimo_snapshot_id != snap.id:
+                proyecto.ultimo_snapshot = snap
+                update_fields.append("ultimo_snapshot")
+        except Exception:
+            snap_id = None
+            version_num = None
+            codigo_version = ""
+            abierta = False
+
+        # KPIs desnormalizados para el listado
+        update_fields += aplicar_kpis_proyecto(proyecto, merged, version_num)
+
+        # Guardar en una sola operación (incluye overlay, campos principales, KPIs y `actualizado`)
+        if update_fields:
+            proyecto.save(update_fields=sorted(set(update_fields + ["actualizado"])))
+
+    invalidar_snapshot_proyecto(proyecto.id)
+
+    return JsonResponse({
+        "ok": True,
+        "proyecto_id": proyecto.id,
+        "snapshot_id": snap_id,
+        "version": version_num,
+        "codigo_version": codigo_version,
+        "hash": contenido_hash if snap_id else "",
+        "abierta": abierta,
+        "sin_cambios": False,
+    })
+
+
 # --- NUEVO: Guardar cambios en Proyecto y snapshot versionado ---
 @csrf_exempt
 def guardar_proyecto(request, proyecto_id: int):
@@ -939,8 +1367,6 @@ def guardar_proyecto(request, proyecto_id: int):
     if request.method != "POST":
         return JsonResponse({"ok": False, "error": "Método no permitido"}, status=405)
 
-    proyecto = get_object_or_404(Proyecto, id=proyecto_id)
-
     try:
         raw_payload = json.loads(request.body or "{}")
         if not isinstance(raw_payload, dict):
@@ -958,160 +1384,91 @@ def guardar_proyecto(request, proyecto_id: int):
 
         overlay = _sanitize_for_json(overlay)
 
-        # ------------------------------------------------------------
-        # Persistencia en BDD (campos principales del Proyecto)
-        # - nombre (cabecera / listado)
-        # - direccion, ref_catastral, valor_referencia (si existen en el modelo)
-        # ------------------------------------------------------------
-        def _has_field(model, fname: str) -> bool:
-            try:
-                model._meta.get_field(fname)
-                return True
-            except Exception:
-                return False
+        # proyecto.js marca sus autosaves (coalescencia en la versión abierta); `sellar` la cierra
+        envuelto = isinstance(raw_payload.get("payload"), dict)
+        autosave = envuelto and raw_payload.get("autosave") is True
+        sellar = envuelto and raw_payload.get("sellar") is True
+
+        clave = _clave_idempotencia(request)
+        with transaction.atomic():
+            # Bloqueo de la fila: serializa los guardados del proyecto (overlay en `extra` + clave)
+            proyecto = _proyecto_bloqueado(proyecto_id)
+            if proyecto is None:
+                return JsonResponse({"ok": False, "error": "Proyecto no encontrado"}, status=404)
+            repetida = _respuesta_repetida(proyecto, clave)
+            if repetida is not None:
+                return repetida
+            return _guardar_overlay_proyecto(proyecto, overlay, autosave=autosave, sellar=sellar, clave=clave)
 
-        def _get_str(*candidates) -> str:
-            for v in candidates:
-                if v is None:
-                    continue
-                if isinstance(v, str):
-                    s = v.strip()
-                    if s:
-                        return s
-                else:
-                    s = str(v).strip()
-                    if s:
-                        return s
-            return ""
+    except Exception as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=500)
 
-        proyecto_sec = overlay.get("proyecto") if isinstance(overlay.get("proyecto"), dict) else {}
-        inmueble_sec = overlay.get("inmueble") if isinstance(overlay.get("inmueble"), dict) else {}
 
-        nuevo_nombre = _get_str(
-            proyecto_sec.get("nombre"),
-            proyecto_sec.get("nombre_proyecto"),
-            overlay.get("nombre"),
-            overlay.get("nombre_proyecto"),
-            inmueble_sec.get("nombre_proyecto"),
-        )
-        nueva_direccion = _get_str(
-            inmueble_sec.get("direccion"),
-            overlay.get("direccion"),
-            overlay.get("direccion_completa"),
-        )
-        nueva_ref = _get_str(
-            inmueble_sec.get("ref_catastral"),
-            overlay.get("ref_catastral"),
-            overlay.get("referencia_catastral"),
-        )
+@csrf_exempt
+def guardar_proyecto_patch(request, proyecto_id: int):
+    """Autosave incremental: aplica un JSON Patch sobre el último overlay guardado.
 
-        # valor_referencia puede venir en varias ubicaciones
-        vr_raw = None
-        if isinstance(inmueble_sec, dict):
-            vr_raw = inmueble_sec.get("valor_referencia")
-        if vr_raw in (None, ""):
-            vr_raw = overlay.get("valor_referencia")
-        nuevo_vr = _safe_float(vr_raw, None) if vr_raw not in (None, "") else None
-        # ------------------------------------------------------------
-        # Asegurar coherencia de NOMBRE en el overlay para que la UI no
-        # "vuelva" al nombre heredado del estudio al recargar.
-        # Muchas plantillas leen `snapshot.inmueble.nombre_proyecto` y/o
-        # `snapshot.proyecto.nombre_proyecto`, no solo `proyecto.nombre`.
-        # ------------------------------------------------------------
-        if nuevo_nombre:
-            # claves planas (fallbacks)
-            overlay["nombre"] = nuevo_nombre
-            overlay["nombre_proyecto"] = nuevo_nombre
-
-            # sección proyecto
-            if not isinstance(overlay.get("proyecto"), dict):
-                overlay["proyecto"] = {}
-            overlay["proyecto"]["nombre"] = nuevo_nombre
-            overlay["proyecto"]["nombre_proyecto"] = nuevo_nombre
-
-            # sección inmueble
-            if not isinstance(overlay.get("inmueble"), dict):
-                overlay["inmueble"] = {}
-            overlay["inmueble"]["nombre_proyecto"] = nuevo_nombre
-        update_fields: list[str] = []
-        if nuevo_nombre and _has_field(Proyecto, "nombre") and getattr(proyecto, "nombre", "") != nuevo_nombre:
-            proyecto.nombre = nuevo_nombre
-            update_fields.append("nombre")
-        if nueva_direccion and _has_field(Proyecto, "direccion") and getattr(proyecto, "direccion", "") != nueva_direccion:
-            proyecto.direccion = nueva_direccion
-            update_fields.append("direccion")
-        if nueva_ref and _has_field(Proyecto, "ref_catastral") and getattr(proyecto, "ref_catastral", "") != nueva_ref:
-            proyecto.ref_catastral = nueva_ref
-            update_fields.append("ref_catastral")
-        if _has_field(Proyecto, "valor_referencia"):
-            cur_vr = getattr(proyecto, "valor_referencia", None)
-            # Solo actualizamos si llega un valor explícito (evitamos pisar con None)
-            if nuevo_vr is not None and cur_vr != nuevo_vr:
-                proyecto.valor_referencia = nuevo_vr
-                update_fields.append("valor_referencia")
-
-        # Base snapshot (inmutable) + overlay (reales / ajustes / kpis)
-        base_snapshot = getattr(proyecto, "snapshot_datos", None)
-        if not isinstance(base_snapshot, dict):
-            base_snapshot = {}
-
-        merged = deepcopy(base_snapshot)
-        merged = _deep_merge_dict(merged, overlay)
-
-        # Guardar último estado recibido de forma robusta:
-        # - Preferimos `Proyecto.extra` si existe
-        # - Si el modelo no tiene `extra`, persistimos el overlay dentro de `snapshot_datos["_overlay"]`
-        saved_overlay = False
-        try:
-            Proyecto._meta.get_field("extra")
-        except Exception:
-            saved_overlay = False
-        else:
-            extra = getattr(proyecto, "extra", None)
-            if not isinstance(extra, dict):
-                extra = {}
-            extra["ultimo_guardado"] = {
-                "fecha": timezone.now().isoformat(),
-                "payload": overlay,
-            }
-            proyecto.extra = extra
-            update_fields.append("extra")
-            saved_overlay = True
-
-        if not saved_overlay:
-            sd = getattr(proyecto, "snapshot_datos", None)
-            if not isinstance(sd, dict):
-                sd = {}
-            sd["_overlay"] = overlay
-            proyecto.snapshot_datos = sd
-            update_fields.append("snapshot_datos")
-
-        # Guardar en una sola operación (incluye overlay y campos principales)
-        if update_fields:
-            proyecto.save(update_fields=sorted(set(update_fields)))
+    Body: {"base_version": n, "base_hash": "...", "patch": [ops RFC 6902], "autosave": bool, "sellar": bool}.
+    `base_hash` distingue revisiones de una misma versión abierta (autosaves coalescidos).
+    Si la base no coincide (otra pestaña ha guardado entre medias), no hay overlay previo
+    o el patch no aplica, responde 409 y el cliente reenvía el payload completo a `guardar_proyecto`.
+    """
+
+    if request.method != "POST":
+        return JsonResponse({"ok": False, "error": "Método no permitido"}, status=405)
 
-        # Snapshot versionado
+    try:
+        body = json.loads(request.body or "{}")
+        if not isinstance(body, dict):
+            body = {}
+        ops = body.get("patch")
         try:
-            snap = ProyectoSnapshot.objects.create(
-                proyecto=proyecto,
-                fuente="guardado",
-                datos=merged,
+            base_version = int(body.get("base_version"))
+        except (TypeError, ValueError):
+            base_version = None
+
+        clave = _clave_idempotencia(request)
+        with transaction.atomic():
+            # Bloqueo de la fila: dos patches del mismo proyecto no pueden partir del mismo overlay
+            proyecto = _proyecto_bloqueado(proyecto_id)
+            if proyecto is None:
+                return JsonResponse({"ok": False, "error": "Proyecto no encontrado"}, status=404)
+            # Reintento de un patch ya aplicado: antes que la comprobación de versión (ya no coincidiría)
+            repetida = _respuesta_repetida(proyecto, clave)
+            if repetida is not None:
+                return repetida
+
+            extra = proyecto.extra if isinstance(proyecto.extra, dict) else {}
+            ultimo_guardado = extra.get("ultimo_guardado") if isinstance(extra.get("ultimo_guardado"), dict) else {}
+            overlay_previo = ultimo_guardado.get("payload")
+
+            hash_actual = (
+                ProyectoSnapshot.objects.filter(pk=proyecto.ultimo_snapshot_id)
+                .values_list("hash_contenido", flat=True)
+                .first()
+            )
+            base_hash = body.get("base_hash")
+
+            conflicto = {"ok": False, "conflicto": True, "version": proyecto.ultima_version_num}
+            if (
+                base_version is None
+                or base_version != proyecto.ultima_version_num
+                or (base_hash and base_hash != hash_actual)
+                or not isinstance(overlay_previo, dict)
+            ):
+                return JsonResponse(conflicto, status=409)
+            try:
+                overlay = aplicar_json_patch(overlay_previo, _sanitize_for_json(ops))
+            except JSONPatchError as e:
+                return JsonResponse({**conflicto, "error": str(e)}, status=409)
+
+            return _guardar_overlay_proyecto(
+                proyecto,
+                overlay,
+                autosave=body.get("autosave") is True,
+                sellar=body.get("sellar") is True,
+                clave=clave,
             )
-            snap_id = snap.id
-            version_num = snap.version_num
-            codigo_version = snap.codigo_version
-        except Exception:
-            snap_id = None
-            version_num = None
-            codigo_version = ""
-
-        return JsonResponse({
-            "ok": True,
-            "proyecto_id": proyecto.id,
-            "snapshot_id": snap_id,
-            "version": version_num,
-            "codigo_version": codigo_version,
-        })
 
     except Exception as e:
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
@@ -1195,17 +1552,30 @@ def convertir_a_proyecto(request, estudio_id: int):
         proyecto = Proyecto.objects.create(**proyecto_kwargs)
 
         # 2.1) Snapshot del PROYECTO (v1) para trazabilidad
+        version_num = None
+        kpi_fields = []
         try:
-            ProyectoSnapshot.objects.create(
-                proyecto=proyecto,
-                fuente="conversion",
-                nota="Snapshot inicial desde estudio",
-                datos=snapshot_data,
-            )
+            with transaction.atomic():
+                ps = ProyectoSnapshot.objects.create(
+                    proyecto=proyecto,
+                    fuente="conversion",
+                    nota="Snapshot inicial desde estudio",
+                    datos=snapshot_data,
+                )
+            version_num = ps.version_num
+            proyecto.ultimo_snapshot = ps
+            kpi_fields.append("ultimo_snapshot")
         except Exception:
             # No debe romper la conversión si falla el snapshot
             pass
 
+        # 2.2) KPIs desnormalizados para el listado
+        kpi_fields += aplicar_kpis_proyecto(proyecto, snapshot_data, version_num)
+        if kpi_fields:
+            proyecto.save(update_fields=kpi_fields + ["actualizado"])
+
+        invalidar_snapshot_proyecto(proyecto.id)
+
         # 3) Bloquear el estudio
         estudio.bloqueado = True
         estudio.bloqueado_en = timezone.now()
@@ -1228,13 +1598,10 @@ def convertir_a_proyecto(request, estudio_id: int):
 
 
 
-def pdf_estudio_preview(request, estudio_id):
-    estudio = get_object_or_404(Estudio, id=estudio_id)
-
+def _construir_snapshot_pdf_estudio(estudio: Estudio):
+    """Snapshot enriquecido para el PDF del estudio + contexto de métricas (sin persistir)."""
     from core.services.estudio_snapshot import build_estudio_snapshot
-    from core.models import EstudioSnapshot
 
-    # --- Construir snapshot FINAL y persistir ---
     snapshot_data = build_estudio_snapshot(estudio)
 
     metricas_ctx = {}
@@ -1446,16 +1813,51 @@ def pdf_estudio_preview(request, estudio_id):
         pass
     # Asegurar que el JSON es serializable (Decimal -> float, fechas -> string)
     snapshot_data = _sanitize_for_json(snapshot_data)
-    snapshot = EstudioSnapshot.objects.create(
+    return snapshot_data, {
+        "metricas": metricas_ctx,
+        "metricas_fmt": metricas_fmt_ctx,
+        "resultado": resultado_ctx,
+        "texto": texto_ctx,
+    }
+
+
+def _snapshot_pdf_estudio(estudio: Estudio):
+    """(snapshot_data, m) del PDF: reutiliza el último EstudioSnapshot con la misma huella o crea uno."""
+    from core.services.estudio_snapshot import huella_estudio
+
+    # --- Reutilizar el último snapshot del mismo estado del estudio (un GET no escribe en BD) ---
+    huella = huella_estudio(estudio)
+    snapshot = (
+        EstudioSnapshot.objects.filter(estudio=estudio, huella=huella)
+        .order_by("-id")
+        .only("id", "datos")
+        .first()
+    )
+    if snapshot is not None and isinstance(snapshot.datos, dict):
+        m = {}
+        try:
+            m = _metricas_desde_estudio(estudio)
+        except Exception:
+            pass
+        return snapshot.datos, m
+
+    # --- Construir snapshot FINAL y persistir (solo si el estudio ha cambiado) ---
+    snapshot_data, m = _construir_snapshot_pdf_estudio(estudio)
+    EstudioSnapshot.objects.create(
         estudio=estudio,
         datos=snapshot_data,
+        huella=huella,
     )
+    return snapshot_data, m
 
-    snapshot_safe = _safe_template_obj(snapshot_data)
 
-    # Si pedimos debug, devolvemos el snapshot como JSON para inspeccionar sin usar shell
-    if request.GET.get("debug") == "1":
-        return JsonResponse(snapshot_data, json_dumps_params={"ensure_ascii": False, "indent": 2})
+def _contexto_pdf_estudio(estudio: Estudio, snapshot_data: dict, m: dict) -> dict:
+    metricas_ctx = m.get("metricas", {})
+    metricas_fmt_ctx = m.get("metricas_fmt", {})
+    resultado_ctx = m.get("resultado", {})
+    texto_ctx = m.get("texto", {})
+
+    snapshot_safe = _safe_template_obj(snapshot_data)
 
     # --- Contexto ROBUSTO para el PDF ---
     # (compatibilidad: además de snapshot.*, exponemos variables planas por si la plantilla antigua las usa)
@@ -1517,6 +1919,11 @@ def pdf_estudio_preview(request, estudio_id):
         "pct_net": round(pct_net, 2),
     }
 
+    # Gráficos matplotlib (memoizados); vacío mientras matplotlib arranca => la plantilla usa las barras CSS
+    from core.services.graficos import graficos_pdf_estudio
+
+    graficos_ctx = graficos_pdf_estudio(visual_ctx, inv_ctx.get("roi_neto") or eco_ctx.get("roi_estimado"))
+
     ctx = {
         "snapshot": snapshot_safe,
         "estudio": estudio,
@@ -1524,6 +1931,7 @@ def pdf_estudio_preview(request, estudio_id):
         "economico": eco_ctx,
         "inversor": inv_ctx,
         "visual": visual_ctx,
+        "graficos": graficos_ctx,
 
         # Variables planas (fallbacks) — evitan que el PDF quede vacío si la plantilla no usa snapshot.inmueble.*
         "nombre_proyecto": inm_ctx.get("nombre_proyecto") or getattr(estudio, "nombre", ""),
@@ -1557,6 +1965,83 @@ def pdf_estudio_preview(request, estudio_id):
         "comite": snapshot_safe.get("comite", {}) if isinstance(snapshot_safe, dict) else {},
     }
 
+    return ctx
+
+
+def _html_pdf_estudio(estudio: Estudio, request=None):
+    """(clave de caché, HTML) del PDF del estudio; lo usan la vista y el worker de `procesar_pdfs`."""
+    from django.template.loader import render_to_string
+    from core.services.pdf_render import PLANTILLA_PDF_ESTUDIO, clave_pdf
+
+    snapshot_data, m = _snapshot_pdf_estudio(estudio)
+    ctx = _contexto_pdf_estudio(estudio, snapshot_data, m)
+    clave = clave_pdf(snapshot_data, variante="graficos" if ctx.get("graficos") else "")
+    return clave, render_to_string(PLANTILLA_PDF_ESTUDIO, ctx, request=request)
+
+
+def pdf_estudio_preview(request, estudio_id):
+    estudio = get_object_or_404(Estudio, id=estudio_id)
+
+    # GET condicional para la vista de depuración JSON (depende solo del estudio)
+    debug_json = request.GET.get("debug") == "1"
+    if debug_json:
+        etag = _validador("pdf_debug", estudio.id, estudio.actualizado, estudio.bloqueado)
+        last_modified = _timestamp(estudio.actualizado)
+        resp = _respuesta_condicional(request, etag, last_modified)
+        if resp is not None:
+            return resp
+
+    snapshot_data, m = _snapshot_pdf_estudio(estudio)
+
+    # Si pedimos debug, devolvemos el snapshot como JSON para inspeccionar sin usar shell
+    if debug_json:
+        return _con_validadores(
+            JsonResponse(snapshot_data, json_dumps_params={"ensure_ascii": False, "indent": 2}),
+            etag,
+            last_modified,
+        )
+
+    # --- PDF real (WeasyPrint): mismo snapshot + misma plantilla => mismo fichero en disco ---
+    formato_pdf = request.GET.get("formato") == "pdf"
+    ctx = _contexto_pdf_estudio(estudio, snapshot_data, m)
+
+    if formato_pdf:
+        from core.services.pdf_render import clave_pdf, pdf_cacheado
+
+        # Con y sin gráficos son PDFs distintos; misma clave que `_html_pdf_estudio` (worker)
+        clave = clave_pdf(snapshot_data, variante="graficos" if ctx.get("graficos") else "")
+        etag_pdf = f'"{clave}"'
+        last_modified_pdf = _timestamp(estudio.actualizado)
+        resp = _respuesta_condicional(request, etag_pdf, last_modified_pdf)
+        if resp is not None:
+            return resp
+        ruta = pdf_cacheado(clave)
+        if ruta is not None:
+            return _respuesta_pdf(_nombre_pdf("estudio", estudio), ruta.read_bytes(), etag_pdf, last_modified_pdf)
+
+        from django.template.loader import render_to_string
+        from core.services.pdf_render import (
+            PLANTILLA_PDF_ESTUDIO,
+            PDFNoDisponible,
+            guardar_pdf,
+            html_a_pdf_renderizador,
+        )
+
+        html = render_to_string(PLANTILLA_PDF_ESTUDIO, ctx, request=request)
+        try:
+            contenido = html_a_pdf_renderizador(html, base_url=request.build_absolute_uri("/"))
+        except PDFNoDisponible as e:
+            return JsonResponse(
+                {"ok": False, "error": "Generación de PDF no disponible en este servidor", "detalle": str(e)},
+                status=503,
+            )
+        try:
+            guardar_pdf(clave, contenido)
+        except OSError:
+            # Sin caché en disco se sigue sirviendo el PDF; solo se pierde la reutilización
+            pass
+        return _respuesta_pdf(_nombre_pdf("estudio", estudio), contenido, etag_pdf, last_modified_pdf)
+
     return render(
         request,
         "core/pdf_estudio_rentabilidad.html",
@@ -1564,6 +2049,188 @@ def pdf_estudio_preview(request, estudio_id):
     )
 
 
+def _nombre_pdf(tipo: str, obj) -> str:
+    if tipo == "estudio":
+        return f"estudio_{getattr(obj, 'codigo_estudio', None) or obj.id}.pdf"
+    return f"{tipo}_{obj.id}.pdf"
+
+
+def _respuesta_pdf(nombre, contenido, etag, last_modified):
+    response = HttpResponse(contenido, content_type="application/pdf")
+    response["Content-Disposition"] = f'inline; filename="{nombre}"'
+    return _con_validadores(response, etag, last_modified)
+
+
+def _datos_memoria_proyecto(proyecto: Proyecto) -> dict:
+    """Datos (serializables) de la memoria económica: gastos, ingresos y totales del proyecto."""
+    gastos = [
+        {
+            "fecha": g.fecha.isoformat() if g.fecha else "",
+            "tipo": g.get_categoria_display(),
+            "concepto": g.concepto,
+            "importe": float(g.importe or 0),
+        }
+        for g in proyecto.gastos_proyecto.all().order_by("fecha", "id")
+    ]
+    ingresos = [
+        {
+            "fecha": i.fecha.isoformat() if i.fecha else "",
+            "tipo": i.get_tipo_display(),
+            "concepto": i.concepto,
+            "importe": float(i.importe or 0),
+        }
+        for i in proyecto.ingresos.all().order_by("fecha", "id")
+    ]
+    total_gastos = round(sum(g["importe"] for g in gastos), 2)
+    total_ingresos = round(sum(i["importe"] for i in ingresos), 2)
+    beneficio = round(total_ingresos - total_gastos, 2)
+    inversion_total = _safe_float(proyecto.capital_objetivo, 0.0) or total_gastos
+    return {
+        "proyecto": {"id": proyecto.id, "nombre": proyecto.nombre, "direccion": proyecto.direccion or ""},
+        "fecha_informe": timezone.localdate().isoformat(),
+        "gastos": gastos,
+        "ingresos": ingresos,
+        "total_gastos": total_gastos,
+        "total_ingresos": total_ingresos,
+        "beneficio": beneficio,
+        "inversion_total": inversion_total,
+        "roi": round(beneficio / inversion_total * 100.0, 2) if inversion_total else 0.0,
+    }
+
+
+def _html_pdf_proyecto(proyecto: Proyecto, request=None):
+    """(clave de caché, HTML) de la memoria económica del proyecto."""
+    from django.template.loader import render_to_string
+    from core.services.pdf_render import PLANTILLA_PDF_PROYECTO, clave_pdf
+
+    datos = _datos_memoria_proyecto(proyecto)
+
+    def _con_fecha(filas):
+        return [dict(f, fecha=date.fromisoformat(f["fecha"]) if f["fecha"] else None) for f in filas]
+
+    ctx = dict(
+        datos,
+        proyecto=proyecto,
+        fecha_informe=date.fromisoformat(datos["fecha_informe"]),
+        gastos=_con_fecha(datos["gastos"]),
+        ingresos=_con_fecha(datos["ingresos"]),
+    )
+    return clave_pdf(datos, PLANTILLA_PDF_PROYECTO), render_to_string(PLANTILLA_PDF_PROYECTO, ctx, request=request)
+
+
+def _trabajo_pdf_json(trabajo) -> dict:
+    data = {
+        "id": trabajo.id,
+        "tipo": trabajo.tipo,
+        "objeto_id": trabajo.objeto_id,
+        "estado": trabajo.estado,
+        "intentos": trabajo.intentos,
+        "error": trabajo.error,
+        "creado": trabajo.creado.isoformat() if trabajo.creado else None,
+        "terminado": trabajo.terminado.isoformat() if trabajo.terminado else None,
+        "url_estado": reverse("core:estado_trabajo_pdf", args=[trabajo.id]),
+    }
+    if trabajo.estado == "completado":
+        data["url_descarga"] = reverse("core:descargar_trabajo_pdf", args=[trabajo.id])
+    return data
+
+
+@csrf_exempt
+def encolar_pdf(request, tipo, objeto_id):
+    """Encola el render del PDF (lo genera `manage.py procesar_pdfs`); responde 202 al momento."""
+    if request.method != "POST":
+        return JsonResponse({"ok": False, "error": "Método no permitido"}, status=405)
+
+    from core.models import TrabajoPDF
+    from core.services.pdf_trabajos import encolar_trabajo_pdf
+
+    modelos = {"estudio": Estudio, "proyecto": Proyecto}
+    if tipo not in dict(TrabajoPDF.TIPO_CHOICES):
+        return JsonResponse({"ok": False, "error": "Tipo de PDF no válido"}, status=400)
+    if not modelos[tipo].objects.filter(id=objeto_id).exists():
+        return JsonResponse({"ok": False, "error": "No encontrado"}, status=404)
+
+    trabajo = encolar_trabajo_pdf(tipo, objeto_id)
+    return JsonResponse({"ok": True, "trabajo": _trabajo_pdf_json(trabajo)}, status=202)
+
+
+def estado_trabajo_pdf(request, trabajo_id):
+    from core.models import TrabajoPDF
+
+    trabajo = TrabajoPDF.objects.filter(id=trabajo_id).first()
+    if trabajo is None:
+        return JsonResponse({"ok": False, "error": "Trabajo no encontrado"}, status=404)
+    return JsonResponse({"ok": True, "trabajo": _trabajo_pdf_json(trabajo)})
+
+
+def descargar_trabajo_pdf(request, trabajo_id):
+    from core.models import TrabajoPDF
+    from core.services.pdf_render import pdf_cacheado
+
+    trabajo = get_object_or_404(TrabajoPDF, id=trabajo_id)
+    if trabajo.estado != "completado" or not trabajo.clave:
+        return JsonResponse({"ok": False, "trabajo": _trabajo_pdf_json(trabajo)}, status=409)
+
+    etag = f'"{trabajo.clave}"'
+    last_modified = _timestamp(trabajo.terminado)
+    resp = _respuesta_condicional(request, etag, last_modified)
+    if resp is not None:
+        return resp
+
+    ruta = pdf_cacheado(trabajo.clave)
+    if ruta is None:
+        # La caché de disco se ha limpiado: hay que volver a encolar
+        return JsonResponse({"ok": False, "error": "El PDF ya no está disponible; vuelve a generarlo"}, status=410)
+    return _respuesta_pdf(f"{trabajo.tipo}_{trabajo.objeto_id}.pdf", ruta.read_bytes(), etag, last_modified)
+
+
+MAX_PDFS_ZIP = 200
+
+
+@csrf_exempt
+def exportar_pdfs_estudios(request):
+    """ZIP con los PDFs de los estudios seleccionados, renderizados en paralelo y enviado en streaming."""
+    if request.method != "POST":
+        return JsonResponse({"ok": False, "error": "Método no permitido"}, status=405)
+
+    from core.services.pdf_render import weasyprint_disponible
+    from core.services.pdf_zip import zip_pdfs_en_paralelo
+
+    ids = request.POST.getlist("ids")
+    if not ids and request.content_type == "application/json":
+        try:
+            ids = json.loads(request.body or b"{}").get("ids") or []
+        except (ValueError, AttributeError):
+            ids = []
+    try:
+        ids = sorted({int(i) for i in ids})
+    except (TypeError, ValueError):
+        return JsonResponse({"ok": False, "error": "Ids no válidos"}, status=400)
+    if not ids:
+        return JsonResponse({"ok": False, "error": "No hay estudios seleccionados"}, status=400)
+    if len(ids) > MAX_PDFS_ZIP:
+        return JsonResponse({"ok": False, "error": f"Máximo {MAX_PDFS_ZIP} estudios por exportación"}, status=400)
+    if not weasyprint_disponible():
+        return JsonResponse({"ok": False, "error": "Generación de PDF no disponible en este servidor"}, status=503)
+
+    estudios = list(Estudio.objects.filter(id__in=ids).order_by("codigo_estudio", "id"))
+
+    def _entradas():
+        # Snapshot + HTML en este proceso (BD); el render va al pool de procesos
+        for estudio in estudios:
+            nombre = _nombre_pdf("estudio", estudio)
+            try:
+                clave, html = _html_pdf_estudio(estudio, request=request)
+            except Exception as e:
+                yield nombre, None, str(e)
+                continue
+            yield nombre, clave, html
+
+    response = StreamingHttpResponse(zip_pdfs_en_paralelo(_entradas()), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="estudios_pdf_{timezone.localdate():%Y%m%d}.zip"'
+    return response
+
+
 def borrar_estudio(request, estudio_id):
     if request.method != "POST":
         return JsonResponse({"ok": False, "error": "Método no permitido"}, status=405)
@@ -1574,4 +2241,147 @@ def borrar_estudio(request, estudio_id):
     except Estudio.DoesNotExist:
         return JsonResponse({"ok": False, "error": "Estudio no encontrado"}, status=404)
     except Exception as e:
-        return JsonResponse({"ok": False, "error": str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({"ok": False, "error": str(e)}, status=500)
+
+# ==========================================================
+# SENSIBILIDAD (comité): compra × venta × meses
+# ==========================================================
+METRICAS_SENSIBILIDAD = ("roi", "roi_neto", "roi_anual", "beneficio_neto", "breakeven")
+
+
+def sensibilidad_estudio(request, estudio_id=None):
+    """Rejilla ROI / beneficio neto / breakeven para rangos de compra, venta y meses (GET).
+
+    La base sale del estudio guardado; el simulador puede sobreescribirla con sus valores
+    actuales (precio_escritura, venta, gastos_extras, comision_pct). Rangos:
+    precio_min/precio_max/precio_pasos, venta_min/venta_max/venta_pasos (por defecto ±10 %
+    en 50 pasos), meses_min/meses_max (3-14) y coste_mensual de tenencia.
+    Con `formato=f32` las rejillas van en binario (ver `a_binario`) en vez de listas.
+    """
+    from core.services.motor_financiero import recalcular_desde_datos
+    from core.services.sensibilidad import (
+        MAX_MESES,
+        MAX_PASOS_PRECIO,
+        a_binario,
+        a_json,
+        ejes,
+        rejilla_sensibilidad,
+    )
+
+    q = request.GET
+    base = {}
+    if estudio_id is not None:
+        estudio = Estudio.objects.filter(id=estudio_id).only("id", "datos").first()
+        if estudio is None:
+            return JsonResponse({"ok": False, "error": "Estudio no encontrado"}, status=404)
+        datos = estudio.datos if isinstance(estudio.datos, dict) else {}
+        res = recalcular_desde_datos(datos) or {}
+        base = {
+            "precio_escritura": res.get("precio_escritura"),
+            "venta": res.get("valor_transmision") or _safe_float(datos.get("valor_transmision"), None),
+            "gastos_extras": res.get("gastos_extras"),
+            "comision_pct": (res.get("inversor") or {}).get("comision_pct"),
+        }
+
+    def _param(nombre, defecto=None):
+        return _safe_float(q.get(nombre), defecto) if q.get(nombre) not in (None, "") else defecto
+
+    precio = _param("precio_escritura", base.get("precio_escritura"))
+    venta = _param("venta", base.get("venta"))
+    if not precio or precio <= 0 or not venta or venta <= 0:
+        return JsonResponse(
+            {"ok": False, "error": "Faltan precio de escritura y valor de venta (valoraciones) para la rejilla"},
+            status=400,
+        )
+
+    try:
+        pasos_precio = min(MAX_PASOS_PRECIO, max(1, int(q.get("precio_pasos") or 50)))
+        pasos_venta = min(MAX_PASOS_PRECIO, max(1, int(q.get("venta_pasos") or 50)))
+        meses_min = max(1, int(q.get("meses_min") or 3))
+        meses_max = min(MAX_MESES, max(meses_min, int(q.get("meses_max") or 14)))
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Pasos y meses deben ser enteros"}, status=400)
+
+    metricas = [m for m in (q.get("metricas") or "roi,roi_anual,beneficio_neto,breakeven").split(",") if m]
+    if not metricas or any(m not in METRICAS_SENSIBILIDAD for m in metricas):
+        return JsonResponse(
+            {"ok": False, "error": f"Métricas válidas: {', '.join(METRICAS_SENSIBILIDAD)}"}, status=400
+        )
+
+    precios = ejes(precio, 10, pasos_precio, _param("precio_min"), _param("precio_max"))
+    ventas = ejes(venta, 10, pasos_venta, _param("venta_min"), _param("venta_max"))
+    meses = list(range(meses_min, meses_max + 1))
+    rejilla = rejilla_sensibilidad(
+        precios,
+        ventas,
+        meses,
+        gastos_extras=_param("gastos_extras", base.get("gastos_extras")) or 0.0,
+        comision_pct=_param("comision_pct", base.get("comision_pct")) or 0.0,
+        coste_mensual=_param("coste_mensual", 0.0) or 0.0,
+    )
+
+    seleccion = {m: rejilla[m] for m in metricas}
+    return JsonResponse(
+        {
+            "ok": True,
+            "formato": "f32" if q.get("formato") == "f32" else "json",
+            "ejes": {
+                "precio_escritura": [round(x, 2) for x in precios.tolist()],
+                "venta": [round(x, 2) for x in ventas.tolist()],
+                "meses": meses,
+            },
+            "base": {"precio_escritura": precio, "venta": venta},
+            "rejillas": a_binario(seleccion) if q.get("formato") == "f32" else a_json(seleccion),
+        }
+    )
+
+
+def montecarlo_estudio(request, estudio_id):
+    """Simulación Monte Carlo del estudio (GET; `simulaciones` y `semilla` opcionales).
+
+    `simulaciones` se limita a SIMULACIONES: MAX_SIMULACIONES es solo para usos internos
+    (comandos), no para una petición anónima. El PDF usa la misma simulación, congelada en
+    el snapshot (`snapshot.riesgo`).
+    """
+    from core.services.montecarlo import SIMULACIONES, riesgo_estudio
+
+    estudio = Estudio.objects.filter(id=estudio_id).only("id", "datos").first()
+    if estudio is None:
+        return JsonResponse({"ok": False, "error": "Estudio no encontrado"}, status=404)
+    try:
+        simulaciones = min(SIMULACIONES, max(1, int(request.GET.get("simulaciones") or SIMULACIONES)))
+        semilla = int(request.GET["semilla"]) if request.GET.get("semilla") not in (None, "") else None
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "simulaciones y semilla deben ser enteros"}, status=400)
+    if semilla is not None and semilla < 0:
+        return JsonResponse({"ok": False, "error": "La semilla no puede ser negativa"}, status=400)
+
+    riesgo = riesgo_estudio(estudio.datos or {}, simulaciones=simulaciones, semilla=semilla)
+    if riesgo is None:
+        return JsonResponse(
+            {"ok": False, "error": "Faltan precio de escritura o valoraciones para simular"}, status=400
+        )
+    return JsonResponse({"ok": True, "riesgo": riesgo})
+
+
+# ==========================================================
+# TIR (XIRR) de proyectos y cartera
+# ==========================================================
+def xirr_proyectos_view(request):
+    """TIR anualizada de cada proyecto y de la cartera (GET; `ids=1,2,3` opcional, por defecto todos)."""
+    from core.services.xirr import xirr_cartera
+
+    ids = None
+    if request.GET.get("ids"):
+        try:
+            ids = [int(x) for x in request.GET["ids"].split(",") if x.strip()]
+        except ValueError:
+            return JsonResponse({"ok": False, "error": "ids debe ser una lista de enteros separados por comas"}, status=400)
+
+    try:
+        res = xirr_cartera(ids)
+    except ImportError:
+        return JsonResponse({"ok": False, "error": "NumPy no está disponible en el servidor"}, status=503)
+    return JsonResponse(
+        {"ok": True, "proyectos": {str(k): v for k, v in res["proyectos"].items()}, "cartera": res["cartera"]}
+    )